@@ -0,0 +1,108 @@
+"""Compare the per-document cost of `ResourceMapper.map_back` with and without the
+precomputed alias maps, and of `ResourceMapper.map_back_many` over whole pages,
+on the test structures.
+
+Run from the repository root:
+
+    $ python benchmarks/mapper_throughput.py [--repeat N] [--page-size N]
+
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from optimade.server.mappers import StructureMapper
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+TEST_STRUCTURES = REPO_DIR.joinpath("optimade/server/tests/test_structures.json")
+
+
+def uncached_map_back(cls, doc: dict) -> dict:
+    """`map_back` as it was before the alias maps, rebuilding the aliases for every document"""
+    if "_id" in doc:
+        del doc["_id"]
+
+    mapping = ((real, alias) for alias, real in cls.all_aliases())
+    newdoc = {}
+    reals = {real for alias, real in cls.all_aliases()}
+    for k in doc:
+        if k not in reals:
+            newdoc[k] = doc[k]
+    for real, alias in mapping:
+        if real in doc:
+            newdoc[alias] = doc[real]
+
+    if "attributes" in newdoc:
+        raise Exception("Will overwrite doc field!")
+    attributes = newdoc.copy()
+
+    for k in cls.TOP_LEVEL_NON_ATTRIBUTES_FIELDS:
+        attributes.pop(k, None)
+    for k in list(newdoc.keys()):
+        if k not in cls.TOP_LEVEL_NON_ATTRIBUTES_FIELDS:
+            del newdoc[k]
+
+    newdoc["type"] = cls.ENDPOINT
+    newdoc["attributes"] = attributes
+
+    return newdoc
+
+
+def per_document(map_back, docs, repeat):
+    """Average seconds per document; each call gets a fresh shallow copy, as from a cursor"""
+    copies = [[dict(doc) for doc in docs] for _ in range(repeat)]
+    start = time.perf_counter()
+    for batch in copies:
+        for doc in batch:
+            map_back(doc)
+    return (time.perf_counter() - start) / (repeat * len(docs))
+
+
+def per_page_document(docs, page_size, repeat):
+    """Average seconds per document of `map_back_many` over pages of `page_size` documents"""
+    page = [docs[i % len(docs)] for i in range(page_size)]
+    copies = [[dict(doc) for doc in page] for _ in range(repeat)]
+    start = time.perf_counter()
+    for batch in copies:
+        StructureMapper.map_back_many(batch)
+    return (time.perf_counter() - start) / (repeat * page_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=500)
+    args = parser.parse_args()
+
+    with open(TEST_STRUCTURES) as handle:
+        docs = json.load(handle)
+    for doc in docs:
+        doc.pop("_id", None)
+
+    for doc in docs:
+        assert StructureMapper.map_back(dict(doc)) == uncached_map_back(
+            StructureMapper, dict(doc)
+        )
+    assert StructureMapper.map_back_many([dict(doc) for doc in docs]) == [
+        uncached_map_back(StructureMapper, dict(doc)) for doc in docs
+    ]
+
+    before = per_document(
+        lambda doc: uncached_map_back(StructureMapper, doc), docs, args.repeat
+    )
+    after = per_document(StructureMapper.map_back, docs, args.repeat)
+    batched = per_page_document(docs, args.page_size, max(args.repeat // 10, 1))
+    print(f"Documents: {len(docs)} test structures x {args.repeat}")
+    print(f"map_back, uncached aliases: {before * 1e6:8.2f} us/document")
+    print(
+        f"map_back, alias maps:       {after * 1e6:8.2f} us/document ({before / after:.1f}x)"
+    )
+    print(
+        f"map_back_many, {args.page_size}-document pages: {batched * 1e6:8.2f} us/document "
+        f"({before / batched:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
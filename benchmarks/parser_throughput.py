@@ -0,0 +1,129 @@
+"""Compare parse throughput of the Earley and LALR parsers for the v0.10.0 grammar.
+
+Run from the repository root:
+
+    $ python benchmarks/parser_throughput.py [--repeat N]
+
+"""
+import argparse
+import ast
+import time
+import urllib.parse
+from pathlib import Path
+
+from lark import Lark
+from lark.exceptions import LarkError
+
+from optimade.filterparser.lark_parser import (
+    available_parsers,
+    load_lalr_parser,
+    serialized_parser_path,
+)
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+TESTFILES_DIR = REPO_DIR.joinpath("optimade/filterparser/tests/testfiles")
+FILTER_SOURCES = [
+    REPO_DIR.joinpath("optimade/filtertransformers/tests/test_mongo.py"),
+    REPO_DIR.joinpath("optimade/server/tests/test_server.py"),
+]
+
+
+def _string_literals(tree):
+    """The string literals of a Python module, including f-strings without placeholders"""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            yield node, node.value
+        elif isinstance(node, ast.JoinedStr) and all(
+            isinstance(value, ast.Constant) for value in node.values
+        ):
+            yield node, "".join(value.value for value in node.values)
+
+
+def _test_filters(source: Path):
+    """The filters transformed by, or requested in, the tests of `source`"""
+    tree = ast.parse(source.read_text())
+    transformed = {
+        id(node.args[0])
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == "transform"
+        and node.args
+    }
+    for node, string in _string_literals(tree):
+        if id(node) in transformed:
+            yield string
+        elif "filter=" in string:
+            query = urllib.parse.urlsplit(string).query if "?" in string else string
+            yield from urllib.parse.parse_qs(query).get("filter", [])
+
+
+def load_corpus(lark):
+    """Filters from the parser test files and the v0.10.0 filters used in the tests.
+
+    Returns:
+        The filters parsed by `lark`, and those it rejects.
+    """
+    corpus = []
+    for fn in sorted(TESTFILES_DIR.glob("*.inp")):
+        filter_ = fn.read_text().strip()
+        corpus.append(
+            filter_[len("filter=") :] if filter_.startswith("filter=") else filter_
+        )
+    for source in FILTER_SOURCES:
+        corpus.extend(_test_filters(source))
+
+    valid, invalid = [], []
+    for filter_ in corpus:
+        try:
+            lark.parse(filter_)
+        except LarkError:
+            invalid.append(filter_)
+        else:
+            valid.append(filter_)
+    return valid, invalid
+
+
+def timeit(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def throughput(lark, corpus, repeat):
+    def parse_all():
+        for filter_ in corpus:
+            lark.parse(filter_)
+
+    return len(corpus) / timeit(parse_all, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    grammar_file = available_parsers[(0, 10, 0)]["default"]
+    grammar = grammar_file.read_text()
+    corpus, invalid = load_corpus(Lark(grammar))
+
+    earley_setup = timeit(lambda: Lark(grammar), args.repeat)
+    lalr_setup = timeit(lambda: Lark(grammar, parser="lalr"), args.repeat)
+    print(f"Corpus: {len(corpus)} filters ({len(invalid)} invalid filters left out)")
+    print(f"Earley grammar compilation:  {earley_setup * 1e3:8.2f} ms")
+    print(f"LALR grammar compilation:    {lalr_setup * 1e3:8.2f} ms")
+    if serialized_parser_path(grammar_file).exists():
+        loaded_setup = timeit(lambda: load_lalr_parser(grammar_file), args.repeat)
+        print(f"LALR serialized parser load: {loaded_setup * 1e3:8.2f} ms")
+    else:
+        print("LALR serialized parser load: not built (run `invoke build-parsers`)")
+
+    earley = throughput(Lark(grammar), corpus, args.repeat)
+    lalr = throughput(Lark(grammar, parser="lalr"), corpus, args.repeat)
+    print(f"Earley throughput: {earley:10.0f} filters/s")
+    print(f"LALR throughput:   {lalr:10.0f} filters/s ({lalr / earley:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,3 @@
-from .lark_parser import LarkParser, ParserError
+from .lark_parser import LarkParser, ParseResult, ParserError, get_parser
 
-__all__ = [LarkParser, ParserError]
+__all__ = [LarkParser, ParseResult, ParserError, get_parser]
@@ -1,12 +1,29 @@
+import hashlib
+import pickle
 from pathlib import Path
-from lark import Lark, Tree
+from time import perf_counter
+from typing import NamedTuple, Tuple
+from lark import Lark, Tree, __version__ as lark_version
+from lark.grammar import Rule
+from lark.lexer import TerminalDef
 from collections import defaultdict
+from threading import Lock
 
 
 class ParserError(Exception):
     pass
 
 
+class ParseResult(NamedTuple):
+    """The immutable outcome of parsing a filter with :meth:`LarkParser.parse_result`."""
+
+    tree: Tree
+    filter: str
+    version: Tuple[int, int, int]
+    variant: str
+    duration: float  # seconds spent parsing
+
+
 def get_versions():
     dct = defaultdict(dict)
     for filename in Path(__file__).parent.joinpath("../grammar").glob("*.lark"):
@@ -19,6 +36,66 @@ def get_versions():
 
 available_parsers = get_versions()
 
+# Grammars that are LALR(1) and produce the same parse trees as the Earley parser.
+# These are parsed with the (much faster) LALR parser.
+lalr_parsers = {((0, 10, 0), "default")}
+
+
+def serialized_parser_path(grammar_file: Path) -> Path:
+    """Path of the serialized LALR parser for a grammar file."""
+    return grammar_file.resolve().with_suffix(".lark.pickle")
+
+
+def _grammar_hash(grammar: str) -> str:
+    return hashlib.sha256(grammar.encode("utf-8")).hexdigest()
+
+
+def serialize_parser(version: tuple, variant: str = "default", path: Path = None):
+    """Compile a LALR grammar and store the resulting parser in ``path``.
+
+    The serialized parser is tagged with the Lark version and a hash of the grammar,
+    so that stale files are ignored when loading.
+    """
+    if (version, variant) not in lalr_parsers:
+        raise ParserError(f"Grammar {version} ({variant}) is not a LALR grammar")
+
+    grammar_file = available_parsers[version][variant]
+    grammar = grammar_file.read_text()
+    data, memo = Lark(grammar, parser="lalr").memo_serialize([TerminalDef, Rule])
+
+    path = serialized_parser_path(grammar_file) if path is None else Path(path)
+    with open(path, "wb") as handle:
+        pickle.dump(
+            {
+                "lark_version": lark_version,
+                "grammar_hash": _grammar_hash(grammar),
+                "data": data,
+                "memo": memo,
+            },
+            handle,
+        )
+    return path
+
+
+def load_lalr_parser(grammar_file: Path, path: Path = None) -> Lark:
+    """Load a serialized LALR parser, compiling the grammar if it is missing or stale."""
+    grammar = grammar_file.read_text()
+    path = serialized_parser_path(grammar_file) if path is None else Path(path)
+
+    if path.exists():
+        with open(path, "rb") as handle:
+            serialized = pickle.load(handle)
+        if serialized.get("lark_version") == lark_version and serialized.get(
+            "grammar_hash"
+        ) == _grammar_hash(grammar):
+            return Lark.deserialize(
+                serialized["data"],
+                {"Rule": Rule, "TerminalDef": TerminalDef},
+                serialized["memo"],
+            )
+
+    return Lark(grammar, parser="lalr")
+
 
 class LarkParser:
     def __init__(self, version=None, variant="default"):
@@ -34,22 +111,55 @@ class LarkParser:
         self.version = version
         self.variant = variant
 
-        with open(available_parsers[version][variant]) as file:
-            self.lark = Lark(file)
+        if (version, variant) in lalr_parsers:
+            self.lark = load_lalr_parser(available_parsers[version][variant])
+        else:
+            with open(available_parsers[version][variant]) as file:
+                self.lark = Lark(file)
 
-        self.tree = None
-        self.filter = None
+    def parse(self, filter_) -> Tree:
+        """Parse a filter and return the parse tree.
 
-    def parse(self, filter_):
+        The parser keeps no state between calls, so a single instance can be
+        shared between threads.
+        """
         try:
-            self.tree = self.lark.parse(filter_)
-            self.filter = filter_
-            return self.tree
+            return self.lark.parse(filter_)
         except Exception as e:
             raise ParserError(e)
 
+    def parse_result(self, filter_) -> ParseResult:
+        """Parse a filter and return the tree together with the grammar and parse time."""
+        start = perf_counter()
+        tree = self.parse(filter_)
+        return ParseResult(
+            tree=tree,
+            filter=filter_,
+            version=self.version,
+            variant=self.variant,
+            duration=perf_counter() - start,
+        )
+
     def __repr__(self):
-        if isinstance(self.tree, Tree):
-            return self.tree.pretty()
-        else:
-            return repr(self.lark)
+        return f"{self.__class__.__name__}(version={self.version!r}, variant={self.variant!r})"
+
+
+_parsers = {}
+_parsers_lock = Lock()
+
+
+def get_parser(version=None, variant="default") -> LarkParser:
+    """Return the process-wide shared :class:`LarkParser` for a grammar version and variant.
+
+    Each grammar is compiled (or loaded) only once per process.
+    """
+    version = version if version else max(available_parsers.keys())
+    key = (tuple(version), variant)
+    try:
+        return _parsers[key]
+    except KeyError:
+        pass
+    with _parsers_lock:
+        if key not in _parsers:
+            _parsers[key] = LarkParser(version=key[0], variant=variant)
+        return _parsers[key]
@@ -1,10 +1,18 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
+from pathlib import Path
+from tempfile import TemporaryDirectory
 import unittest
 
 from lark import Tree
 
-from optimade.filterparser import LarkParser, ParserError
+from optimade.filterparser import LarkParser, ParseResult, ParserError, get_parser
+from optimade.filterparser.lark_parser import (
+    available_parsers,
+    load_lalr_parser,
+    serialize_parser,
+)
 
 testfile_dir = os.path.join(os.path.dirname(__file__), "testfiles")
 
@@ -278,3 +286,64 @@ class ParserTestV0_10_0(unittest.TestCase):
         self.assertIsNotNone(repr(self.parser))
         self.parser.parse('key="value"')
         self.assertIsNotNone(repr(self.parser))
+
+    def test_parse_result(self):
+        result = self.parser.parse_result('key="value"')
+        self.assertIsInstance(result, ParseResult)
+        self.assertIsInstance(result.tree, Tree)
+        self.assertEqual(result.filter, 'key="value"')
+        self.assertEqual(result.version, self.version)
+        self.assertEqual(result.variant, self.variant)
+        self.assertGreaterEqual(result.duration, 0)
+        with self.assertRaises(AttributeError):
+            result.tree = None
+
+    def test_concurrent_parse(self):
+        filters = [f"nelements={n}" for n in range(50)]
+        expected = [self.parser.parse(filter_) for filter_ in filters]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(self.parser.parse_result, filters))
+        self.assertEqual([result.tree for result in results], expected)
+        self.assertEqual([result.filter for result in results], filters)
+
+
+class SerializedParserTest(unittest.TestCase):
+    version = (0, 10, 0)
+    variant = "default"
+    filter_ = (
+        'elements HAS "Si" AND nelements>=3 OR NOT chemical_formula_reduced STARTS "Si"'
+    )
+
+    def test_lalr_parser(self):
+        parser = LarkParser(version=self.version, variant=self.variant)
+        self.assertEqual(parser.lark.options.parser, "lalr")
+
+    def test_serialize_roundtrip(self):
+        grammar_file = available_parsers[self.version][self.variant]
+        expected = LarkParser(version=self.version, variant=self.variant).parse(
+            self.filter_
+        )
+        with TemporaryDirectory() as tmpdir:
+            path = serialize_parser(
+                self.version, self.variant, Path(tmpdir).joinpath("parser.pickle")
+            )
+            lark = load_lalr_parser(grammar_file, path)
+        self.assertEqual(lark.source, "<deserialized>")
+        self.assertEqual(lark.parse(self.filter_), expected)
+
+    def test_non_lalr_grammar(self):
+        with self.assertRaises(ParserError):
+            serialize_parser((0, 9, 7))
+
+
+class ParserRegistryTest(unittest.TestCase):
+    def test_shared_parser(self):
+        parser = get_parser(version=(0, 10, 0))
+        self.assertIs(get_parser(version=(0, 10, 0), variant="default"), parser)
+        self.assertIs(get_parser(version=[0, 10, 0]), parser)
+        self.assertIs(get_parser(), get_parser(version=max(available_parsers)))
+        self.assertIsNot(get_parser(version=(0, 10, 0), variant="elastic"), parser)
+
+    def test_unknown_grammar(self):
+        with self.assertRaises(ParserError):
+            get_parser(version=(0, 0, 1))
@@ -1,5 +1,5 @@
 import operator
-from optimade.filterparser import LarkParser
+from optimade.filterparser import get_parser
 from lark import Tree
 from lark.lexer import Token
 from django.db.models import Q
@@ -34,7 +34,7 @@ class Lark2Django:
             "AND": self.and_,
             "NOT": self.not_,
         }
-        self.parser = LarkParser(version=(0, 9, 7))
+        self.parser = get_parser(version=(0, 9, 7))
 
     def parse_raw_q(self, raw_query):
         return self.parser.parse(raw_query)
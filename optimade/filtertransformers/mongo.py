@@ -1,3 +1,9 @@
+import itertools
+import json
+import re
+import sys
+from typing import List, Optional
+
 from lark import Transformer, v_args, Token
 
 
@@ -19,6 +25,37 @@ def conjoin_args(args):
     return {conj: [args[0], args[2]]}
 
 
+def ngrams(string: str, size: int = 3) -> List[str]:
+    """The distinct substrings of `string` of at most `size` characters, in order of appearance
+
+    A string contains a substring of at most `size` characters if the substring is one of its
+    n-grams, and a longer substring only if all the substring's `size`-grams are.
+    """
+    return list(
+        dict.fromkeys(
+            string[start : start + length]
+            for length in range(1, size + 1)
+            for start in range(len(string) - length + 1)
+        )
+    )
+
+
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    """The smallest string greater than all strings starting with `prefix`
+
+    Returns `None` if there is no such string, i.e., for an empty prefix or a prefix of
+    only the largest code point.
+    """
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    successor = ord(prefix[-1]) + 1
+    if 0xD800 <= successor <= 0xDFFF:
+        # Surrogates cannot be encoded in UTF-8, and so are not part of any stored string
+        successor = 0xE000
+    return prefix[:-1] + chr(successor)
+
+
 class MongoTransformer(Transformer):
     """
      class for transforming Lark tree into MongoDB format
@@ -97,8 +134,46 @@ class NewMongoTransformer(Transformer):
         "$eq": "$eq",
     }
 
-    def __init__(self):
+    # HAS ONLY with at most this many values is compiled to equalities on a sorted-key field
+    has_only_max_values = 10
+    # Length of the longest n-grams of the n-gram fields, see `ngrams()`
+    ngram_size = 3
+
+    def __init__(
+        self,
+        length_aliases: dict = None,
+        has_only_aliases: dict = None,
+        zip_aliases: dict = None,
+        reversed_aliases: dict = None,
+        ngram_aliases: dict = None,
+    ):
+        """
+        Args:
+            length_aliases: list properties mapped to the properties holding their lengths,
+                e.g., `{"elements": "nelements"}`. `LENGTH` of these properties is
+                a comparison of the length property, which can use an index.
+            has_only_aliases: list properties mapped to the database fields holding their
+                values sorted and joined with "-", e.g., `{"elements": "_mp_chemsys"}` for
+                `"Ag-Cl-O"`. `HAS ONLY` of these properties is an equality on that field.
+            zip_aliases: tuples of list properties mapped to the database field holding their
+                zipped values as subdocuments, and the keys of the values in the subdocuments,
+                e.g., `{("elements", "elements_ratios"): ("_elements_zip", ("element", "ratio"))}`.
+                Zipped `HAS` of these properties is an `$elemMatch` of the subdocuments,
+                which can use a compound multikey index.
+            reversed_aliases: string properties mapped to the database fields holding their
+                reversed values. `ENDS WITH` of these properties is a range of the reversed
+                values, like `STARTS WITH`, which can use an index.
+            ngram_aliases: string properties mapped to the database fields holding their
+                n-grams, see `ngrams()`. `CONTAINS` of these properties first selects the
+                documents with all n-grams of the substring, which can use a multikey index.
+
+        """
         super().__init__()
+        self.length_aliases = length_aliases or {}
+        self.has_only_aliases = has_only_aliases or {}
+        self.zip_aliases = zip_aliases or {}
+        self.reversed_aliases = reversed_aliases or {}
+        self.ngram_aliases = ngram_aliases or {}
 
     def filter(self, arg):
         # filter: expression*
@@ -118,15 +193,25 @@ class NewMongoTransformer(Transformer):
 
     def value_list(self, arg):
         # value_list: [ OPERATOR ] value ( "," [ OPERATOR ] value )*
-        raise NotImplementedError
+        # A list of (MongoDB operator, value), the operator is `None` if omitted
+        values = []
+        operator = None
+        for item in arg:
+            if isinstance(item, Token) and item.type == "OPERATOR":
+                operator = self.operator_map[item]
+            else:
+                values.append((operator, item))
+                operator = None
+        return values
 
     def value_zip(self, arg):
         # value_zip: [ OPERATOR ] value ":" [ OPERATOR ] value (":" [ OPERATOR ] value)*
-        raise NotImplementedError
+        # A list of (MongoDB operator, value), one for each zipped property
+        return self.value_list(arg)
 
     def value_zip_list(self, arg):
         # value_zip_list: value_zip ( "," value_zip )*
-        raise NotImplementedError
+        return arg
 
     def expression(self, arg):
         # expression: expression_clause ( OR expression_clause )
@@ -145,8 +230,17 @@ class NewMongoTransformer(Transformer):
             return arg[0]
 
         # with NOT
-        # TODO: This implementation probably fails in the case of `predicate_comparison` or `"(" expression ")"`
-        return {prop: {"$not": expr} for prop, expr in arg[1].items()}
+        # A comparison of a single property is negated with `$not`, as {property: {"$not": expr}},
+        # while `$not` cannot negate a whole (sub-)expression, which is negated with `$nor`
+        expr = arg[1]
+        if len(expr) == 1:
+            prop, predicate = next(iter(expr.items()))
+            if not prop.startswith("$") and isinstance(predicate, dict):
+                if list(predicate) == ["$not"]:
+                    return {prop: predicate["$not"]}
+                if "$not" not in predicate:
+                    return {prop: {"$not": predicate}}
+        return {"$nor": [expr]}
 
     @v_args(inline=True)
     def comparison(self, value):
@@ -157,6 +251,9 @@ class NewMongoTransformer(Transformer):
     def property_first_comparison(self, arg):
         # property_first_comparison: property ( value_op_rhs | known_op_rhs | fuzzy_string_op_rhs | set_op_rhs |
         # set_zip_op_rhs )
+        if callable(arg[1]):
+            # The right-hand side needs the property, e.g., to use a derived field
+            return arg[1](arg[0])
         return {arg[0]: arg[1]}
 
     def constant_first_comparison(self, arg):
@@ -185,14 +282,44 @@ class NewMongoTransformer(Transformer):
         else:
             pattern = arg[1]
 
-        # CONTAINS
-        if arg[0] == "CONTAINS":
-            regex = f"{pattern}"
-        elif arg[0] == "STARTS":
-            regex = f"^{pattern}"
-        elif arg[0] == "ENDS":
-            regex = f"{pattern}$"
-        return {"$regex": regex}
+        if arg[0] == "STARTS":
+            return self._starts_with(pattern)
+        if arg[0] == "ENDS":
+            return lambda prop: self._ends_with(prop, pattern)
+        return lambda prop: self._contains(prop, pattern)
+
+    @staticmethod
+    def _starts_with(prefix: str) -> dict:
+        """Predicate of the strings starting with `prefix`, as a range that can use an index"""
+        upper_bound = prefix_upper_bound(prefix)
+        if upper_bound is None:
+            return {"$gte": prefix}
+        return {"$gte": prefix, "$lt": upper_bound}
+
+    def _ends_with(self, prop: str, suffix: str) -> dict:
+        if prop in self.reversed_aliases:
+            return {self.reversed_aliases[prop]: self._starts_with(suffix[::-1])}
+        return {prop: {"$regex": f"{re.escape(suffix)}$"}}
+
+    def _contains(self, prop: str, substring: str) -> dict:
+        if prop in self.ngram_aliases and substring:
+            ngram_field = self.ngram_aliases[prop]
+            if len(substring) <= self.ngram_size:
+                return {ngram_field: {"$eq": substring}}
+            # The n-grams select the candidates, of which the regular expression keeps those
+            # with the n-grams in the right order
+            longest = [
+                ngram
+                for ngram in ngrams(substring, self.ngram_size)
+                if len(ngram) == self.ngram_size
+            ]
+            return {
+                "$and": [
+                    {ngram_field: {"$all": longest}},
+                    {prop: {"$regex": re.escape(substring)}},
+                ]
+            }
+        return {prop: {"$regex": re.escape(substring)}}
 
     def set_op_rhs(self, arg):
         # set_op_rhs: HAS ( [ OPERATOR ] value | ALL value_list | ANY value_list | ONLY value_list )
@@ -202,31 +329,150 @@ class NewMongoTransformer(Transformer):
             return {"$in": arg[1:]}
 
         if arg[1] == "ALL":
-            raise NotImplementedError
+            return lambda prop: self._has_all(prop, arg[2])
         if arg[1] == "ANY":
-            raise NotImplementedError
+            return lambda prop: self._has_any(prop, arg[2])
         if arg[1] == "ONLY":
-            raise NotImplementedError
+            return lambda prop: self._has_only(prop, arg[2])
 
         # value with OPERATOR
-        raise NotImplementedError
+        return lambda prop: {
+            prop: self._has_predicate(self.operator_map[arg[1]], arg[2])
+        }
+
+    @staticmethod
+    def _has_predicate(operator: str, value) -> dict:
+        """Predicate of a list property with an element comparing to `value`"""
+        if operator == "$eq":
+            return {"$in": [value]}
+        if operator == "$ne":
+            # {"$ne": value} would match lists without any element equal to `value`
+            return {"$elemMatch": {"$ne": value}}
+        return {operator: value}
+
+    def _has_all(self, prop: str, values: list) -> dict:
+        if all(operator in (None, "$eq") for operator, _ in values):
+            return {prop: {"$all": [value for _, value in values]}}
+        return {
+            "$and": [
+                {prop: self._has_predicate(operator or "$eq", value)}
+                for operator, value in values
+            ]
+        }
+
+    def _has_any(self, prop: str, values: list) -> dict:
+        if all(operator in (None, "$eq") for operator, _ in values):
+            return {prop: {"$in": [value for _, value in values]}}
+        return {
+            "$or": [
+                {prop: self._has_predicate(operator or "$eq", value)}
+                for operator, value in values
+            ]
+        }
+
+    def _has_only(self, prop: str, values: list) -> dict:
+        """All elements of the list property are among the `values`
+
+        With a sorted-key field for the property, the list is one of the sorted, joined
+        subsets of the values, which is an index-backed `$in`.
+        Otherwise, no element may be outside the values.
+        """
+        if any(operator not in (None, "$eq") for operator, _ in values):
+            raise NotImplementedError(
+                "HAS ONLY is only supported for values without operators"
+            )
+        values = list(dict.fromkeys(value for _, value in values))
+
+        if (
+            prop in self.has_only_aliases
+            and all(isinstance(value, str) for value in values)
+            and len(values) <= self.has_only_max_values
+        ):
+            keys = [
+                "-".join(sorted(subset))
+                for size in range(1, len(values) + 1)
+                for subset in itertools.combinations(values, size)
+            ]
+            return {self.has_only_aliases[prop]: {"$in": keys}}
+
+        return {prop: {"$exists": True, "$not": {"$elemMatch": {"$nin": values}}}}
 
     def set_zip_op_rhs(self, arg):
         # set_zip_op_rhs: property_zip_addon HAS ( value_zip | ONLY value_zip_list | ALL value_zip_list |
         # ANY value_zip_list )
-        raise NotImplementedError
+        if len(arg) == 3:
+            # HAS value_zip
+            return lambda prop: self._has_zip((prop,) + arg[0], "ALL", [arg[2]])
+        return lambda prop: self._has_zip((prop,) + arg[0], arg[2], arg[3])
+
+    def _has_zip(self, properties: tuple, quantifier: str, value_zips: list) -> dict:
+        """Zipped list properties have ALL, ANY or ONLY the zipped values
+
+        Each zipped value is an `$elemMatch` on the subdocuments of the zipped field.
+        """
+        if properties not in self.zip_aliases:
+            raise NotImplementedError(
+                f"Zipped queries of {':'.join(properties)} are not supported"
+            )
+        field, keys = self.zip_aliases[properties]
+
+        matches = []
+        for value_zip in value_zips:
+            if len(value_zip) != len(properties):
+                raise NotImplementedError(
+                    f"Zipped values must have one value for each of {':'.join(properties)}"
+                )
+            matches.append(
+                {
+                    key: {operator or "$eq": value}
+                    for key, (operator, value) in zip(keys, value_zip)
+                }
+            )
+
+        if quantifier == "ONLY":
+            # No subdocument may match none of the zipped values
+            return {field: {"$exists": True, "$not": {"$elemMatch": {"$nor": matches}}}}
+        clauses = [{field: {"$elemMatch": match}} for match in matches]
+        if len(clauses) == 1:
+            return clauses[0]
+        return {"$or" if quantifier == "ANY" else "$and": clauses}
 
     def predicate_comparison(self, arg):
         # predicate_comparison: LENGTH property OPERATOR value
-        # TODO: https://stackoverflow.com/questions/7811163/query-for-documents-where-array-size-is-greater-than-1
-        if arg[2] == "=":
-            return {arg[1]: {"$size": arg[3]}}
-
-        raise NotImplementedError
+        prop, operator, length = arg[1], self.operator_map[arg[2]], arg[3]
+
+        if prop in self.length_aliases:
+            return {self.length_aliases[prop]: {operator: length}}
+
+        if not isinstance(length, int):
+            raise NotImplementedError("LENGTH is only supported for integer values")
+
+        # Without a length property, `prop.<n>` exists if the list has more than n elements
+        if operator == "$eq":
+            return {prop: {"$size": length}}
+        if operator == "$ne":
+            return {prop: {"$not": {"$size": length}}}
+        if operator == "$lte":
+            operator, length = "$lt", length + 1
+        if operator == "$gt":
+            operator, length = "$gte", length + 1
+        if operator == "$gte":
+            if length <= 0:
+                return {prop: {"$exists": True}}
+            return {f"{prop}.{length - 1}": {"$exists": True}}
+        # $lt
+        if length <= 0:
+            return {prop: {"$in": []}}
+        return {
+            "$and": [
+                {prop: {"$exists": True}},
+                {f"{prop}.{length - 1}": {"$exists": False}},
+            ]
+        }
 
     def property_zip_addon(self, arg):
         # property_zip_addon: ":" property (":" property)*
-        raise NotImplementedError
+        return tuple(arg)
 
     def property(self, arg):
         # property: IDENTIFIER ( "." IDENTIFIER )*
@@ -235,7 +481,8 @@ class NewMongoTransformer(Transformer):
     @v_args(inline=True)
     def string(self, string):
         # string: ESCAPED_STRING
-        return string.strip('"')
+        # Only `\"` and `\\` are escape sequences of OPTiMaDe strings
+        return re.sub(r'\\(["\\])', r"\1", string[1:-1])
 
     def number(self, arg):
         # number: SIGNED_INT | SIGNED_FLOAT
@@ -250,3 +497,197 @@ class NewMongoTransformer(Transformer):
         raise NotImplementedError(
             f"Calling __default__, i.e., unknown grammar concept. data: {data}, children: {children}, meta: {meta}"
         )
+
+
+# Bounds of range operators, and which of two bounds of the same kind is the tighter one
+_LOWER_BOUNDS = ("$gt", "$gte")
+_UPPER_BOUNDS = ("$lt", "$lte")
+# Negations that can be replaced by a single operator without changing the matched documents,
+# also for missing fields and arrays
+_NEGATED_OPERATORS = {"$eq": "$ne", "$ne": "$eq"}
+
+
+def _sort_key(clause: dict) -> str:
+    return json.dumps(clause, sort_keys=True, default=str)
+
+
+def _comparable(a, b) -> bool:
+    numbers = (int, float)
+    if isinstance(a, bool) or isinstance(b, bool):
+        return False
+    return (isinstance(a, numbers) and isinstance(b, numbers)) or (
+        isinstance(a, str) and isinstance(b, str)
+    )
+
+
+def _field_predicate(clause: dict):
+    """The field and operators of a clause {field: {op: value, ...}}, or `None`"""
+    if len(clause) != 1:
+        return None
+    field, predicate = next(iter(clause.items()))
+    if field.startswith("$") or not isinstance(predicate, dict) or not predicate:
+        return None
+    if not all(key.startswith("$") for key in predicate):
+        return None
+    return field, predicate
+
+
+def _tighter(op_a: str, value_a, op_b: str, value_b, lower: bool):
+    """The tighter of two lower (or upper) bounds"""
+    if value_a == value_b:
+        # A strict bound is tighter than an inclusive one
+        return (op_a, value_a) if op_a in ("$gt", "$lt") else (op_b, value_b)
+    if (value_a > value_b) == lower:
+        return op_a, value_a
+    return op_b, value_b
+
+
+def _merge_predicates(predicate: dict, other: dict):
+    """Merge the operators of two predicates on the same field, or return `None` if they conflict"""
+    merged = dict(predicate)
+    for op, value in other.items():
+        bounds = (
+            _LOWER_BOUNDS
+            if op in _LOWER_BOUNDS
+            else _UPPER_BOUNDS
+            if op in _UPPER_BOUNDS
+            else None
+        )
+        if bounds is None:
+            if op in merged and merged[op] != value:
+                return None
+            merged[op] = value
+            continue
+        current = [(key, merged[key]) for key in bounds if key in merged]
+        if not current:
+            merged[op] = value
+            continue
+        ((current_op, current_value),) = current
+        if not _comparable(current_value, value):
+            return None
+        del merged[current_op]
+        new_op, new_value = _tighter(
+            current_op, current_value, op, value, lower=bounds is _LOWER_BOUNDS
+        )
+        merged[new_op] = new_value
+    return merged
+
+
+def _and_clauses(clauses: List[dict]) -> List[dict]:
+    """Merge the predicates on the same field of a conjunction"""
+    merged = []
+    by_field = {}
+    for clause in clauses:
+        field_predicate = _field_predicate(clause)
+        if field_predicate is not None:
+            field, predicate = field_predicate
+            if field in by_field:
+                index = by_field[field]
+                combined = _merge_predicates(merged[index][field], predicate)
+                if combined is not None:
+                    merged[index] = {field: combined}
+                    continue
+            else:
+                by_field[field] = len(merged)
+        merged.append(clause)
+    return merged
+
+
+def _or_clauses(clauses: List[dict]) -> List[dict]:
+    """Fold the equalities on the same field of a disjunction into `$in`"""
+    merged = []
+    by_field = {}
+    for clause in clauses:
+        field_predicate = _field_predicate(clause)
+        if field_predicate is None or set(field_predicate[1]) not in ({"$eq"}, {"$in"}):
+            merged.append(clause)
+            continue
+        field, predicate = field_predicate
+        values = predicate["$in"] if "$in" in predicate else [predicate["$eq"]]
+        if field not in by_field:
+            by_field[field] = len(merged)
+            merged.append({field: {"$in": []}})
+        folded = merged[by_field[field]][field]["$in"]
+        folded.extend(value for value in values if value not in folded)
+
+    for field, index in by_field.items():
+        values = merged[index][field]["$in"]
+        if len(values) == 1:
+            merged[index] = {field: {"$eq": values[0]}}
+    return merged
+
+
+def normalize_filter(filter_: dict) -> dict:
+    """Simplify a MongoDB filter into an equivalent canonical form
+
+    - nested `$and` and `$or` are flattened, and duplicate clauses removed,
+    - `$nor` of `$or` is flattened, and a double negation with `$nor` removed,
+    - the predicates of a conjunction on the same field are merged into a single predicate,
+      keeping the tighter of two bounds (e.g., `nelements>2 AND nelements<5` becomes
+      `{"nelements": {"$gt": 2, "$lt": 5}}`),
+    - equalities of a disjunction on the same field are folded into `$in`,
+    - `$not` of `$eq` or `$ne` is replaced by the opposite operator,
+    - the clauses of `$and`, `$or` and `$nor` are sorted.
+
+    Filters that only differ in these respects are normalized into the same filter, e.g.,
+    for use as cache keys.
+    Merging the predicates on the same field is also correct for array fields, since MongoDB
+    matches each operator of a predicate on an array independently.
+    """
+    if not isinstance(filter_, dict):
+        return filter_
+
+    normalized = {}
+    for key, value in filter_.items():
+        if key in ("$and", "$or", "$nor") and isinstance(value, list):
+            # `$nor` of a disjunction is the `$nor` of its clauses
+            flattened = "$or" if key == "$nor" else key
+            clauses = []
+            for clause in (normalize_filter(_) for _ in value):
+                if list(clause) == [flattened]:
+                    clauses.extend(clause[flattened])
+                else:
+                    clauses.append(clause)
+            if key == "$and":
+                clauses = _and_clauses(clauses)
+            elif key == "$or":
+                clauses = _or_clauses(clauses)
+            unique = {}
+            for clause in clauses:
+                unique.setdefault(_sort_key(clause), clause)
+            clauses = [unique[_] for _ in sorted(unique)]
+
+            replacement = None
+            if key != "$nor" and len(clauses) == 1:
+                replacement = clauses[0]
+            elif key == "$nor" and len(clauses) == 1 and list(clauses[0]) == ["$nor"]:
+                # Double negation
+                replacement = normalize_filter({"$or": clauses[0]["$nor"]})
+            if replacement is not None and not set(replacement) & (
+                set(filter_) | set(normalized)
+            ):
+                normalized.update(replacement)
+                continue
+            normalized[key] = clauses
+        elif isinstance(value, dict) and not key.startswith("$"):
+            normalized[key] = _normalize_predicate(value)
+        else:
+            normalized[key] = value
+    return normalized
+
+
+def _normalize_predicate(predicate: dict) -> dict:
+    """Normalize the operators of a predicate on a field"""
+    negated = predicate.get("$not")
+    if (
+        isinstance(negated, dict)
+        and len(negated) == 1
+        and next(iter(negated)) in _NEGATED_OPERATORS
+    ):
+        op, value = next(iter(negated.items()))
+        opposite = {_NEGATED_OPERATORS[op]: value}
+        rest = {key: val for key, val in predicate.items() if key != "$not"}
+        merged = _merge_predicates(rest, opposite)
+        if merged is not None:
+            return merged
+    return predicate
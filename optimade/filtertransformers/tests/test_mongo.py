@@ -1,6 +1,11 @@
 import unittest
 from optimade.filterparser import LarkParser, ParserError
-from optimade.filtertransformers.mongo import NewMongoTransformer
+from optimade.filtertransformers.mongo import (
+    NewMongoTransformer,
+    ngrams,
+    normalize_filter,
+    prefix_upper_bound,
+)
 
 
 class TestMongoTransformer(unittest.TestCase):
@@ -100,29 +105,31 @@ class TestMongoTransformer(unittest.TestCase):
         # TODO: {"a": {"$not": {"$lt": 3}}} can be simplified to {"a": {"$gte": 3}}
         self.assertEqual(self.transform("NOT a<3"), {"a": {"$not": {"$lt": 3}}})
 
-        # TODO: {'$not': {'$eq': 'Ti'}} can be simplified to {'$ne': 'Ti'}
+        # NOT of a (sub-)expression is expressed with $nor, see `normalize_filter()` for simplifications
         self.assertEqual(
             self.transform(
                 'NOT ( chemical_formula_hill = "Al" AND chemical_formula_anonymous = "A" OR '
                 'chemical_formula_anonymous = "H2O" AND NOT chemical_formula_hill = "Ti" )'
             ),
             {
-                "$or": {
-                    "$not": [
-                        {
-                            "$and": [
-                                {"chemical_formula_hill": {"$eq": "Al"}},
-                                {"chemical_formula_anonymous": {"$eq": "A"}},
-                            ]
-                        },
-                        {
-                            "$and": [
-                                {"chemical_formula_anonymous": {"$eq": "H2O"}},
-                                {"chemical_formula_hill": {"$not": {"$eq": "Ti"}}},
-                            ]
-                        },
-                    ]
-                }
+                "$nor": [
+                    {
+                        "$or": [
+                            {
+                                "$and": [
+                                    {"chemical_formula_hill": {"$eq": "Al"}},
+                                    {"chemical_formula_anonymous": {"$eq": "A"}},
+                                ]
+                            },
+                            {
+                                "$and": [
+                                    {"chemical_formula_anonymous": {"$eq": "H2O"}},
+                                    {"chemical_formula_hill": {"$not": {"$eq": "Ti"}}},
+                                ]
+                            },
+                        ]
+                    }
+                ]
             },
         )
 
@@ -151,12 +158,14 @@ class TestMongoTransformer(unittest.TestCase):
                         "$and": [
                             {"nelements": {"$gte": 10}},
                             {
-                                "$or": {
-                                    "$not": [
-                                        {"_exmpl_x": {"$ne": "Some string"}},
-                                        {"_exmpl_a": {"$not": {"$eq": 7}}},
-                                    ]
-                                }
+                                "$nor": [
+                                    {
+                                        "$or": [
+                                            {"_exmpl_x": {"$ne": "Some string"}},
+                                            {"_exmpl_a": {"$not": {"$eq": 7}}},
+                                        ]
+                                    }
+                                ]
                             },
                         ]
                     },
@@ -197,6 +206,7 @@ class TestMongoTransformer(unittest.TestCase):
             {"_exmpl_some_string_property": {"$eq": 42}},
         )
         self.assertEqual(self.transform("5 < _exmpl_a"), {"_exmpl_a": {"$gt": 5}})
+        self.assertEqual(self.transform("NOT (NOT a<3)"), {"a": {"$lt": 3}})
 
         self.assertEqual(
             self.transform("a<5 AND b=0"),
@@ -216,45 +226,243 @@ class TestMongoTransformer(unittest.TestCase):
         # self.assertEqual(self.transform('((NOT (_exmpl_a>_exmpl_b)) AND _exmpl_x>0)'), {})
         # self.assertEqual(self.transform('5 < 7'), {})
 
-    @unittest.skip("Not implemented yet.")
     def test_list_properties(self):
         # Comparisons of list properties
-        self.assertEqual(self.transform("list HAS < 3"), {})
-        self.assertEqual(self.transform("list HAS ALL < 3, > 3"), {})
-        self.assertEqual(self.transform("list:list HAS >=2:<=5"), {})
+        self.assertEqual(self.transform("list HAS < 3"), {"list": {"$lt": 3}})
         self.assertEqual(
-            self.transform(
-                'elements HAS "H" AND elements HAS ALL "H","He","Ga","Ta" AND elements HAS '
-                'ONLY "H","He","Ga","Ta" AND elements HAS ANY "H", "He", "Ga", "Ta"'
-            ),
-            {},
+            self.transform("list HAS != 3"), {"list": {"$elemMatch": {"$ne": 3}}}
+        )
+        self.assertEqual(
+            self.transform("list HAS ALL < 3, > 3"),
+            {"$and": [{"list": {"$lt": 3}}, {"list": {"$gt": 3}}]},
         )
-
-        # OPTIONAL:
-        self.assertEqual(self.transform('elements HAS ONLY "H","He","Ga","Ta"'), {})
         self.assertEqual(
             self.transform(
-                'elements:_exmpl_element_counts HAS "H":6 AND elements:_exmpl_element_counts '
-                'HAS ALL "H":6,"He":7 AND elements:_exmpl_element_counts HAS ONLY "H":6 AND '
-                'elements:_exmpl_element_counts HAS ANY "H":6,"He":7 AND '
-                'elements:_exmpl_element_counts HAS ONLY "H":6,"He":7'
+                'elements HAS "H" AND elements HAS ALL "H","He","Ga","Ta" AND elements HAS '
+                'ONLY "H","He" AND elements HAS ANY "H", "He", "Ga", "Ta"'
             ),
-            {},
+            {
+                "$and": [
+                    {"elements": {"$in": ["H"]}},
+                    {"elements": {"$all": ["H", "He", "Ga", "Ta"]}},
+                    {
+                        "elements": {
+                            "$exists": True,
+                            "$not": {"$elemMatch": {"$nin": ["H", "He"]}},
+                        }
+                    },
+                    {"elements": {"$in": ["H", "He", "Ga", "Ta"]}},
+                ]
+            },
         )
         self.assertEqual(
             self.transform(
                 "_exmpl_element_counts HAS < 3 AND _exmpl_element_counts "
                 "HAS ANY > 3, = 6, 4, != 8"
             ),
-            {},
+            {
+                "$and": [
+                    {"_exmpl_element_counts": {"$lt": 3}},
+                    {
+                        "$or": [
+                            {"_exmpl_element_counts": {"$gt": 3}},
+                            {"_exmpl_element_counts": {"$in": [6]}},
+                            {"_exmpl_element_counts": {"$in": [4]}},
+                            {"_exmpl_element_counts": {"$elemMatch": {"$ne": 8}}},
+                        ]
+                    },
+                ]
+            },
         )
         self.assertEqual(
-            self.transform(
-                "elements:_exmpl_element_counts:_exmpl_element_weights "
-                'HAS ANY > 3:"He":>55.3 , = 6:>"Ti":<37.6 , 8:<"Ga":0'
-            ),
-            {},
+            self.transform('NOT elements HAS ONLY "H"'),
+            {
+                "$nor": [
+                    {
+                        "elements": {
+                            "$exists": True,
+                            "$not": {"$elemMatch": {"$nin": ["H"]}},
+                        }
+                    }
+                ]
+            },
+        )
+
+    def test_list_aliases(self):
+        p = LarkParser(version=self.version, variant=self.variant)
+        t = NewMongoTransformer(
+            length_aliases={"elements": "nelements"},
+            has_only_aliases={"elements": "chemsys"},
+        )
+        transform = lambda inp: t.transform(p.parse(inp))  # noqa: E731
+
+        self.assertEqual(
+            transform('elements HAS ONLY "O","Ag","Cl"'),
+            {"chemsys": {"$in": ["O", "Ag", "Cl", "Ag-O", "Cl-O", "Ag-Cl", "Ag-Cl-O"]}},
+        )
+        self.assertEqual(transform("LENGTH elements >= 3"), {"nelements": {"$gte": 3}})
+        self.assertEqual(
+            transform("LENGTH species < 3"),
+            {
+                "$and": [
+                    {"species": {"$exists": True}},
+                    {"species.2": {"$exists": False}},
+                ]
+            },
+        )
+
+    def test_length(self):
+        self.assertEqual(self.transform("LENGTH a = 3"), {"a": {"$size": 3}})
+        self.assertEqual(self.transform("LENGTH a != 3"), {"a": {"$not": {"$size": 3}}})
+        self.assertEqual(self.transform("LENGTH a > 3"), {"a.3": {"$exists": True}})
+        self.assertEqual(self.transform("LENGTH a >= 3"), {"a.2": {"$exists": True}})
+        self.assertEqual(self.transform("LENGTH a >= 0"), {"a": {"$exists": True}})
+        self.assertEqual(
+            self.transform("LENGTH a <= 3"),
+            {"$and": [{"a": {"$exists": True}}, {"a.3": {"$exists": False}}]},
+        )
+        self.assertEqual(self.transform("LENGTH a < 0"), {"a": {"$in": []}})
+
+    def test_list_zip_properties(self):
+        p = LarkParser(version=self.version, variant=self.variant)
+        t = NewMongoTransformer(
+            zip_aliases={
+                ("elements", "_exmpl_element_counts"): ("composition", ("el", "n")),
+                ("a", "b", "c"): ("abc", ("a", "b", "c")),
+            }
+        )
+        transform = lambda inp: t.transform(p.parse(inp))  # noqa: E731
+
+        self.assertEqual(
+            transform('elements:_exmpl_element_counts HAS "H":>6'),
+            {"composition": {"$elemMatch": {"el": {"$eq": "H"}, "n": {"$gt": 6}}}},
+        )
+        self.assertEqual(
+            transform('elements:_exmpl_element_counts HAS ALL "H":6,"He":7'),
+            {
+                "$and": [
+                    {
+                        "composition": {
+                            "$elemMatch": {"el": {"$eq": "H"}, "n": {"$eq": 6}}
+                        }
+                    },
+                    {
+                        "composition": {
+                            "$elemMatch": {"el": {"$eq": "He"}, "n": {"$eq": 7}}
+                        }
+                    },
+                ]
+            },
+        )
+        self.assertEqual(
+            transform('elements:_exmpl_element_counts HAS ANY "H":6,"He":7'),
+            {
+                "$or": [
+                    {
+                        "composition": {
+                            "$elemMatch": {"el": {"$eq": "H"}, "n": {"$eq": 6}}
+                        }
+                    },
+                    {
+                        "composition": {
+                            "$elemMatch": {"el": {"$eq": "He"}, "n": {"$eq": 7}}
+                        }
+                    },
+                ]
+            },
+        )
+        self.assertEqual(
+            transform('elements:_exmpl_element_counts HAS ONLY "H":6,"He":<7'),
+            {
+                "composition": {
+                    "$exists": True,
+                    "$not": {
+                        "$elemMatch": {
+                            "$nor": [
+                                {"el": {"$eq": "H"}, "n": {"$eq": 6}},
+                                {"el": {"$eq": "He"}, "n": {"$lt": 7}},
+                            ]
+                        }
+                    },
+                }
+            },
+        )
+        self.assertEqual(
+            transform('a:b:c HAS ANY > 3:"He":>55.3 , 8:<"Ga":0'),
+            {
+                "$or": [
+                    {
+                        "abc": {
+                            "$elemMatch": {
+                                "a": {"$gt": 3},
+                                "b": {"$eq": "He"},
+                                "c": {"$gt": 55.3},
+                            }
+                        }
+                    },
+                    {
+                        "abc": {
+                            "$elemMatch": {
+                                "a": {"$eq": 8},
+                                "b": {"$lt": "Ga"},
+                                "c": {"$eq": 0},
+                            }
+                        }
+                    },
+                ]
+            },
+        )
+
+        # Without a zipped field, or with the wrong number of values
+        with self.assertRaises(Exception):
+            transform("list:list HAS >=2:<=5")
+        with self.assertRaises(Exception):
+            transform('elements:_exmpl_element_counts HAS "H":6:7')
+
+    def test_fuzzy_strings(self):
+        self.assertEqual(
+            self.transform('a STARTS WITH "Ag2"'), {"a": {"$gte": "Ag2", "$lt": "Ag3"}}
+        )
+        self.assertEqual(self.transform('a STARTS ""'), {"a": {"$gte": ""}})
+        self.assertEqual(self.transform('a ENDS "O4"'), {"a": {"$regex": "O4$"}})
+        self.assertEqual(
+            self.transform('a CONTAINS "(a.*)+"'), {"a": {"$regex": r"\(a\.\*\)\+"}}
+        )
+        self.assertEqual(
+            self.transform(r'a = "say \"hi\" \\o/"'), {"a": {"$eq": 'say "hi" \\o/'}}
+        )
+
+        p = LarkParser(version=self.version, variant=self.variant)
+        t = NewMongoTransformer(
+            reversed_aliases={"a": "a_reversed"}, ngram_aliases={"a": "a_ngrams"}
+        )
+        transform = lambda inp: t.transform(p.parse(inp))  # noqa: E731
+
+        self.assertEqual(
+            transform('a ENDS WITH "O4"'), {"a_reversed": {"$gte": "4O", "$lt": "4P"}}
+        )
+        self.assertEqual(transform('a CONTAINS "gO"'), {"a_ngrams": {"$eq": "gO"}})
+        self.assertEqual(
+            transform('a CONTAINS "Ag2O"'),
+            {
+                "$and": [
+                    {"a_ngrams": {"$all": ["Ag2", "g2O"]}},
+                    {"a": {"$regex": "Ag2O"}},
+                ]
+            },
         )
+        self.assertEqual(transform('a CONTAINS ""'), {"a": {"$regex": ""}})
+        self.assertEqual(transform('b ENDS "x"'), {"b": {"$regex": "x$"}})
+
+    def test_ngrams(self):
+        self.assertEqual(
+            ngrams("AgAg2"), ["A", "g", "2", "Ag", "gA", "g2", "AgA", "gAg", "Ag2"],
+        )
+        self.assertEqual(ngrams("Ag", size=3), ["A", "g", "Ag"])
+        self.assertEqual(prefix_upper_bound("Ag"), "Ah")
+        self.assertEqual(prefix_upper_bound(""), None)
+        self.assertEqual(prefix_upper_bound("a" + chr(0x10FFFF)), "b")
+        self.assertEqual(prefix_upper_bound(chr(0xD7FF)), chr(0xE000))
 
     def test_properties(self):
         #  Filtering on Properties with unknown value
@@ -353,3 +561,72 @@ class TestMongoTransformer(unittest.TestCase):
                 ]
             },
         )
+
+
+class TestNormalizeFilter(unittest.TestCase):
+    def setUp(self):
+        p = LarkParser(version=(0, 10, 0))
+        t = NewMongoTransformer()
+        self.normalize = lambda inp: normalize_filter(t.transform(p.parse(inp)))
+
+    def test_flatten_and_dedupe(self):
+        self.assertEqual(
+            self.normalize("(a=1 AND b=2) AND (c=3 AND a=1)"),
+            {"$and": [{"a": {"$eq": 1}}, {"b": {"$eq": 2}}, {"c": {"$eq": 3}}]},
+        )
+        self.assertEqual(
+            self.normalize("a>2 AND (b<3 OR b<3)"),
+            {"$and": [{"a": {"$gt": 2}}, {"b": {"$lt": 3}}]},
+        )
+        self.assertEqual(
+            self.normalize("a=1 AND b=2 OR b=2 AND a=1"),
+            {"$and": [{"a": {"$eq": 1}}, {"b": {"$eq": 2}}]},
+        )
+        self.assertEqual(
+            self.normalize("b=2 AND a>1"), self.normalize("a>1 AND b=2"),
+        )
+
+    def test_merge_ranges(self):
+        self.assertEqual(
+            self.normalize("nelements>2 AND nelements<5"),
+            {"nelements": {"$gt": 2, "$lt": 5}},
+        )
+        self.assertEqual(
+            self.normalize(
+                "nelements>2 AND nelements>=5 AND nelements<7 AND nelements<=7"
+            ),
+            {"nelements": {"$gte": 5, "$lt": 7}},
+        )
+        self.assertEqual(
+            self.normalize("a>=3 AND a>3 AND NOT a=4"), {"a": {"$gt": 3, "$ne": 4}},
+        )
+        # Conflicting or incomparable predicates are kept apart
+        self.assertEqual(
+            self.normalize("a=1 AND a=2"),
+            {"$and": [{"a": {"$eq": 1}}, {"a": {"$eq": 2}}]},
+        )
+        self.assertEqual(
+            self.normalize('a>"x" AND a>3'),
+            {"$and": [{"a": {"$gt": "x"}}, {"a": {"$gt": 3}}]},
+        )
+
+    def test_fold_equalities(self):
+        self.assertEqual(
+            self.normalize("a=1 OR a=2 OR b=3 OR a=1"),
+            {"$or": [{"a": {"$in": [1, 2]}}, {"b": {"$eq": 3}}]},
+        )
+        self.assertEqual(
+            self.normalize("(a=1 OR a=2) OR a=3"), {"a": {"$in": [1, 2, 3]}}
+        )
+
+    def test_negations(self):
+        self.assertEqual(self.normalize("NOT a=1"), {"a": {"$ne": 1}})
+        self.assertEqual(self.normalize("NOT a<3"), {"a": {"$not": {"$lt": 3}}})
+        self.assertEqual(
+            self.normalize("NOT (a>3 OR b=1)"),
+            {"$nor": [{"a": {"$gt": 3}}, {"b": {"$eq": 1}}]},
+        )
+        self.assertEqual(
+            self.normalize("NOT (NOT (a>3 OR b=1))"),
+            {"$or": [{"a": {"$gt": 3}}, {"b": {"$eq": 1}}]},
+        )
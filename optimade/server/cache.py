@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Hashable
+
+__all__ = ("LRUCache",)
+
+
+class LRUCache:
+    """Thread-safe, size-bounded least-recently-used cache with optional expiry.
+
+    Parameters:
+        maxsize: maximum number of entries kept. A ``maxsize`` of 0 disables the cache.
+        ttl: time-to-live in seconds for each entry. A ``ttl`` of 0 means entries never expire.
+
+    The number of cache hits and misses are counted in ``hits`` and ``misses``.
+
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for ``key``, counting a hit or a miss."""
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires and expires < monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store ``value`` under ``key``, evicting the least recently used entry if full."""
+        if self.maxsize <= 0:
+            return
+        expires = monotonic() + self.ttl if self.ttl > 0 else 0
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        """Remove the entry for ``key``, if there is one."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove all entries, keeping the hit/miss counters."""
+        with self._lock:
+            self._data.clear()
+
+    def info(self) -> dict:
+        """Return the cache statistics."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+        }
@@ -1,17 +1,76 @@
 import json
-from typing import Any
+import os
 from configparser import ConfigParser
 from pathlib import Path
+from threading import Lock
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, NamedTuple, Type
+
+ENDPOINTS = ("links", "references", "structures")
 
 
 class NoFallback(Exception):
     """No fallback value can be found."""
 
 
+class ServerSettings(NamedTuple):
+    """Frozen snapshot of the server config parameters"""
+
+    use_real_mongo: bool
+    use_async_mongo: bool
+    mongo_database: str
+    links_collection: str
+    references_collection: str
+    structures_collection: str
+    page_limit: int
+    filter_cache_size: int
+    filter_cache_ttl: float
+    count_cache_size: int
+    count_cache_ttl: float
+    reference_cache_size: int
+    reference_cache_ttl: float
+    approximate_counts: bool
+    approximate_count_limit: int
+    stream_responses: bool
+    validate_responses: bool
+    create_indexes: bool
+    allow_disk_use: bool
+    metrics: bool
+    explain: bool
+    refresh_providers: bool
+    version: str
+    default_db: str
+    provider: Mapping[str, str]
+    provider_fields: Mapping[str, FrozenSet[str]]
+    index_links_path: Path
+
+
+def _frozen(value: Any) -> Any:
+    """Immutable copy of a (nested) config value"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: _frozen(val) for key, val in value.items()})
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    if isinstance(value, list):
+        return tuple(_frozen(val) for val in value)
+    return value
+
+
 class Config:
-    """Base class for loading config files and its parameters"""
+    """Base class for loading config files and its parameters
+
+    The parameters are loaded once, on first access, into a frozen snapshot of
+    `settings_cls`, whose fields are available as attributes of the config.
+    Each parameter can be overridden by an environment variable named after it with the
+    `env_prefix`, e.g., `OPTIMADE_PAGE_LIMIT=100`. Booleans take the values of the
+    config file (e.g., "yes" or "no"), and mappings are JSON.
+    The config files and environment are only read again with :meth:`reload`.
+    """
 
-    index_links_path: Path = Path("./optimade/server/index_links.json")
+    settings_cls: Type[NamedTuple] = None
+    env_prefix: str = "OPTIMADE_"
+
+    _index_links_path: Path = Path("./optimade/server/index_links.json")
     _path: Path = Path("./optimade/server/config.ini")
 
     def __init__(self, server_cfg: Path = None):
@@ -20,21 +79,88 @@ class Config:
             if server_cfg is None
             else server_cfg
         )
+        self._settings = None
+        self._lock = Lock()
+        self._reload_hooks: List[Callable[[NamedTuple], None]] = []
 
     def __getattr__(self, name: str) -> Any:
+        # Only called for names not set on the instance, e.g., by tests overriding a parameter
+        if name.startswith("_") or name == "settings":
+            raise AttributeError(
+                f"'{self.__class__.__name__}' object has no attribute '{name}'"
+            )
+        try:
+            return getattr(self.settings, name)
+        except AttributeError:
+            raise AttributeError(
+                f"'{self.__class__.__name__}' object has no attribute '{name}'"
+            ) from None
+
+    @property
+    def settings(self) -> NamedTuple:
+        """The current snapshot of the config parameters, loaded on first access"""
+        settings = self._settings
+        if settings is None:
+            with self._lock:
+                if self._settings is None:
+                    self._settings = self._read_settings()
+                settings = self._settings
+        return settings
+
+    def reload(self) -> NamedTuple:
+        """Read the config files and environment again, and swap in the new settings
+
+        The new settings replace the previous ones at once, after which the functions
+        registered with :meth:`on_reload` are called with them.
+        Parameters used at import time (e.g., the backend and its collections) still
+        require a restart to change.
+        """
+        settings = self._read_settings()
+        with self._lock:
+            self._settings = settings
+        for hook in self._reload_hooks:
+            hook(settings)
+        return settings
+
+    def on_reload(self, hook: Callable[[NamedTuple], None]):
+        """Register `hook` to be called with the new settings on :meth:`reload`"""
+        self._reload_hooks.append(hook)
+        return hook
+
+    def _read_settings(self) -> NamedTuple:
         if not self._server.exists():
             self._create_server_config()
         self._load_server_config()
 
         ftype = self._path.suffix[1:]  # Remove initial "."
-        self.load(ftype)
-
-        if name not in self.__dict__:
-            raise AttributeError(
-                f"'{self.__class__.__name__}' object has no attribute '{name}'"
-            )
-
-        return getattr(self, name)
+        values = self.load(ftype)
+        values["index_links_path"] = self._index_links_path
+        values.update(self._environment_overrides())
+        return self.settings_cls(**_frozen(self._normalize(values)))
+
+    def _normalize(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Bring the values of the config file and environment into the types of the settings"""
+        return values
+
+    def _environment_overrides(self) -> Dict[str, Any]:
+        overrides = {}
+        for name, type_ in self.settings_cls.__annotations__.items():
+            variable = f"{self.env_prefix}{name.upper()}"
+            if variable not in os.environ:
+                continue
+            value = os.environ[variable]
+            try:
+                if type_ is bool:
+                    overrides[name] = ConfigParser.BOOLEAN_STATES[value.lower()]
+                elif type_ in (int, float, str, Path):
+                    overrides[name] = type_(value)
+                else:
+                    overrides[name] = json.loads(value)
+            except (KeyError, ValueError):
+                raise ValueError(
+                    f"Invalid value for {variable} ({type_}): {value!r}"
+                ) from None
+        return overrides
 
     def _create_server_config(self):
         """Create 'server.cfg' in top-package dir from 'server_template.cfg' if it does not exist"""
@@ -53,9 +179,11 @@ class Config:
         server.read(self._server)
 
         index_links_path = server.get(
-            SECTION, INDEX_LINKS_PATH, fallback=str(self.index_links_path)
+            SECTION, INDEX_LINKS_PATH, fallback=str(self._index_links_path)
         )
-        self.index_links_path = self._server.parent.joinpath(index_links_path).resolve()
+        self._index_links_path = self._server.parent.joinpath(
+            index_links_path
+        ).resolve()
 
         _path = server.get(SECTION, SERVER_CONFIG_PATH, fallback=str(self._path))
         self._path = self._server.parent.joinpath(_path).resolve()
@@ -65,17 +193,17 @@ class Config:
                 f'Cannot resolve {self._path}. Check the config-file exists. Note, "~" is not allowed.'
             )
 
-        if not self.index_links_path.exists():
+        if not self._index_links_path.exists():
             from warnings import warn
 
             warn(
-                f'Cannot resolve {self.index_links_path}. Check the index_links.json file exists. Note, "~" is not allowed.'
+                f'Cannot resolve {self._index_links_path}. Check the index_links.json file exists. Note, "~" is not allowed.'
             )
 
     def _get_load_func(self, format_name) -> Any:
         return getattr(self, f"load_from_{format_name}")
 
-    def load(self, ftype: str = None):
+    def load(self, ftype: str = None) -> Dict[str, Any]:
         try:
             f = self._get_load_func(ftype)
         except AttributeError:
@@ -83,7 +211,7 @@ class Config:
                 f"load function for config format {ftype} is not implemented"
             )
         else:
-            f()
+            return f()
 
 
 class ServerConfig(Config):
@@ -92,15 +220,33 @@ class ServerConfig(Config):
 
     """
 
+    settings_cls = ServerSettings
+
     @staticmethod
     def _DEFAULTS(field: str) -> Any:
         res = {
             "use_real_mongo": False,
+            "use_async_mongo": False,
             "mongo_database": "optimade",
             "links_collection": "links",
             "references_collection": "references",
             "structures_collection": "structures",
             "page_limit": 500,
+            "filter_cache_size": 1000,
+            "filter_cache_ttl": 3600,
+            "count_cache_size": 1000,
+            "count_cache_ttl": 300,
+            "reference_cache_size": 1000,
+            "reference_cache_ttl": 600,
+            "approximate_counts": False,
+            "approximate_count_limit": 10000,
+            "stream_responses": False,
+            "validate_responses": True,
+            "create_indexes": False,
+            "allow_disk_use": True,
+            "metrics": False,
+            "explain": False,
+            "refresh_providers": False,
             "version": "v0.10.0",
             "default_db": "test_server",
             "provider": {
@@ -110,86 +256,212 @@ class ServerConfig(Config):
                 "homepage": "http://example.com",
                 "index_base_url": "http://example.com/optimade/index",
             },
+            "provider_fields": {},
         }
         if field not in res:
             raise NoFallback(f"No fallback value found for '{field}'")
         return res[field]
 
-    def load_from_ini(self):
+    def load_from_ini(self) -> Dict[str, Any]:
         """ Load from the file "config.ini", if it exists. """
 
         config = ConfigParser()
         config.read(self._path)
+        values = {}
 
-        self.use_real_mongo = config.getboolean(
+        values["use_real_mongo"] = config.getboolean(
             "BACKEND", "USE_REAL_MONGO", fallback=self._DEFAULTS("use_real_mongo")
         )
-        self.mongo_database = config.get(
+        values["use_async_mongo"] = config.getboolean(
+            "BACKEND", "USE_ASYNC_MONGO", fallback=self._DEFAULTS("use_async_mongo")
+        )
+        values["mongo_database"] = config.get(
             "BACKEND", "MONGO_DATABASE", fallback=self._DEFAULTS("mongo_database")
         )
 
-        self.page_limit = config.getint(
+        values["page_limit"] = config.getint(
             "IMPLEMENTATION", "PAGE_LIMIT", fallback=self._DEFAULTS("page_limit")
         )
-        self.version = config.get(
+        values["filter_cache_size"] = config.getint(
+            "IMPLEMENTATION",
+            "FILTER_CACHE_SIZE",
+            fallback=self._DEFAULTS("filter_cache_size"),
+        )
+        values["filter_cache_ttl"] = config.getfloat(
+            "IMPLEMENTATION",
+            "FILTER_CACHE_TTL",
+            fallback=self._DEFAULTS("filter_cache_ttl"),
+        )
+        values["count_cache_size"] = config.getint(
+            "IMPLEMENTATION",
+            "COUNT_CACHE_SIZE",
+            fallback=self._DEFAULTS("count_cache_size"),
+        )
+        values["count_cache_ttl"] = config.getfloat(
+            "IMPLEMENTATION",
+            "COUNT_CACHE_TTL",
+            fallback=self._DEFAULTS("count_cache_ttl"),
+        )
+        values["reference_cache_size"] = config.getint(
+            "IMPLEMENTATION",
+            "REFERENCE_CACHE_SIZE",
+            fallback=self._DEFAULTS("reference_cache_size"),
+        )
+        values["reference_cache_ttl"] = config.getfloat(
+            "IMPLEMENTATION",
+            "REFERENCE_CACHE_TTL",
+            fallback=self._DEFAULTS("reference_cache_ttl"),
+        )
+        values["approximate_counts"] = config.getboolean(
+            "IMPLEMENTATION",
+            "APPROXIMATE_COUNTS",
+            fallback=self._DEFAULTS("approximate_counts"),
+        )
+        values["approximate_count_limit"] = config.getint(
+            "IMPLEMENTATION",
+            "APPROXIMATE_COUNT_LIMIT",
+            fallback=self._DEFAULTS("approximate_count_limit"),
+        )
+        values["stream_responses"] = config.getboolean(
+            "IMPLEMENTATION",
+            "STREAM_RESPONSES",
+            fallback=self._DEFAULTS("stream_responses"),
+        )
+        values["validate_responses"] = config.getboolean(
+            "IMPLEMENTATION",
+            "VALIDATE_RESPONSES",
+            fallback=self._DEFAULTS("validate_responses"),
+        )
+        values["metrics"] = config.getboolean(
+            "IMPLEMENTATION", "METRICS", fallback=self._DEFAULTS("metrics")
+        )
+        values["explain"] = config.getboolean(
+            "IMPLEMENTATION", "EXPLAIN", fallback=self._DEFAULTS("explain")
+        )
+        values["refresh_providers"] = config.getboolean(
+            "IMPLEMENTATION",
+            "REFRESH_PROVIDERS",
+            fallback=self._DEFAULTS("refresh_providers"),
+        )
+        values["create_indexes"] = config.getboolean(
+            "BACKEND", "CREATE_INDEXES", fallback=self._DEFAULTS("create_indexes")
+        )
+        values["allow_disk_use"] = config.getboolean(
+            "BACKEND", "ALLOW_DISK_USE", fallback=self._DEFAULTS("allow_disk_use")
+        )
+        values["version"] = config.get(
             "IMPLEMENTATION", "VERSION", fallback=self._DEFAULTS("version")
         )
-        self.default_db = config.get(
+        values["default_db"] = config.get(
             "IMPLEMENTATION", "DEFAULT_DB", fallback=self._DEFAULTS("default_db")
         )
 
         if "PROVIDER" in config.sections():
-            self.provider = dict(config["PROVIDER"])
+            values["provider"] = dict(config["PROVIDER"])
         else:
-            self.provider = self._DEFAULTS("provider")
+            values["provider"] = self._DEFAULTS("provider")
 
-        self.provider_fields = {}
-        for endpoint in {"links", "references", "structures"}:
-            self.provider_fields[endpoint] = (
+        values["provider_fields"] = {}
+        for endpoint in ENDPOINTS:
+            values["provider_fields"][endpoint] = (
                 {field for field, _ in config[endpoint].items() if _ == ""}
                 if endpoint in config
                 else set()
             )
 
             # MONGO collections
-            setattr(
-                self,
-                f"{endpoint}_collection",
-                config.get(
-                    "BACKEND",
-                    f"{endpoint.upper()}_COLLECTION",
-                    fallback=self._DEFAULTS(f"{endpoint}_collection"),
-                ),
+            values[f"{endpoint}_collection"] = config.get(
+                "BACKEND",
+                f"{endpoint.upper()}_COLLECTION",
+                fallback=self._DEFAULTS(f"{endpoint}_collection"),
             )
 
-    def load_from_json(self):
+        return values
+
+    def load_from_json(self) -> Dict[str, Any]:
         """ Load from the file "config.json", if it exists. """
 
         with open(self._path, "r") as f:
             config = json.load(f)
+        values = {}
 
-        self.use_real_mongo = bool(
+        values["use_real_mongo"] = bool(
             config.get("use_real_mongo", self._DEFAULTS("use_real_mongo"))
         )
-        self.mongo_database = config.get(
+        values["use_async_mongo"] = bool(
+            config.get("use_async_mongo", self._DEFAULTS("use_async_mongo"))
+        )
+        values["mongo_database"] = config.get(
             "mongo_database", self._DEFAULTS("mongo_database")
         )
-        for endpoint in {"links", "references", "structures"}:
-            setattr(
-                self,
-                f"{endpoint}_collection",
-                config.get(f"{endpoint}_collection"),
-                getattr(self._DEFAULTS(f"{endpoint}_collection")),
+        for endpoint in ENDPOINTS:
+            values[f"{endpoint}_collection"] = config.get(
+                f"{endpoint}_collection", self._DEFAULTS(f"{endpoint}_collection")
             )
 
-        self.page_limit = int(config.get("page_limit", self._DEFAULTS("page_limit")))
-        self.version = config.get("version", self._DEFAULTS("version"))
-        self.default_db = config.get("default_db", self._DEFAULTS("default_db"))
+        values["page_limit"] = int(
+            config.get("page_limit", self._DEFAULTS("page_limit"))
+        )
+        values["filter_cache_size"] = int(
+            config.get("filter_cache_size", self._DEFAULTS("filter_cache_size"))
+        )
+        values["filter_cache_ttl"] = float(
+            config.get("filter_cache_ttl", self._DEFAULTS("filter_cache_ttl"))
+        )
+        values["count_cache_size"] = int(
+            config.get("count_cache_size", self._DEFAULTS("count_cache_size"))
+        )
+        values["count_cache_ttl"] = float(
+            config.get("count_cache_ttl", self._DEFAULTS("count_cache_ttl"))
+        )
+        values["reference_cache_size"] = int(
+            config.get("reference_cache_size", self._DEFAULTS("reference_cache_size"))
+        )
+        values["reference_cache_ttl"] = float(
+            config.get("reference_cache_ttl", self._DEFAULTS("reference_cache_ttl"))
+        )
+        values["approximate_counts"] = bool(
+            config.get("approximate_counts", self._DEFAULTS("approximate_counts"))
+        )
+        values["approximate_count_limit"] = int(
+            config.get(
+                "approximate_count_limit", self._DEFAULTS("approximate_count_limit")
+            )
+        )
+        values["stream_responses"] = bool(
+            config.get("stream_responses", self._DEFAULTS("stream_responses"))
+        )
+        values["validate_responses"] = bool(
+            config.get("validate_responses", self._DEFAULTS("validate_responses"))
+        )
+        values["metrics"] = bool(config.get("metrics", self._DEFAULTS("metrics")))
+        values["explain"] = bool(config.get("explain", self._DEFAULTS("explain")))
+        values["refresh_providers"] = bool(
+            config.get("refresh_providers", self._DEFAULTS("refresh_providers"))
+        )
+        values["create_indexes"] = bool(
+            config.get("create_indexes", self._DEFAULTS("create_indexes"))
+        )
+        values["allow_disk_use"] = bool(
+            config.get("allow_disk_use", self._DEFAULTS("allow_disk_use"))
+        )
+        values["version"] = config.get("version", self._DEFAULTS("version"))
+        values["default_db"] = config.get("default_db", self._DEFAULTS("default_db"))
 
-        self.provider = config.get("provider", self._DEFAULTS("provider"))
-        self.provider_fields = set(
-            config.get("provider_fields", self._DEFAULTS("provider_fields"))
+        values["provider"] = config.get("provider", self._DEFAULTS("provider"))
+        # Provider-specific fields by endpoint, e.g., {"structures": ["band_gap"]}
+        values["provider_fields"] = config.get(
+            "provider_fields", self._DEFAULTS("provider_fields")
         )
 
+        return values
+
+    def _normalize(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        values["provider_fields"] = {
+            endpoint: set(values["provider_fields"].get(endpoint, ()))
+            for endpoint in ENDPOINTS
+        }
+        return values
+
 
 CONFIG = ServerConfig()
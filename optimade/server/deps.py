@@ -26,9 +26,16 @@ Example: `chemical_formula = "Al" OR (prototype_formula = "AB" AND elements HAS
         page_limit: NonnegativeInt = Query(CONFIG.page_limit),
         page_offset: NonnegativeInt = Query(0),
         page_page: NonnegativeInt = Query(0),
-        page_cursor: NonnegativeInt = Query(0),
+        page_cursor: str = Query(
+            "",
+            description="Opaque cursor to the page following a previous response, as given in its `next` link.",
+        ),
         page_above: NonnegativeInt = Query(0),
         page_below: NonnegativeInt = Query(0),
+        include: str = Query(
+            "references",
+            description="Comma-separated list of the types of related entries to include in the response. Empty to include none.",
+        ),
     ):
         self.filter = filter
         self.response_format = response_format
@@ -41,6 +48,7 @@ Example: `chemical_formula = "Al" OR (prototype_formula = "AB" AND elements HAS
         self.page_cursor = page_cursor
         self.page_above = page_above
         self.page_below = page_below
+        self.include = include
 
 
 class SingleEntryQueryParams:
@@ -52,7 +60,12 @@ class SingleEntryQueryParams:
         response_format: str = Query("json"),
         email_address: EmailStr = Query(""),
         response_fields: str = Query(""),
+        include: str = Query(
+            "references",
+            description="Comma-separated list of the types of related entries to include in the response. Empty to include none.",
+        ),
     ):
         self.response_format = response_format
         self.email_address = email_address
         self.response_fields = response_fields
+        self.include = include
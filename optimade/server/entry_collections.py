@@ -1,17 +1,37 @@
+import asyncio
+import base64
+import binascii
+import json
 from abc import abstractmethod
-from typing import Collection, Tuple, List, Union
-
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from typing import (
+    Any,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    Tuple,
+    List,
+    Optional,
+    Union,
+)
+
+import bson.json_util
 import mongomock
 import pymongo.collection
 from fastapi import HTTPException
+from lark.exceptions import VisitError
 
-from optimade.filterparser import LarkParser
-from optimade.filtertransformers.mongo import NewMongoTransformer
+from optimade.filterparser import ParserError, get_parser
+from optimade.filtertransformers.mongo import NewMongoTransformer, normalize_filter
 from optimade.models import NonnegativeInt, EntryResource
 
+from .cache import LRUCache
 from .config import CONFIG
 from .deps import EntryListingQueryParams, SingleEntryQueryParams
 from .mappers import ResourceMapper
+from .metrics import timed
 
 
 if CONFIG.use_real_mongo:
@@ -21,13 +41,76 @@ else:
 
 client = MongoClient()
 
+if CONFIG.use_real_mongo and CONFIG.use_async_mongo:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async_client = AsyncIOMotorClient()
+else:
+    async_client = None
+
+# JSON schema types of the fields that can be sorted on, and indexed as scalars
+SCALAR_TYPES = {"string", "integer", "number", "boolean"}
+
+# Runs independent database round trips of a request (e.g., counts) alongside the page query
+query_executor = ThreadPoolExecutor(thread_name_prefix="optimade-query")
+
+
+def encode_page_cursor(sort_spec: List[Tuple[str, int]], keyset: List[Any]) -> str:
+    """Encode the sort order and the sort key values of the last entry of a page as an opaque cursor"""
+    payload = bson.json_util.dumps({"sort": sort_spec, "keyset": keyset})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_page_cursor(cursor: str, sort_spec: List[Tuple[str, int]]) -> dict:
+    """Decode a page cursor into a MongoDB filter for the documents following it in `sort_spec` order.
+
+    For sort keys `k1, ..., kn` with the values `v1, ..., vn` in the cursor, a following document
+    has, for some `i`, `k1 == v1, ..., k(i-1) == v(i-1)` and `ki` after `vi`.
+    Null and missing values sort before all other values, i.e., last in descending order.
+    With an index on the sort keys, this is a range scan instead of skipping over all previous pages.
+    """
+    try:
+        payload = bson.json_util.loads(
+            base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        )
+        cursor_sort = [tuple(_) for _ in payload["sort"]]
+        keyset = list(payload["keyset"])
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid page_cursor")
+
+    if cursor_sort != list(sort_spec) or len(keyset) != len(sort_spec):
+        raise HTTPException(
+            status_code=400,
+            detail="The page_cursor does not match the sort order of the query",
+        )
+
+    clauses = []
+    for i, ((field, sort_dir), value) in enumerate(zip(sort_spec, keyset)):
+        if value is None:
+            if sort_dir < 0:
+                # Nothing sorts after null: the following documents are null (or missing)
+                # on this key too, and are told apart by the next keys, down to `_id`
+                continue
+            after = {field: {"$ne": None}}
+        elif sort_dir > 0:
+            after = {field: {"$gt": value}}
+        else:
+            after = {"$or": [{field: {"$lt": value}}, {field: None}]}
+        equal = [{key: val} for (key, _), val in zip(sort_spec[:i], keyset[:i])]
+        clauses.append({"$and": equal + [after]} if equal else after)
+
+    if not clauses:
+        # Nothing can follow the very last document in sort order
+        return {"_id": {"$exists": False}}
+    return {"$or": clauses} if len(clauses) > 1 else clauses[0]
+
 
 class EntryCollection(Collection):  # pylint: disable=inherit-non-class
     def __init__(
         self, collection, resource_cls: EntryResource, resource_mapper: ResourceMapper
     ):
         self.collection = collection
-        self.parser = LarkParser()
+        self.parser = get_parser()
         self.resource_cls = resource_cls
         self.resource_mapper = resource_mapper
 
@@ -55,10 +138,34 @@ class EntryCollection(Collection):  # pylint: disable=inherit-non-class
                 attributes = attributes[next_key]
         return set(attributes["properties"].keys())
 
+    def get_attribute_schemas(self) -> Dict[str, dict]:
+        """The JSON schemas of the top-level fields and attributes of the entry resource"""
+        schema = self.resource_cls.schema()
+
+        def resolve(value: dict) -> dict:
+            if "$ref" in value:
+                resolved = schema
+                for key in value["$ref"].split("/")[1:]:
+                    resolved = resolved[key]
+                return resolved
+            if "allOf" in value:
+                resolved = {"properties": {}}
+                for sub_schema in value["allOf"]:
+                    resolved["properties"].update(
+                        resolve(sub_schema).get("properties", {})
+                    )
+                return resolved
+            return value
+
+        properties = dict(schema["properties"])
+        attributes = resolve(properties.pop("attributes", {}))
+        properties.update(attributes.get("properties", {}))
+        return {name: resolve(value) for name, value in properties.items()}
+
     @abstractmethod
     def find(
         self, params: EntryListingQueryParams
-    ) -> Tuple[List[EntryResource], NonnegativeInt, bool, set]:
+    ) -> Tuple[List[EntryResource], NonnegativeInt, bool, set, Optional[str]]:
         """
         Fetches results and indicates if more data is available.
 
@@ -68,7 +175,21 @@ class EntryCollection(Collection):  # pylint: disable=inherit-non-class
             params (EntryListingQueryParams): entry listing URL query params
 
         Returns:
-            Tuple[List[Entry], NonnegativeInt, bool, set]: (results, data_returned, more_data_available, fields)
+            Tuple[List[Entry], NonnegativeInt, bool, set, Optional[str]]: (results, data_returned,
+                more_data_available, fields, next_page_cursor)
+
+        """
+
+    @abstractmethod
+    def find_by_ids(self, ids: Iterable[str]) -> List[EntryResource]:
+        """
+        Fetches the entries with the given IDs.
+
+        Args:
+            ids (Iterable[str]): entry IDs, possibly with duplicates
+
+        Returns:
+            List[Entry]: the entries found, in the order of their first ID in `ids`
 
         """
 
@@ -84,16 +205,54 @@ class MongoCollection(EntryCollection):
         ],
         resource_cls: EntryResource,
         resource_mapper: ResourceMapper,
+        entry_cache: str = None,
     ):
         super().__init__(collection, resource_cls, resource_mapper)
-        self.transformer = NewMongoTransformer()
+        # Prefix of the config parameters sizing `entry_cache`, e.g., "reference" for
+        # `reference_cache_size` and `reference_cache_ttl` (`None` caches no entries)
+        self.entry_cache_config = entry_cache
+        self.transformer = NewMongoTransformer(
+            length_aliases=dict(resource_mapper.LENGTH_ALIASES),
+            has_only_aliases=dict(resource_mapper.HAS_ONLY_ALIASES),
+            zip_aliases=dict(resource_mapper.ZIP_ALIASES),
+            reversed_aliases=dict(resource_mapper.REVERSED_ALIASES),
+            ngram_aliases=dict(resource_mapper.NGRAM_ALIASES),
+        )
+        self.parser = get_parser(
+            version=(0, 10, 0), variant="default"
+        )  # The NewMongoTransformer only supports v0.10.0 as the latest grammar
+        self.configure()
+
+    def configure(self):
+        """Apply the current config parameters, dropping all compiled filters, counts and entries
 
+        Called on creation, and again when the config is reloaded with `CONFIG.reload()`.
+        """
         self.provider = CONFIG.provider["prefix"]
-        self.provider_fields = CONFIG.provider_fields.get(resource_mapper.ENDPOINT, [])
+        self.provider_fields = CONFIG.provider_fields.get(
+            self.resource_mapper.ENDPOINT, []
+        )
         self.page_limit = CONFIG.page_limit
-        self.parser = LarkParser(
-            version=(0, 10, 0), variant="default"
-        )  # The NewMongoTransformer only supports v0.10.0 as the latest grammar
+        self.filter_cache = LRUCache(
+            maxsize=CONFIG.filter_cache_size, ttl=CONFIG.filter_cache_ttl
+        )
+        self.count_cache = LRUCache(
+            maxsize=CONFIG.count_cache_size, ttl=CONFIG.count_cache_ttl
+        )
+        self.approximate_counts = CONFIG.approximate_counts
+        self.approximate_count_limit = CONFIG.approximate_count_limit
+        self.validate_responses = CONFIG.validate_responses
+        if self.entry_cache_config is None:
+            self.entry_cache = LRUCache(maxsize=0)
+        else:
+            self.entry_cache = LRUCache(
+                maxsize=getattr(CONFIG, f"{self.entry_cache_config}_cache_size"),
+                ttl=getattr(CONFIG, f"{self.entry_cache_config}_cache_ttl"),
+            )
+        self.sortable_fields = self._sortable_fields()
+        # Sorts that are not backed by an index may exceed the memory limit of MongoDB's
+        # in-memory sort, unless they can write to temporary files (mongomock cannot)
+        self.allow_disk_use = CONFIG.allow_disk_use and CONFIG.use_real_mongo
 
     def __len__(self):
         return self.collection.estimated_document_count()
@@ -111,25 +270,263 @@ class MongoCollection(EntryCollection):
 
     def find(
         self, params: Union[EntryListingQueryParams, SingleEntryQueryParams]
-    ) -> Tuple[List[EntryResource], NonnegativeInt, bool, set]:
+    ) -> Tuple[List[EntryResource], NonnegativeInt, bool, set, Optional[str]]:
         criteria = self._parse_params(params)
+        fields = criteria.pop("fields")
+        count_filter = criteria.pop("count_filter")
+        limit = criteria.get("limit")
+        sort_spec = criteria.get("sort", [])
 
-        all_fields = criteria.pop("fields")
-        if getattr(params, "response_fields", False):
-            fields = set(params.response_fields.split(","))
-        else:
-            fields = all_fields.copy()
+        # Count the matching documents while the page is being fetched
+        count = None
+        if isinstance(params, EntryListingQueryParams):
+            count = query_executor.submit(self.count_data_returned, count_filter)
+            criteria = self._peek_criteria(criteria)
+
+        try:
+            with timed(self.resource_mapper.ENDPOINT, "find"):
+                docs = list(self.collection.find(**criteria))
+            keysets = [self._keyset(doc, sort_spec) for doc in docs]
+            results = self._to_resources(docs, partial=bool(fields))
+
+            data_returned = count.result() if count is not None else None
+        finally:
+            # If the page query failed, the count is not needed (if it has not started yet)
+            if count is not None:
+                count.cancel()
+
+        return self._find_result(
+            params, results, data_returned, fields, limit, sort_spec, keysets
+        )
+
+    def find_iter(
+        self, params: EntryListingQueryParams
+    ) -> Tuple[Iterator[EntryResource], dict]:
+        """Variant of :meth:`find` for entry listings, yielding the entries one at a time
+        as they come off the database cursor.
+
+        Returns:
+            Tuple[Iterator[EntryResource], dict]: (results, page), where `page` holds the
+                excluded `fields` and, once `results` is exhausted, `data_returned`,
+                `more_data_available` and `next_page_cursor`.
+
+        """
+        criteria = self._parse_params(params)
+        fields = criteria.pop("fields")
+        count_filter = criteria.pop("count_filter")
+        limit = criteria.get("limit")
+        sort_spec = criteria.get("sort", [])
+
+        count = query_executor.submit(self.count_data_returned, count_filter)
+        try:
+            cursor = self.collection.find(**self._peek_criteria(criteria))
+        except Exception:
+            count.cancel()
+            raise
+        page = {"fields": fields}
+
+        def results():
+            seen = 0
+            keyset = None
+            more_data_available = False
+            next_page_cursor = None
+            try:
+                for doc in cursor:
+                    if limit and seen == limit:
+                        more_data_available = True
+                        next_page_cursor = encode_page_cursor(sort_spec, keyset)
+                        break
+                    keyset = self._keyset(doc, sort_spec)
+                    seen += 1
+                    yield self._to_resource(doc, partial=bool(fields))
+
+                data_returned = count.result()
+            finally:
+                # Also when the cursor failed, or the entries were not all consumed
+                count.cancel()
+
+            page["data_returned"] = max(
+                data_returned, params.page_offset + seen + int(more_data_available)
+            )
+            page["more_data_available"] = more_data_available
+            page["next_page_cursor"] = next_page_cursor
+
+        return results(), page
 
-        results = []
-        for doc in self.collection.find(**criteria):
-            results.append(self.resource_cls(**self.resource_mapper.map_back(doc)))
+    def find_by_ids(self, ids: Iterable[str]) -> List[Union[EntryResource, dict]]:
+        """Fetch the entries with the given IDs, looking them up in ``entry_cache`` first.
 
+        Only the IDs missing from the cache are queried, with a single ``$in`` filter.
+        """
+        ids = list(dict.fromkeys(ids))
+        cached, missing = self._cached_by_ids(ids)
+        if missing:
+            docs = list(self.collection.find(**self._ids_criteria(missing)))
+            cached.extend(self._cache_entries(self._to_resources(docs)))
+        return self._order_by_ids(cached, ids)
+
+    def invalidate(self, ids: Iterable[str] = None):
+        """Drop the entries with the given IDs from ``entry_cache``, or all entries if `ids` is `None`.
+
+        This is the hook for a change stream (or any other writer) to call when entries
+        are updated; otherwise cached entries expire after the cache TTL.
+        """
+        if ids is None:
+            self.entry_cache.clear()
+            return
+        for id_ in ids:
+            self.entry_cache.delete(id_)
+
+    def count_data_returned(self, filter_: dict) -> int:
+        """Count the documents matching `filter_`, irrespective of pagination.
+
+        Counts are cached in ``count_cache``, so that requests for further pages of the
+        same filter do not count again.
+        With approximate counts enabled, the count of an empty filter is estimated from
+        the collection metadata and all other counts are capped at ``approximate_count_limit``.
+        """
+        key = self._count_key(filter_)
+        data_returned = self.count_cache.get(key)
+        if data_returned is None:
+            with timed(self.resource_mapper.ENDPOINT, "count"):
+                if not self.approximate_counts:
+                    data_returned = self.count(filter=filter_)
+                elif filter_:
+                    data_returned = self.count(
+                        filter=filter_, limit=self.approximate_count_limit
+                    )
+                else:
+                    data_returned = self.collection.estimated_document_count()
+            self.count_cache.set(key, data_returned)
+        return data_returned
+
+    def data_returned_is_approximate(
+        self, params: EntryListingQueryParams, data_returned: NonnegativeInt
+    ) -> bool:
+        """Whether `data_returned` of a listing is a lower bound or an estimate"""
+        if not self.approximate_counts:
+            return False
+        return not params.filter or data_returned >= self.approximate_count_limit
+
+    @staticmethod
+    def _count_key(filter_: dict) -> str:
+        """Cache key of a MongoDB filter for ``count_cache``"""
+        return json.dumps(filter_, sort_keys=True, default=str)
+
+    def _to_resource(
+        self, doc: dict, partial: bool = False
+    ) -> Union[EntryResource, dict]:
+        """Map a MongoDB document back to an entry resource
+
+        With ``VALIDATE_RESPONSES`` off, the documents are trusted to have been validated
+        when they were stored and the mapped dict is returned as is.
+        The same goes for `partial` documents, i.e., projected onto the requested
+        `response_fields`, which lack the required fields of the resource.
+        """
+        doc = self.resource_mapper.map_back(doc)
+        if partial or not self.validate_responses:
+            return doc
+        return self.resource_cls(**doc)
+
+    def _to_resources(
+        self, docs: List[dict], partial: bool = False
+    ) -> List[Union[EntryResource, dict]]:
+        """Map a page of MongoDB documents back to entry resources, see :meth:`_to_resource`"""
+        with timed(self.resource_mapper.ENDPOINT, "map_back"):
+            docs = self.resource_mapper.map_back_many(docs)
+        if partial or not self.validate_responses:
+            return docs
+        with timed(self.resource_mapper.ENDPOINT, "validation"):
+            return [self.resource_cls(**doc) for doc in docs]
+
+    def _ids_criteria(self, ids: List[str]) -> dict:
+        """Query for the full entries with the given IDs"""
+        return {
+            "filter": {self.resource_mapper.alias_for("id"): {"$in": ids}},
+            "projection": [
+                self.resource_mapper.alias_for(f) for f in self._all_fields()
+            ],
+        }
+
+    def _cached_by_ids(
+        self, ids: List[str]
+    ) -> Tuple[List[Union[EntryResource, dict]], List[str]]:
+        """Split `ids` into the entries found in ``entry_cache`` and the IDs to query"""
+        if self.entry_cache.maxsize <= 0:
+            return [], ids
+        cached, missing = [], []
+        for id_ in ids:
+            entry = self.entry_cache.get(id_)
+            if entry is None:
+                missing.append(id_)
+            else:
+                cached.append(entry)
+        return cached, missing
+
+    def _cache_entries(
+        self, entries: List[Union[EntryResource, dict]]
+    ) -> List[Union[EntryResource, dict]]:
+        """Store full entries in ``entry_cache`` by ID"""
+        if self.entry_cache.maxsize > 0:
+            for entry in entries:
+                self.entry_cache.set(
+                    entry["id"] if isinstance(entry, dict) else entry.id, entry
+                )
+        return entries
+
+    @staticmethod
+    def _order_by_ids(
+        results: List[Union[EntryResource, dict]], ids: List[str]
+    ) -> List[Union[EntryResource, dict]]:
+        """Sort the entries in the order of `ids`"""
+        order = {id_: index for index, id_ in enumerate(ids)}
+        return sorted(
+            results,
+            key=lambda entry: order.get(
+                entry["id"] if isinstance(entry, dict) else entry.id, len(order)
+            ),
+        )
+
+    @staticmethod
+    def _keyset(doc: dict, sort_spec: List[Tuple[str, int]]) -> list:
+        """The values of the sort keys of a MongoDB document"""
+        keyset = []
+        for field, _ in sort_spec:
+            value = doc
+            for key in field.split("."):
+                value = value.get(key) if isinstance(value, dict) else None
+            keyset.append(value)
+        return keyset
+
+    @staticmethod
+    def _peek_criteria(criteria: dict) -> dict:
+        """Request one document more than the page limit to know if more data is available"""
+        if criteria.get("limit"):
+            criteria = dict(criteria, limit=criteria["limit"] + 1)
+        return criteria
+
+    @staticmethod
+    def _find_result(
+        params: Union[EntryListingQueryParams, SingleEntryQueryParams],
+        results: List[EntryResource],
+        data_returned: NonnegativeInt,
+        fields: set,
+        limit: int = None,
+        sort_spec: List[Tuple[str, int]] = None,
+        keysets: List[list] = None,
+    ) -> Tuple[List[EntryResource], NonnegativeInt, bool, set, Optional[str]]:
+        """Assemble the return value of :meth:`find` from the fetched results"""
+        next_page_cursor = None
         if isinstance(params, EntryListingQueryParams):
-            nresults_now = len(results)
-            criteria_nolimit = criteria.copy()
-            criteria_nolimit.pop("limit", None)
-            data_returned = self.count(**criteria_nolimit)
-            more_data_available = nresults_now < data_returned
+            more_data_available = bool(limit) and len(results) > limit
+            if more_data_available:
+                results = results[:limit]
+                next_page_cursor = encode_page_cursor(sort_spec, keysets[limit - 1])
+            # A capped or cached count must not be below the entries seen so far
+            data_returned = max(
+                data_returned,
+                params.page_offset + len(results) + int(more_data_available),
+            )
         else:
             # SingleEntryQueryParams, e.g., /structures/{entry_id}
             data_returned = 1
@@ -141,12 +538,18 @@ class MongoCollection(EntryCollection):
                 )
             results = results[0] if results else None
 
-        return results, data_returned, more_data_available, all_fields - fields
+        return (
+            results,
+            data_returned,
+            more_data_available,
+            fields,
+            next_page_cursor,
+        )
 
     def _alias_filter(self, filter_: dict) -> dict:
         res = {}
         for key, value in filter_.items():
-            if key in ["$and", "$or"]:
+            if key in ["$and", "$or", "$nor"]:
                 res[key] = [self._alias_filter(item) for item in value]
             else:
                 new_value = value
@@ -155,15 +558,93 @@ class MongoCollection(EntryCollection):
                 res[self.resource_mapper.alias_for(key)] = new_value
         return res
 
+    def _compile_filter(self, filter_: str) -> dict:
+        """Parse, transform, alias and normalize an OPTiMaDe filter string into a MongoDB filter.
+
+        Compiled filters are cached by their raw filter string in ``filter_cache``.
+        A copy is returned, so the cached filter is never modified by the caller.
+        Filters are normalized with :func:`normalize_filter`, so that equivalent filters
+        share their entry in ``count_cache``.
+
+        Raises:
+            HTTPException: 400 if the filter cannot be parsed, and 501 if it uses
+                a construct that the backend does not implement.
+
+        """
+        mongo_filter = self.filter_cache.get(filter_)
+        if mongo_filter is None:
+            try:
+                with timed(self.resource_mapper.ENDPOINT, "parse"):
+                    tree = self.parser.parse(filter_)
+            except ParserError as exc:
+                raise HTTPException(
+                    status_code=400, detail=f"Error trying to parse filter: {exc}"
+                )
+            try:
+                with timed(self.resource_mapper.ENDPOINT, "transform"):
+                    mongo_filter = normalize_filter(
+                        self._alias_filter(self.transformer.transform(tree))
+                    )
+            except VisitError as exc:
+                if isinstance(exc.orig_exc, NotImplementedError):
+                    raise HTTPException(status_code=501, detail=str(exc.orig_exc))
+                raise
+            self.filter_cache.set(filter_, mongo_filter)
+        return deepcopy(mongo_filter)
+
+    def _all_fields(self) -> set:
+        # All OPTiMaDe fields
+        fields = {"id", "type"}
+        fields |= self.get_attribute_fields()
+        # All provider-specific fields
+        fields |= {self.provider + _ for _ in self.provider_fields}
+        return fields
+
+    def _sortable_fields(self) -> set:
+        # OPTiMaDe fields holding scalar values, and all provider-specific fields
+        fields = {
+            name
+            for name, value in self.get_attribute_schemas().items()
+            if value.get("type") in SCALAR_TYPES
+        }
+        fields |= {self.provider + _ for _ in self.provider_fields}
+        return fields
+
+    def _sort_spec(self, sort: str) -> List[Tuple[str, int]]:
+        """The MongoDB sort spec of the `sort` query parameter, ending with `_id` to break ties
+
+        The sort keys are aliased to their database fields, and the tie-breaking `_id` is sorted
+        in the direction of the last sort key. The indexes proposed by the index advisor,
+        e.g., ``{nsites: 1, _id: 1}``, then back the sort in both directions.
+        """
+        sort_spec = []
+        for elt in sort.split(",") if sort else []:
+            field = elt.strip()
+            sort_dir = 1
+            if field.startswith("-"):
+                field = field[1:]
+                sort_dir = -1
+            if field not in self.sortable_fields:
+                detail = (
+                    f"Unable to sort on unknown field '{field}'"
+                    if field not in self._all_fields()
+                    else f"Sorting on '{field}' is not supported, only on fields with single values"
+                )
+                raise HTTPException(status_code=400, detail=detail)
+            real = self.resource_mapper.alias_for(field)
+            # E.g., chemical_formula_descriptive and chemical_formula_reduced share a field
+            if real not in (key for key, _ in sort_spec):
+                sort_spec.append((real, sort_dir))
+        sort_spec.append(("_id", sort_spec[-1][1] if sort_spec else 1))
+        return sort_spec
+
     def _parse_params(
         self, params: Union[EntryListingQueryParams, SingleEntryQueryParams]
     ) -> dict:
         cursor_kwargs = {}
 
         if getattr(params, "filter", False):
-            tree = self.parser.parse(params.filter)
-            mongo_filter = self.transformer.transform(tree)
-            cursor_kwargs["filter"] = self._alias_filter(mongo_filter)
+            cursor_kwargs["filter"] = self._compile_filter(params.filter)
         else:
             cursor_kwargs["filter"] = {}
 
@@ -187,28 +668,170 @@ class MongoCollection(EntryCollection):
                 limit = self.page_limit
             cursor_kwargs["limit"] = limit
 
-        # All OPTiMaDe fields
-        fields = {"id", "type"}
-        fields |= self.get_attribute_fields()
-        # All provider-specific fields
-        fields |= {self.provider + _ for _ in self.provider_fields}
-        cursor_kwargs["fields"] = fields
+        fields = self._all_fields()
+        if getattr(params, "response_fields", False):
+            # Only the requested fields are read from the database, besides the
+            # top-level fields that are part of every resource object.
+            # Other database fields (e.g., derived fields) are never returned
+            requested = {_.strip() for _ in params.response_fields.split(",")}
+            requested = (
+                requested & fields
+            ) | self.resource_mapper.TOP_LEVEL_NON_ATTRIBUTES_FIELDS
+            cursor_kwargs["fields"] = fields - requested
+            fields = requested
+        else:
+            cursor_kwargs["fields"] = set()
         cursor_kwargs["projection"] = [
             self.resource_mapper.alias_for(f) for f in fields
         ]
 
-        if getattr(params, "sort", False):
-            sort_spec = []
-            for elt in params.sort.split(","):
-                field = elt
-                sort_dir = 1
-                if elt.startswith("-"):
-                    field = field[1:]
-                    sort_dir = -1
-                sort_spec.append((field, sort_dir))
+        if isinstance(params, EntryListingQueryParams):
+            # `_id` breaks ties, so that the sort order is total, as needed for page cursors
+            sort_spec = self._sort_spec(params.sort)
             cursor_kwargs["sort"] = sort_spec
+            if self.allow_disk_use:
+                cursor_kwargs["allow_disk_use"] = True
+            # The sort keys of the last entry make up the page cursor
+            cursor_kwargs["projection"].extend(
+                field
+                for field, _ in sort_spec
+                if field not in cursor_kwargs["projection"]
+            )
+
+        # A page cursor restricts the query to the documents after the previous page,
+        # while data_returned counts all documents matching the filter
+        cursor_kwargs["count_filter"] = cursor_kwargs["filter"]
+        if getattr(params, "page_cursor", False):
+            keyset_filter = decode_page_cursor(params.page_cursor, sort_spec)
+            if cursor_kwargs["filter"]:
+                keyset_filter = {"$and": [cursor_kwargs["filter"], keyset_filter]}
+            cursor_kwargs["filter"] = keyset_filter
 
         if getattr(params, "page_offset", False):
             cursor_kwargs["skip"] = params.page_offset
 
         return cursor_kwargs
+
+
+class AsyncMongoCollection(MongoCollection):
+    """MongoCollection backed by an asynchronous `motor` collection.
+
+    :meth:`find`, :meth:`find_by_ids`, :meth:`count` and :meth:`count_available` are coroutines
+    and must be awaited.
+    """
+
+    def __init__(
+        self,
+        collection: "motor.motor_asyncio.AsyncIOMotorCollection",  # noqa: F821
+        resource_cls: EntryResource,
+        resource_mapper: ResourceMapper,
+        entry_cache: str = None,
+    ):
+        super().__init__(collection, resource_cls, resource_mapper, entry_cache)
+
+    def __len__(self):
+        raise TypeError(
+            f"Use 'await {self.__class__.__name__}.count_available()' instead of len()"
+        )
+
+    def __contains__(self, entry):
+        raise TypeError(
+            f"Use 'await {self.__class__.__name__}.count()' instead of the 'in' operator"
+        )
+
+    async def count_available(self) -> int:
+        return await self.collection.estimated_document_count()
+
+    async def count(self, **kwargs):
+        for k in list(kwargs.keys()):
+            if k not in ("filter", "skip", "limit", "hint", "maxTimeMS"):
+                del kwargs[k]
+        if "filter" not in kwargs:  # "filter" is needed for count_documents()
+            kwargs["filter"] = {}
+        return await self.collection.count_documents(**kwargs)
+
+    async def find(
+        self, params: Union[EntryListingQueryParams, SingleEntryQueryParams]
+    ) -> Tuple[List[EntryResource], NonnegativeInt, bool, set, Optional[str]]:
+        criteria = self._parse_params(params)
+        fields = criteria.pop("fields")
+        count_filter = criteria.pop("count_filter")
+        limit = criteria.get("limit")
+        sort_spec = criteria.get("sort", [])
+        keysets = []
+
+        async def fetch_page(criteria):
+            with timed(self.resource_mapper.ENDPOINT, "find"):
+                docs = [doc async for doc in self.collection.find(**criteria)]
+            keysets.extend(self._keyset(doc, sort_spec) for doc in docs)
+            return self._to_resources(docs, partial=bool(fields))
+
+        if isinstance(params, EntryListingQueryParams):
+            results, data_returned = await asyncio.gather(
+                fetch_page(self._peek_criteria(criteria)),
+                self.count_data_returned(count_filter),
+            )
+        else:
+            results, data_returned = await fetch_page(criteria), None
+
+        return self._find_result(
+            params, results, data_returned, fields, limit, sort_spec, keysets
+        )
+
+    async def find_by_ids(self, ids: Iterable[str]) -> List[Union[EntryResource, dict]]:
+        ids = list(dict.fromkeys(ids))
+        cached, missing = self._cached_by_ids(ids)
+        if missing:
+            docs = [
+                doc async for doc in self.collection.find(**self._ids_criteria(missing))
+            ]
+            cached.extend(self._cache_entries(self._to_resources(docs)))
+        return self._order_by_ids(cached, ids)
+
+    async def count_data_returned(self, filter_: dict) -> int:
+        """Awaitable variant of :meth:`MongoCollection.count_data_returned`"""
+        key = self._count_key(filter_)
+        data_returned = self.count_cache.get(key)
+        if data_returned is None:
+            with timed(self.resource_mapper.ENDPOINT, "count"):
+                if not self.approximate_counts:
+                    data_returned = await self.count(filter=filter_)
+                elif filter_:
+                    data_returned = await self.count(
+                        filter=filter_, limit=self.approximate_count_limit
+                    )
+                else:
+                    data_returned = await self.collection.estimated_document_count()
+            self.count_cache.set(key, data_returned)
+        return data_returned
+
+
+def create_collection(
+    name: str,
+    resource_cls: EntryResource,
+    resource_mapper: ResourceMapper,
+    entry_cache: str = None,
+) -> MongoCollection:
+    """Create the entry collection for the MongoDB collection `name` of the configured database.
+
+    An :class:`AsyncMongoCollection` is returned if ``USE_ASYNC_MONGO`` is set (requires a real MongoDB),
+    otherwise a :class:`MongoCollection`.
+    With `entry_cache`, the prefix of config parameters (e.g., "reference" for
+    ``REFERENCE_CACHE_SIZE`` and ``REFERENCE_CACHE_TTL``), entries fetched by ID (e.g., included
+    relationships) are cached in memory as sized by these parameters, also after a config reload.
+    """
+    if async_client is not None:
+        collection = AsyncMongoCollection(
+            collection=async_client[CONFIG.mongo_database][name],
+            resource_cls=resource_cls,
+            resource_mapper=resource_mapper,
+            entry_cache=entry_cache,
+        )
+    else:
+        collection = MongoCollection(
+            collection=client[CONFIG.mongo_database][name],
+            resource_cls=resource_cls,
+            resource_mapper=resource_mapper,
+            entry_cache=entry_cache,
+        )
+    return collection
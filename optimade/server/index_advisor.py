@@ -0,0 +1,360 @@
+"""Propose, create and check the MongoDB indexes backing the queryable properties.
+
+Every queryable attribute of an entry type, every provider-specific field and every
+field aliased in the mapper is proposed an index on its database field.
+Scalar fields are indexed together with ``_id``, the tie-breaker of all sorted listings,
+so that the same index serves filters, sorts and page cursors on the field.
+Zipped list fields (e.g., ``elements:elements_ratios``) are proposed a compound multikey index
+on the subdocuments of their derived database field, and string fields with reversed or n-gram
+fields (for ``ENDS WITH`` and ``CONTAINS``) an index on these.
+Derived fields are (re)computed from the fields they are derived from with ``--update-derived``.
+
+The advisor can be run from the command line:
+
+    $ optimade_index_advisor [--update-derived] [--create] [--filter FILTER ...] [--profile]
+
+or at server startup with ``CREATE_INDEXES = yes``.
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import pymongo
+
+from .config import CONFIG
+from .entry_collections import (
+    SCALAR_TYPES,
+    AsyncMongoCollection,
+    MongoCollection,
+    client,
+)
+
+__all__ = (
+    "IndexProposal",
+    "ScanReport",
+    "sync_collection",
+    "propose_indexes",
+    "missing_indexes",
+    "create_indexes",
+    "sort_index",
+    "index_backed_sort_fields",
+    "update_derived_fields",
+    "explain_filters",
+    "profiled_collection_scans",
+)
+
+
+class IndexProposal(NamedTuple):
+    """An index on the database field of an OPTiMaDe field"""
+
+    field: str  # OPTiMaDe field
+    keys: Tuple[Tuple[str, int], ...]  # index keys, the database field first
+    reason: str  # "queryable", "provider", "alias", "zip", "reversed" or "ngram"
+
+
+class ScanReport(NamedTuple):
+    """The query plan of an OPTiMaDe filter"""
+
+    filter: str
+    mongo_filter: dict
+    collection_scan: Optional[bool]  # None if the backend cannot explain queries
+    plan: Optional[dict]
+
+
+def sync_collection(collection: MongoCollection) -> pymongo.collection.Collection:
+    """The synchronous (pymongo or mongomock) collection underlying an entry collection"""
+    if isinstance(collection, AsyncMongoCollection):
+        return client[CONFIG.mongo_database][collection.collection.name]
+    return collection.collection
+
+
+def _indexable(value: dict) -> Optional[bool]:
+    """Whether a field can be indexed, and if it holds a scalar (`True`) or a list of scalars (`False`)"""
+    if value.get("type") in SCALAR_TYPES:
+        return True
+    if value.get("type") == "array":
+        if value.get("items", {}).get("type") in SCALAR_TYPES:
+            return False
+    return None
+
+
+def propose_indexes(collection: MongoCollection) -> List[IndexProposal]:
+    """Propose an index for each queryable, provider-specific and alias-mapped field
+
+    Lists of scalars (e.g., ``elements``) get a single-field multikey index, while
+    nested lists (e.g., ``cartesian_site_positions``) and objects are not indexed.
+    Zipped list fields get a compound multikey index on the keys of their subdocuments,
+    reversed string fields a scalar index and n-gram fields a multikey index.
+    """
+    mapper = collection.resource_mapper
+    fields = {}
+    for name, value in collection.get_attribute_schemas().items():
+        if name == "type":
+            # There is a single type per collection
+            continue
+        scalar = True if name == "id" else _indexable(value)
+        if scalar is not None:
+            fields[name] = (scalar, "queryable")
+    for field, _ in mapper.all_aliases():
+        reason = "provider" if field.startswith(CONFIG.provider["prefix"]) else "alias"
+        fields.setdefault(field, (True, reason))
+
+    proposals = {}
+    for field, (scalar, reason) in fields.items():
+        real = mapper.alias_for(field)
+        keys = ((real, pymongo.ASCENDING),)
+        if scalar:
+            keys += (("_id", pymongo.ASCENDING),)
+        if real not in proposals:
+            proposals[real] = IndexProposal(field=field, keys=keys, reason=reason)
+    for zipped, (real, keys) in mapper.ZIP_ALIASES:
+        proposals.setdefault(
+            real,
+            IndexProposal(
+                field=":".join(zipped),
+                keys=tuple((f"{real}.{key}", pymongo.ASCENDING) for key in keys),
+                reason="zip",
+            ),
+        )
+    for field, real in mapper.REVERSED_ALIASES:
+        proposals.setdefault(
+            real,
+            IndexProposal(
+                field=field,
+                keys=((real, pymongo.ASCENDING), ("_id", pymongo.ASCENDING)),
+                reason="reversed",
+            ),
+        )
+    for field, real in mapper.NGRAM_ALIASES:
+        proposals.setdefault(
+            real,
+            IndexProposal(
+                field=field, keys=((real, pymongo.ASCENDING),), reason="ngram"
+            ),
+        )
+    return list(proposals.values())
+
+
+def _index_keys(collection: MongoCollection) -> Dict[str, Tuple[Tuple[str, int], ...]]:
+    return {
+        name: tuple((key, direction) for key, direction in index["key"])
+        for name, index in sync_collection(collection).index_information().items()
+    }
+
+
+def missing_indexes(collection: MongoCollection) -> List[IndexProposal]:
+    """The proposed indexes that no existing index starts with"""
+    existing = list(_index_keys(collection).values())
+    return [
+        proposal
+        for proposal in propose_indexes(collection)
+        if not any(index[: len(proposal.keys)] == proposal.keys for index in existing)
+    ]
+
+
+def create_indexes(
+    collection: MongoCollection, proposals: Iterable[IndexProposal] = None
+) -> List[str]:
+    """Create the given (by default, all missing) indexes in the background
+
+    Returns:
+        The names of the created indexes.
+    """
+    if proposals is None:
+        proposals = missing_indexes(collection)
+    raw = sync_collection(collection)
+    return [
+        raw.create_index(list(proposal.keys), background=True) for proposal in proposals
+    ]
+
+
+def _backs_sort(
+    keys: Tuple[Tuple[str, int], ...], sort_spec: List[Tuple[str, int]]
+) -> bool:
+    """Whether an index starts with the sort keys, in the same or in all reversed directions"""
+    if len(keys) < len(sort_spec):
+        return False
+    pairs = list(zip(keys, sort_spec))
+    return all(index_key == sort_key for index_key, sort_key in pairs) or all(
+        index_key == (sort_key[0], -sort_key[1]) for index_key, sort_key in pairs
+    )
+
+
+def sort_index(
+    collection: MongoCollection, sort_spec: List[Tuple[str, int]]
+) -> Optional[str]:
+    """The name of an index backing the MongoDB sort spec, or `None` if the sort is in memory"""
+    for name, keys in _index_keys(collection).items():
+        if _backs_sort(keys, sort_spec):
+            return name
+    return None
+
+
+def index_backed_sort_fields(collection: MongoCollection) -> Set[str]:
+    """The sortable OPTiMaDe fields whose sorts are backed by an index
+
+    A sort on a single field ends with the tie-breaking `_id` in the same direction, see
+    `MongoCollection._sort_spec()`, and so is backed in both directions by the same index.
+    """
+    indexes = list(_index_keys(collection).values())
+    backed = set()
+    for field in collection.sortable_fields:
+        sort_spec = collection._sort_spec(field)
+        if any(_backs_sort(keys, sort_spec) for keys in indexes):
+            backed.add(field)
+    return backed
+
+
+def update_derived_fields(collection: MongoCollection, batch_size: int = 1000) -> int:
+    """Recompute the derived fields (see `ResourceMapper.derived_fields()`) of all documents
+
+    Returns:
+        The number of updated documents.
+    """
+    mapper = collection.resource_mapper
+    derived_fields = mapper.derived_aliases()
+    if not derived_fields:
+        return 0
+    sources = {field for fields in derived_fields.values() for field in fields}
+
+    raw = sync_collection(collection)
+    updated = 0
+    requests = []
+    for doc in raw.find({}, projection=list(sources)):
+        derived = mapper.derived_fields(doc)
+        update = {}
+        if derived:
+            update["$set"] = derived
+        missing = [field for field in derived_fields if field not in derived]
+        if missing:
+            update["$unset"] = {field: "" for field in missing}
+        requests.append(pymongo.UpdateOne({"_id": doc["_id"]}, update))
+        if len(requests) >= batch_size:
+            updated += raw.bulk_write(requests, ordered=False).modified_count
+            requests = []
+    if requests:
+        updated += raw.bulk_write(requests, ordered=False).modified_count
+    return updated
+
+
+def _has_stage(plan, stage: str) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == stage:
+            return True
+        return any(_has_stage(value, stage) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_stage(value, stage) for value in plan)
+    return False
+
+
+def explain_filters(
+    collection: MongoCollection, filters: Iterable[str]
+) -> List[ScanReport]:
+    """Explain the MongoDB queries of OPTiMaDe filters and flag those running as collection scans"""
+    raw = sync_collection(collection)
+    reports = []
+    for filter_ in filters:
+        mongo_filter = collection._compile_filter(filter_)
+        try:
+            plan = raw.find(mongo_filter).explain()
+        except (AttributeError, NotImplementedError):
+            # mongomock cannot explain queries
+            reports.append(ScanReport(filter_, mongo_filter, None, None))
+            continue
+        winning_plan = plan.get("queryPlanner", {}).get("winningPlan", plan)
+        reports.append(
+            ScanReport(
+                filter_, mongo_filter, _has_stage(winning_plan, "COLLSCAN"), plan
+            )
+        )
+    return reports
+
+
+def profiled_collection_scans(
+    collection: MongoCollection, limit: int = 20
+) -> List[dict]:
+    """The slowest queries on the collection that ran as collection scans
+
+    The queries are read from the database profiler (``system.profile``), which has to be enabled,
+    e.g., with ``db.setProfilingLevel(1)`` in the mongo shell.
+    """
+    raw = sync_collection(collection)
+    return list(
+        raw.database["system.profile"]
+        .find({"ns": raw.full_name, "planSummary": "COLLSCAN"})
+        .sort("millis", pymongo.DESCENDING)
+        .limit(limit)
+    )
+
+
+def main():
+    import argparse
+    from .routers import ENTRY_COLLECTIONS
+
+    parser = argparse.ArgumentParser(
+        prog="optimade_index_advisor",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--endpoint",
+        action="append",
+        choices=sorted(ENTRY_COLLECTIONS),
+        help="Entry endpoint(s) to inspect (default: all)",
+    )
+    parser.add_argument(
+        "--create", action="store_true", help="Create the missing indexes"
+    )
+    parser.add_argument(
+        "--update-derived",
+        action="store_true",
+        help="Recompute the derived fields of all documents, e.g., after updating them",
+    )
+    parser.add_argument(
+        "--filter",
+        action="append",
+        default=[],
+        help="OPTiMaDe filter to explain (only for --endpoint with a single endpoint)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Report profiled queries that ran as collection scans",
+    )
+    args = parser.parse_args()
+
+    endpoints = args.endpoint or sorted(ENTRY_COLLECTIONS)
+    if args.filter and len(endpoints) != 1:
+        parser.error("--filter requires a single --endpoint")
+
+    for endpoint in endpoints:
+        collection = ENTRY_COLLECTIONS[endpoint]
+        print(f"{endpoint} ({sync_collection(collection).full_name}):")
+        if args.update_derived:
+            updated = update_derived_fields(collection)
+            print(f"  updated the derived fields of {updated} documents")
+        missing = missing_indexes(collection)
+        for proposal in missing:
+            keys = ", ".join(f"{key}: {direction}" for key, direction in proposal.keys)
+            print(
+                f"  missing index {{{keys}}} for {proposal.field} ({proposal.reason})"
+            )
+        if not missing:
+            print("  all proposed indexes exist")
+        if args.create and missing:
+            for name in create_indexes(collection, missing):
+                print(f"  created index {name}")
+
+        for report in explain_filters(collection, args.filter):
+            if report.collection_scan is None:
+                status = "cannot be explained by this backend"
+            elif report.collection_scan:
+                status = "COLLECTION SCAN"
+            else:
+                status = "uses an index"
+            print(f"  filter {report.filter!r} -> {report.mongo_filter}: {status}")
+
+        if args.profile:
+            for query in profiled_collection_scans(collection):
+                print(
+                    f"  collection scan of {query.get('millis')} ms: "
+                    f"{query.get('command', query.get('query'))}"
+                )
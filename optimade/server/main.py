@@ -1,15 +1,14 @@
+import asyncio
 import json
-from pathlib import Path
+import signal
 
 from pydantic import ValidationError
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
-from .entry_collections import MongoCollection
 from .config import CONFIG
-from .routers import info, links, references, structures
-from .routers.utils import get_providers
+from .routers import explain, info, links, metrics, references, structures
 
 import optimade.server.exception_handlers as exc_handlers
 
@@ -28,40 +27,6 @@ app = FastAPI(
 )
 
 
-test_paths = {
-    "structures": Path(__file__)
-    .resolve()
-    .parent.joinpath("tests/test_structures.json"),
-    "references": Path(__file__)
-    .resolve()
-    .parent.joinpath("tests/test_references.json"),
-    "links": Path(__file__).resolve().parent.joinpath("tests/test_links.json"),
-}
-if not CONFIG.use_real_mongo and (path.exists() for path in test_paths.values()):
-    import bson.json_util
-    from .routers import ENTRY_COLLECTIONS
-
-    def load_entries(endpoint_name: str, endpoint_collection: MongoCollection):
-        print(f"loading test {endpoint_name}...")
-        with open(test_paths[endpoint_name]) as f:
-            data = json.load(f)
-            print(f"inserting test {endpoint_name} into collection...")
-            endpoint_collection.collection.insert_many(
-                bson.json_util.loads(bson.json_util.dumps(data))
-            )
-        if endpoint_name == "links":
-            print(
-                "adding providers.json to links from github.com/Materials-Consortia/OPTiMaDe"
-            )
-            endpoint_collection.collection.insert_many(
-                bson.json_util.loads(bson.json_util.dumps(get_providers()))
-            )
-        print(f"done inserting test {endpoint_name}...")
-
-    for name, collection in ENTRY_COLLECTIONS.items():
-        load_entries(name, collection)
-
-
 app.add_exception_handler(StarletteHTTPException, exc_handlers.http_exception_handler)
 app.add_exception_handler(
     RequestValidationError, exc_handlers.request_validation_exception_handler
@@ -89,6 +54,8 @@ for prefix in valid_prefixes:
     app.include_router(links.router, prefix=prefix)
     app.include_router(references.router, prefix=prefix)
     app.include_router(structures.router, prefix=prefix)
+    app.include_router(explain.router, prefix=prefix)
+    app.include_router(metrics.router, prefix=prefix)
 
 
 def update_schema(app):
@@ -100,3 +67,21 @@ def update_schema(app):
 @app.on_event("startup")
 async def startup_event():
     update_schema(app)
+    try:
+        # `kill -HUP <pid>` reloads the config
+        asyncio.get_event_loop().add_signal_handler(signal.SIGHUP, CONFIG.reload)
+    except (AttributeError, NotImplementedError, RuntimeError):
+        # No SIGHUP (Windows), or not running in the main thread
+        pass
+    if not CONFIG.use_real_mongo:
+        from .seed import load_test_data, refresh_providers
+
+        load_test_data()
+        if CONFIG.refresh_providers:
+            asyncio.get_event_loop().run_in_executor(None, refresh_providers)
+    if CONFIG.create_indexes:
+        from .index_advisor import create_indexes
+        from .routers import ENTRY_COLLECTIONS
+
+        for collection in ENTRY_COLLECTIONS.values():
+            create_indexes(collection)
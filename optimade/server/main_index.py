@@ -26,20 +26,6 @@ app = FastAPI(
 )
 
 
-if not CONFIG.use_real_mongo and CONFIG.index_links_path.exists():
-    import bson.json_util
-    from .routers.links import links_coll
-
-    print("loading index links...")
-    with open(CONFIG.index_links_path) as f:
-        data = json.load(f)
-        print("inserting index links into collection...")
-        links_coll.collection.insert_many(
-            bson.json_util.loads(bson.json_util.dumps(data))
-        )
-    print("done inserting index links...")
-
-
 app.add_exception_handler(StarletteHTTPException, exc_handlers.http_exception_handler)
 app.add_exception_handler(
     RequestValidationError, exc_handlers.request_validation_exception_handler
@@ -76,3 +62,7 @@ def update_schema(app):
 @app.on_event("startup")
 async def startup_event():
     update_schema(app)
+    if not CONFIG.use_real_mongo:
+        from .seed import load_index_links
+
+        load_index_links()
@@ -1,8 +1,17 @@
-from typing import Tuple
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Tuple
+from optimade.filtertransformers.mongo import NewMongoTransformer, ngrams
 from optimade.server.config import CONFIG
 
 __all__ = ("ResourceMapper",)
 
+# Alias maps of each mapper class, see `ResourceMapper.alias_maps()`
+_ALIAS_MAPS: Dict[type, Tuple[Mapping[str, str], Mapping[str, Tuple[str, ...]]]] = {}
+# Key plans of each mapper class by document fields, see `ResourceMapper.key_plan()`
+_KEY_PLANS: Dict[type, Dict[Tuple[str, ...], Tuple[Tuple[str, str, bool], ...]]] = {}
+# Documents with more distinct sets of fields are still mapped, but not all plans are kept
+_KEY_PLANS_MAXSIZE = 256
+
 
 class ResourceMapper:
     """Generic Resource Mapper"""
@@ -10,6 +19,21 @@ class ResourceMapper:
     ENDPOINT: str = ""
     ALIASES: Tuple[Tuple[str, str]] = ()
     TOP_LEVEL_NON_ATTRIBUTES_FIELDS: set = {"id", "type", "relationships", "links"}
+    # List fields mapped to the fields holding their lengths, used for `LENGTH` queries
+    LENGTH_ALIASES: Tuple[Tuple[str, str]] = ()
+    # List fields mapped to the database fields holding their sorted values joined with "-",
+    # used for `HAS ONLY` queries. The database field is derived from the list field
+    HAS_ONLY_ALIASES: Tuple[Tuple[str, str]] = ()
+    # Tuples of zipped list fields mapped to the database field holding their zipped values
+    # as subdocuments, and the keys of the values in the subdocuments, used for zipped `HAS`
+    # queries. The database field is derived from the list fields, see `derived_fields()`
+    ZIP_ALIASES: Tuple[Tuple[Tuple[str, ...], Tuple[str, Tuple[str, ...]]]] = ()
+    # String fields mapped to the derived database fields holding their reversed values,
+    # used for `ENDS WITH` queries
+    REVERSED_ALIASES: Tuple[Tuple[str, str]] = ()
+    # String fields mapped to the derived database fields holding their n-grams,
+    # used for `CONTAINS` queries
+    NGRAM_ALIASES: Tuple[Tuple[str, str]] = ()
 
     @classmethod
     def all_aliases(cls) -> Tuple[Tuple[str, str]]:
@@ -21,6 +45,31 @@ class ResourceMapper:
             + cls.ALIASES
         )
 
+    @classmethod
+    def alias_maps(cls,) -> Tuple[Mapping[str, str], Mapping[str, Tuple[str, ...]]]:
+        """Return the frozen forward and reverse alias maps
+
+        The forward map takes OPTiMaDe fields to database fields.
+        The reverse map takes database fields to the OPTiMaDe fields aliased to them.
+        The maps are computed once per mapper class from :meth:`all_aliases`,
+        until they are reset with :meth:`reset_aliases`.
+        """
+        maps = _ALIAS_MAPS.get(cls)
+        if maps is None:
+            aliases = cls.all_aliases()
+            reverse = {}
+            for field, real in aliases:
+                reverse[real] = reverse.get(real, ()) + (field,)
+            maps = (MappingProxyType(dict(aliases)), MappingProxyType(reverse))
+            _ALIAS_MAPS[cls] = maps
+        return maps
+
+    @staticmethod
+    def reset_aliases():
+        """Drop the alias maps of all mapper classes, e.g., after the config was reloaded"""
+        _ALIAS_MAPS.clear()
+        _KEY_PLANS.clear()
+
     @classmethod
     def alias_for(cls, field: str) -> str:
         """Return aliased field name
@@ -31,7 +80,57 @@ class ResourceMapper:
         :return: Aliased field as found in PROVIDER_ALIASES + ALIASES
         :rtype: str
         """
-        return dict(cls.all_aliases()).get(field, field)
+        return cls.alias_maps()[0].get(field, field)
+
+    @classmethod
+    def derived_fields(cls, doc: dict) -> dict:
+        """Return the database fields derived from the fields of a MongoDB document
+
+        The zipped fields of :attr:`ZIP_ALIASES` are derived from their list fields, e.g.,
+        ``{"elements": ["Ag", "O"], "elements_ratios": [0.4, 0.6]}`` gives
+        ``[{"element": "Ag", "ratio": 0.4}, {"element": "O", "ratio": 0.6}]``,
+        the fields of :attr:`HAS_ONLY_ALIASES` hold the sorted, distinct values of their
+        list fields joined with "-" (e.g., ``"Ag-O"``), while the fields of :attr:`REVERSED_ALIASES` and :attr:`NGRAM_ALIASES` hold the
+        reversed string and its n-grams (see :func:`~optimade.filtertransformers.mongo.ngrams`).
+        Derived fields must be updated whenever the list fields are, i.e., when inserting or updating
+        documents.
+
+        :param doc: A resource object in MongoDB format
+        :type doc: dict
+
+        :return: The derived fields that can be computed from the document
+        :rtype: dict
+        """
+        derived = {}
+        for fields, (real, keys) in cls.ZIP_ALIASES:
+            lists = [doc.get(cls.alias_for(field)) for field in fields]
+            if all(isinstance(values, list) for values in lists):
+                derived[real] = [dict(zip(keys, values)) for values in zip(*lists)]
+        for field, real in cls.HAS_ONLY_ALIASES:
+            values = doc.get(cls.alias_for(field))
+            if isinstance(values, list) and all(isinstance(_, str) for _ in values):
+                derived[real] = "-".join(sorted(set(values)))
+        for field, real in cls.REVERSED_ALIASES:
+            value = doc.get(cls.alias_for(field))
+            if isinstance(value, str):
+                derived[real] = value[::-1]
+        for field, real in cls.NGRAM_ALIASES:
+            value = doc.get(cls.alias_for(field))
+            if isinstance(value, str):
+                derived[real] = ngrams(value, NewMongoTransformer.ngram_size)
+        return derived
+
+    @classmethod
+    def derived_aliases(cls) -> Dict[str, Tuple[str, ...]]:
+        """Return the derived database fields mapped to the database fields they are derived from"""
+        derived = {}
+        for fields, (real, _) in cls.ZIP_ALIASES:
+            derived[real] = tuple(cls.alias_for(field) for field in fields)
+        for field, real in (
+            cls.HAS_ONLY_ALIASES + cls.REVERSED_ALIASES + cls.NGRAM_ALIASES
+        ):
+            derived[real] = (cls.alias_for(field),)
+        return derived
 
     @classmethod
     def map_back(cls, doc: dict) -> dict:
@@ -49,30 +148,69 @@ class ResourceMapper:
         :return: A resource object in OPTiMaDe format
         :rtype: dict
         """
-        if "_id" in doc:
-            del doc["_id"]
-
-        mapping = ((real, alias) for alias, real in cls.all_aliases())
-        newdoc = {}
-        reals = {real for alias, real in cls.all_aliases()}
-        for k in doc:
-            if k not in reals:
-                newdoc[k] = doc[k]
-        for real, alias in mapping:
-            if real in doc:
-                newdoc[alias] = doc[real]
-
-        if "attributes" in newdoc:
-            raise Exception("Will overwrite doc field!")
-        attributes = newdoc.copy()
+        return cls.map_back_many([doc])[0]
+
+    @classmethod
+    def map_back_many(cls, docs: Iterable[dict]) -> List[dict]:
+        """Map a page of documents from MongoDB to OPTiMaDe, see :meth:`map_back`
+
+        Documents with the same fields share a key plan (see :meth:`key_plan`),
+        which renames and regroups their fields in a single pass.
+        The key plans are kept until the alias maps are reset.
+
+        :param docs: Resource objects in MongoDB format
+        :type docs: Iterable[dict]
+
+        :return: Resource objects in OPTiMaDe format
+        :rtype: List[dict]
+        """
+        plans = _KEY_PLANS.setdefault(cls, {})
+        newdocs = []
+        for doc in docs:
+            keys = tuple(doc)
+            plan = plans.get(keys)
+            if plan is None:
+                plan = cls.key_plan(keys)
+                if len(plans) < _KEY_PLANS_MAXSIZE:
+                    plans[keys] = plan
+
+            newdoc = {}
+            attributes = {}
+            for real, field, top_level in plan:
+                if top_level:
+                    newdoc[field] = doc[real]
+                else:
+                    attributes[field] = doc[real]
+            newdoc["type"] = cls.ENDPOINT
+            newdoc["attributes"] = attributes
+            newdocs.append(newdoc)
+
+        return newdocs
+
+    @classmethod
+    def key_plan(cls, keys: Tuple[str, ...]) -> Tuple[Tuple[str, str, bool], ...]:
+        """Return how :meth:`map_back_many` maps a MongoDB document with the fields `keys`
 
-        for k in cls.TOP_LEVEL_NON_ATTRIBUTES_FIELDS:
-            attributes.pop(k, None)
-        for k in list(newdoc.keys()):
-            if k not in cls.TOP_LEVEL_NON_ATTRIBUTES_FIELDS:
-                del newdoc[k]
+        :param keys: Fields of a MongoDB document
+        :type keys: Tuple[str, ...]
 
-        newdoc["type"] = cls.ENDPOINT
-        newdoc["attributes"] = attributes
+        :return: (DB field, OPTiMaDe field, whether it is a top-level field) for each
+            OPTiMaDe field, in the order of assignment
+        :rtype: Tuple[Tuple[str, str, bool], ...]
+        """
+        _, reverse = cls.alias_maps()
+        top_level = cls.TOP_LEVEL_NON_ATTRIBUTES_FIELDS
+
+        plan = [(k, k, k in top_level) for k in keys if k not in reverse and k != "_id"]
+        # Aliased fields take precedence over unaliased fields of the same name
+        plan.extend(
+            (real, field, field in top_level)
+            for real, fields in reverse.items()
+            if real in keys
+            for field in fields
+        )
+
+        if any(field == "attributes" for _, field, _ in plan):
+            raise Exception("Will overwrite doc field!")
 
-        return newdoc
+        return tuple(plan)
@@ -1,3 +1,5 @@
+from typing import Iterable, List
+
 from .entries import ResourceMapper
 
 __all__ = ("LinksMapper",)
@@ -8,16 +10,19 @@ class LinksMapper(ResourceMapper):
     ENDPOINT = "links"
 
     @classmethod
-    def map_back(cls, doc: dict) -> dict:
+    def map_back_many(cls, docs: Iterable[dict]) -> List[dict]:
         """Map properties from MongoDB to OPTiMaDe
 
-        :param doc: A resource object in MongoDB format
-        :type doc: dict
+        Links keep their own ``type``, e.g., "child" or "provider".
+
+        :param docs: Resource objects in MongoDB format
+        :type docs: Iterable[dict]
 
-        :return: A resource object in OPTiMaDe format
-        :rtype: dict
+        :return: Resource objects in OPTiMaDe format
+        :rtype: List[dict]
         """
-        type_ = doc["type"]
-        newdoc = super().map_back(doc)
-        newdoc["type"] = type_
-        return newdoc
+        docs = list(docs)
+        newdocs = super().map_back_many(docs)
+        for doc, newdoc in zip(docs, newdocs):
+            newdoc["type"] = doc["type"]
+        return newdocs
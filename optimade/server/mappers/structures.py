@@ -12,3 +12,23 @@ class StructureMapper(ResourceMapper):
         ("chemical_formula_reduced", "pretty_formula"),
         ("chemical_formula_anonymous", "formula_anonymous"),
     )
+    LENGTH_ALIASES = (
+        ("elements", "nelements"),
+        ("elements_ratios", "nelements"),
+        ("cartesian_site_positions", "nsites"),
+        ("species_at_sites", "nsites"),
+    )
+    HAS_ONLY_ALIASES = (("elements", "_mp_chemsys"),)
+    ZIP_ALIASES = (
+        (("elements", "elements_ratios"), ("_composition", ("element", "ratio"))),
+    )
+    REVERSED_ALIASES = (
+        ("chemical_formula_descriptive", "_pretty_formula_reversed"),
+        ("chemical_formula_reduced", "_pretty_formula_reversed"),
+        ("chemical_formula_anonymous", "_formula_anonymous_reversed"),
+    )
+    NGRAM_ALIASES = (
+        ("chemical_formula_descriptive", "_pretty_formula_ngrams"),
+        ("chemical_formula_reduced", "_pretty_formula_ngrams"),
+        ("chemical_formula_anonymous", "_formula_anonymous_ngrams"),
+    )
@@ -0,0 +1,151 @@
+"""Latency histograms of the stages of entry requests, in the Prometheus text exposition format.
+
+The stages are timed with :func:`timed`, labelled by entry endpoint and stage, e.g.:
+
+    with timed("structures", "find"):
+        docs = list(cursor)
+
+Metrics are only collected with ``METRICS = yes``; otherwise :func:`timed` returns a shared
+no-op context manager.
+"""
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+from typing import Dict, Iterable, List, Tuple
+
+from .config import CONFIG
+
+__all__ = ("Histogram", "STAGE_SECONDS", "timed", "exposition")
+
+# Seconds, from sub-millisecond cache hits to multi-second collection scans
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    """Thread-safe histogram with labels
+
+    Parameters:
+        name: metric name.
+        documentation: help text of the metric.
+        labelnames: names of the labels, in the order their values are passed to :meth:`observe`.
+        buckets: upper bounds of the buckets, in increasing order. A ``+Inf`` bucket is implied.
+
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str],
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Per label values: bucket counts (the last for +Inf), and the sum of the observations
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        """Count an observation of `value` for the given label values"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = (
+                    [0] * (len(self.buckets) + 1),
+                    [0.0],
+                )
+            series[0][index] += 1
+            series[1][0] += value
+
+    def clear(self):
+        """Drop all observations"""
+        with self._lock:
+            self._series.clear()
+
+    def expose(self) -> str:
+        """The histogram in the Prometheus text exposition format"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = sorted(
+                (labelvalues, list(counts), total[0])
+                for labelvalues, (counts, total) in self._series.items()
+            )
+        for labelvalues, counts, total in series:
+            labels = ",".join(
+                f'{name}="{value}"' for name, value in zip(self.labelnames, labelvalues)
+            )
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total!r}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "optimade_stage_duration_seconds",
+    "Time spent in each stage of entry requests",
+    ("endpoint", "stage"),
+)
+
+
+class _Timer:
+    __slots__ = ("labelvalues", "start")
+
+    def __init__(self, *labelvalues: str):
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        STAGE_SECONDS.observe(perf_counter() - self.start, *self.labelvalues)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(endpoint: str, stage: str):
+    """Context manager adding the time spent in its block to the `stage` of `endpoint`"""
+    if not CONFIG.metrics:
+        return _NULL_TIMER
+    return _Timer(endpoint, stage)
+
+
+def exposition() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    return STAGE_SECONDS.expose()
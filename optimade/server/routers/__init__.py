@@ -1,3 +1,6 @@
+from optimade.server.config import CONFIG
+from optimade.server.mappers import ResourceMapper
+
 from .links import links_coll
 from .references import references_coll
 from .structures import structures_coll
@@ -7,3 +10,11 @@ ENTRY_COLLECTIONS = {
     "references": references_coll,
     "structures": structures_coll,
 }
+
+
+@CONFIG.on_reload
+def reconfigure_collections(settings):
+    """Drop the alias maps and compiled filters derived from the previous config"""
+    ResourceMapper.reset_aliases()
+    for collection in ENTRY_COLLECTIONS.values():
+        collection.configure()
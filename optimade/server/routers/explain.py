@@ -0,0 +1,108 @@
+import json
+from time import perf_counter
+
+import bson.json_util
+from fastapi import APIRouter, Depends
+from fastapi.encoders import jsonable_encoder
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.requests import Request
+
+from optimade.filtertransformers.mongo import normalize_filter
+from optimade.server.config import CONFIG
+from optimade.server.deps import EntryListingQueryParams
+from optimade.server.entry_collections import MongoCollection
+from optimade.server.index_advisor import sort_index, sync_collection
+
+from . import ENTRY_COLLECTIONS
+from .utils import handle_response_fields
+
+
+router = APIRouter()
+
+
+def _json_safe(value):
+    """MongoDB values (e.g., regular expressions) as JSON"""
+    return json.loads(bson.json_util.dumps(value))
+
+
+def explain_query(collection: MongoCollection, params: EntryListingQueryParams) -> dict:
+    """Run the query of an entry listing stage by stage, timing each stage
+
+    Returns:
+        The parse tree of the filter, the MongoDB query, the index backing its sort (`None`
+        if it is sorted in memory), its query plan (`None` if the backend cannot explain
+        queries), and the seconds spent in each stage.
+    """
+    timings = {}
+
+    start = perf_counter()
+    tree = collection.parser.parse(params.filter) if params.filter else None
+    timings["parse"] = perf_counter() - start
+
+    start = perf_counter()
+    if tree is not None:
+        normalize_filter(
+            collection._alias_filter(collection.transformer.transform(tree))
+        )
+    timings["transform"] = perf_counter() - start
+
+    criteria = collection._parse_params(params)
+    fields = criteria.pop("fields")
+    criteria.pop("count_filter")
+    raw = sync_collection(collection)
+
+    start = perf_counter()
+    docs = list(raw.find(**collection._peek_criteria(criteria)))
+    timings["db"] = perf_counter() - start
+
+    try:
+        plan = raw.find(**criteria).explain()
+    except (AttributeError, NotImplementedError):
+        # mongomock cannot explain queries
+        plan = None
+
+    start = perf_counter()
+    results = collection.resource_mapper.map_back_many(docs)
+    timings["mapping"] = perf_counter() - start
+
+    start = perf_counter()
+    if not fields and collection.validate_responses:
+        results = [collection.resource_cls(**doc) for doc in results]
+    timings["validation"] = perf_counter() - start
+
+    start = perf_counter()
+    if fields:
+        results = handle_response_fields(results, fields)
+    json.dumps(jsonable_encoder(results))
+    timings["serialization"] = perf_counter() - start
+
+    return {
+        "filter": params.filter,
+        "tree": tree.pretty() if tree is not None else None,
+        "mongo_filter": _json_safe(criteria["filter"]),
+        "projection": criteria["projection"],
+        "sort": criteria.get("sort", []),
+        "sort_index": sort_index(collection, criteria["sort"]),
+        "skip": criteria.get("skip", 0),
+        "limit": criteria.get("limit"),
+        "documents": len(docs),
+        "explain": _json_safe(plan),
+        "timings": timings,
+    }
+
+
+@router.get("/extensions/explain/{entry}", tags=["Explain"])
+def get_explain(
+    request: Request, entry: str, params: EntryListingQueryParams = Depends()
+):
+    """Explain the database query of an entry listing and time its stages"""
+    if not CONFIG.explain:
+        raise StarletteHTTPException(
+            status_code=404, detail="Explain is disabled, set EXPLAIN = yes to enable"
+        )
+    if entry not in ENTRY_COLLECTIONS:
+        raise StarletteHTTPException(
+            status_code=404,
+            detail=f"Entry listing not found for {entry}, valid entry listings are: {list(ENTRY_COLLECTIONS)}",
+        )
+    return explain_query(ENTRY_COLLECTIONS[entry], params)
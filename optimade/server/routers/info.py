@@ -13,7 +13,9 @@ from optimade.models import (
 )
 
 from optimade.server.config import CONFIG
+from optimade.server.index_advisor import index_backed_sort_fields
 
+from . import ENTRY_COLLECTIONS
 from .utils import meta_values, retrieve_queryable_properties
 
 
@@ -75,6 +77,10 @@ def get_entry_info(request: Request, entry: str):
     schema = ENTRY_INFO_SCHEMAS[entry]()
     queryable_properties = {"id", "type", "attributes"}
     properties = retrieve_queryable_properties(schema, queryable_properties)
+    # Only sorts that can be served from an index are advertised as sortable
+    index_backed = index_backed_sort_fields(ENTRY_COLLECTIONS[entry])
+    for name, value in properties.items():
+        value["sortable"] = name in index_backed
 
     output_fields_by_format = {"json": list(properties.keys())}
 
@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.responses import PlainTextResponse
+
+from optimade.server.config import CONFIG
+from optimade.server.metrics import exposition
+
+
+router = APIRouter()
+
+
+@router.get(
+    "/extensions/metrics", response_class=PlainTextResponse, tags=["Metrics"],
+)
+def get_metrics():
+    """Latency histograms of the stages of entry requests, in the Prometheus text exposition format"""
+    if not CONFIG.metrics:
+        raise StarletteHTTPException(
+            status_code=404, detail="Metrics are disabled, set METRICS = yes to enable"
+        )
+    return PlainTextResponse(exposition(), media_type="text/plain; version=0.0.4")
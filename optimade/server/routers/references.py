@@ -11,18 +11,19 @@ from optimade.models import (
 )
 from optimade.server.config import CONFIG
 from optimade.server.deps import EntryListingQueryParams, SingleEntryQueryParams
-from optimade.server.entry_collections import MongoCollection, client
+from optimade.server.entry_collections import create_collection
 from optimade.server.mappers import ReferenceMapper
 
-from .utils import get_entries, get_single_entry
+from .utils import get_entries_async, get_single_entry_async
 
 
 router = APIRouter()
 
-references_coll = MongoCollection(
-    collection=client[CONFIG.mongo_database][CONFIG.references_collection],
+references_coll = create_collection(
+    name=CONFIG.references_collection,
     resource_cls=ReferenceResource,
     resource_mapper=ReferenceMapper,
+    entry_cache="reference",
 )
 
 
@@ -32,8 +33,8 @@ references_coll = MongoCollection(
     response_model_exclude_unset=True,
     tags=["Reference"],
 )
-def get_references(request: Request, params: EntryListingQueryParams = Depends()):
-    return get_entries(
+async def get_references(request: Request, params: EntryListingQueryParams = Depends()):
+    return await get_entries_async(
         collection=references_coll,
         response=ReferenceResponseMany,
         request=request,
@@ -47,10 +48,10 @@ def get_references(request: Request, params: EntryListingQueryParams = Depends()
     response_model_exclude_unset=True,
     tags=["Reference"],
 )
-def get_single_reference(
+async def get_single_reference(
     request: Request, entry_id: str, params: SingleEntryQueryParams = Depends()
 ):
-    return get_single_entry(
+    return await get_single_entry_async(
         collection=references_coll,
         entry_id=entry_id,
         response=ReferenceResponseOne,
@@ -11,15 +11,15 @@ from optimade.models import (
 )
 from optimade.server.config import CONFIG
 from optimade.server.deps import EntryListingQueryParams, SingleEntryQueryParams
-from optimade.server.entry_collections import MongoCollection, client
+from optimade.server.entry_collections import create_collection
 from optimade.server.mappers import StructureMapper
 
-from .utils import get_entries, get_single_entry
+from .utils import get_entries_async, get_single_entry_async
 
 router = APIRouter()
 
-structures_coll = MongoCollection(
-    collection=client[CONFIG.mongo_database][CONFIG.structures_collection],
+structures_coll = create_collection(
+    name=CONFIG.structures_collection,
     resource_cls=StructureResource,
     resource_mapper=StructureMapper,
 )
@@ -31,8 +31,8 @@ structures_coll = MongoCollection(
     response_model_exclude_unset=True,
     tags=["Structure"],
 )
-def get_structures(request: Request, params: EntryListingQueryParams = Depends()):
-    return get_entries(
+async def get_structures(request: Request, params: EntryListingQueryParams = Depends()):
+    return await get_entries_async(
         collection=structures_coll,
         response=StructureResponseMany,
         request=request,
@@ -46,10 +46,10 @@ def get_structures(request: Request, params: EntryListingQueryParams = Depends()
     response_model_exclude_unset=True,
     tags=["Structure"],
 )
-def get_single_structure(
+async def get_single_structure(
     request: Request, entry_id: str, params: SingleEntryQueryParams = Depends()
 ):
-    return get_single_entry(
+    return await get_single_entry_async(
         collection=structures_coll,
         entry_id=entry_id,
         response=StructureResponseOne,
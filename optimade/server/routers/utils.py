@@ -1,9 +1,16 @@
+import asyncio
+import json
 import urllib
+from collections import defaultdict
 from datetime import datetime
-from typing import Union, List, Dict
+from pathlib import Path
+from typing import Union, List, Dict, Optional
 
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
 
 from optimade.models import (
     ResponseMeta,
@@ -17,7 +24,13 @@ from optimade.models import (
 
 from optimade.server.config import CONFIG
 from optimade.server.deps import EntryListingQueryParams, SingleEntryQueryParams
-from optimade.server.entry_collections import EntryCollection
+from optimade.server.entry_collections import (
+    AsyncMongoCollection,
+    EntryCollection,
+    MongoCollection,
+    query_executor,
+)
+from optimade.server.metrics import timed
 
 
 ENTRY_INFO_SCHEMAS = {
@@ -53,6 +66,16 @@ def meta_values(
     )
 
 
+def data_returned_meta(
+    collection: EntryCollection, params: EntryListingQueryParams, data_returned: int,
+) -> dict:
+    """Provider-specific meta values flagging approximate `data_returned` counts"""
+    if not CONFIG.approximate_counts:
+        return {}
+    key = f"{CONFIG.provider['prefix']}data_returned_is_approximate"
+    return {key: collection.data_returned_is_approximate(params, data_returned)}
+
+
 def handle_response_fields(
     results: Union[List[EntryResource], EntryResource], fields: set
 ) -> dict:
@@ -64,7 +87,12 @@ def handle_response_fields(
     new_results = []
     while results:
         entry = results.pop(0)
-        new_entry = entry.dict(exclude=top_level, skip_defaults=True)
+        if isinstance(entry, dict):
+            # Unvalidated entry, see `VALIDATE_RESPONSES`
+            new_entry = {k: v for k, v in entry.items() if k not in top_level}
+            new_entry["attributes"] = dict(entry.get("attributes", {}))
+        else:
+            new_entry = entry.dict(exclude=top_level, skip_defaults=True)
         for field in attribute_level:
             if field in new_entry["attributes"]:
                 del new_entry["attributes"][field]
@@ -74,39 +102,35 @@ def handle_response_fields(
     return new_results
 
 
-def get_included_relationships(
+def _collect_relationships(
     results: Union[EntryResource, List[EntryResource]],
     ENTRY_COLLECTIONS: Dict[str, EntryCollection],
-) -> Dict[str, List[EntryResource]]:
-    """Filters the included relationships and makes the appropriate compound request
-    to include them in the response.
-
-    Parameters:
-        results: list of returned documents.
-        ENTRY_COLLECTIONS: dictionary containing collections to query, with key
-            based on endpoint type.
-
-    Returns:
-        Dictionary with the same keys as ENTRY_COLLECTIONS, each containing the list
-            of resource objects for that entry type.
+    endpoint_includes: Dict[str, Dict[str, dict]] = None,
+) -> Dict[str, Dict[str, dict]]:
+    """Collect the unique related entries by entry type and ID
 
+    The related entries are added to `endpoint_includes`, if given.
     """
-    from collections import defaultdict
-
     if not isinstance(results, list):
         results = [results]
 
-    endpoint_includes = defaultdict(dict)
+    if endpoint_includes is None:
+        endpoint_includes = defaultdict(dict)
     for doc in results:
         # convert list of references into dict by ID to only included unique IDs
         if doc is None:
             continue
 
-        relationships = doc.relationships
+        if isinstance(doc, dict):
+            # Unvalidated entry, see `VALIDATE_RESPONSES`
+            relationships = doc.get("relationships")
+        else:
+            relationships = doc.relationships
         if relationships is None:
             continue
 
-        relationships = relationships.dict()
+        if not isinstance(relationships, dict):
+            relationships = relationships.dict()
         for entry_type in ENTRY_COLLECTIONS:
             entry_relationship = relationships.get(entry_type, {})
             if entry_relationship is not None:
@@ -115,63 +139,280 @@ def get_included_relationships(
                     # could check here and raise a warning if any IDs clash
                     endpoint_includes[entry_type][ref["id"]] = ref
 
+    return endpoint_includes
+
+
+def included_collections(
+    params: Union[EntryListingQueryParams, SingleEntryQueryParams],
+    ENTRY_COLLECTIONS: Dict[str, EntryCollection],
+) -> Dict[str, EntryCollection]:
+    """The collections of the related entry types requested with the `include` query parameter"""
+    include = getattr(params, "include", "references")
+    entry_types = [_.strip() for _ in include.split(",") if _.strip()]
+    unknown = [_ for _ in entry_types if _ not in ENTRY_COLLECTIONS]
+    if unknown:
+        raise StarletteHTTPException(
+            status_code=400,
+            detail=f"Unknown relationship(s) to include: {', '.join(unknown)}",
+        )
+    return {entry_type: ENTRY_COLLECTIONS[entry_type] for entry_type in entry_types}
+
+
+def get_included_relationships(
+    results: Union[EntryResource, List[EntryResource]],
+    ENTRY_COLLECTIONS: Dict[str, EntryCollection],
+) -> Dict[str, List[EntryResource]]:
+    """Filters the included relationships and fetches the related entries
+    to include them in the response.
+
+    Parameters:
+        results: list of returned documents.
+        ENTRY_COLLECTIONS: dictionary containing collections to query, with key
+            based on endpoint type, see :func:`included_collections`.
+
+    Returns:
+        List of the related resource objects of all entry types.
+
+    """
+    endpoint_includes = _collect_relationships(results, ENTRY_COLLECTIONS)
+    return _fetch_included(endpoint_includes, ENTRY_COLLECTIONS)
+
+
+def _fetch_included(
+    endpoint_includes: Dict[str, Dict[str, dict]],
+    ENTRY_COLLECTIONS: Dict[str, EntryCollection],
+) -> List[EntryResource]:
+    """Fetch the related entries collected by :func:`_collect_relationships`,
+    with one query per entry type
+    """
     included = {}
     for entry_type in endpoint_includes:
-        compound_filter = " OR ".join(
-            ["id={}".format(ref_id) for ref_id in endpoint_includes[entry_type]]
-        )
-        params = EntryListingQueryParams(
-            filter=compound_filter,
-            response_format="json",
-            response_fields=None,
-            sort=None,
-            page_limit=0,
-            page_offset=0,
-        )
+        collection = ENTRY_COLLECTIONS[entry_type]
+        included[entry_type] = collection.find_by_ids(endpoint_includes[entry_type])
+
+    # flatten dict by endpoint to list
+    return [obj for endp in included.values() for obj in endp]
+
+
+async def get_included_relationships_async(
+    results: Union[EntryResource, List[EntryResource]],
+    ENTRY_COLLECTIONS: Dict[str, EntryCollection],
+) -> Dict[str, List[EntryResource]]:
+    """Awaitable variant of :func:`get_included_relationships`"""
+    endpoint_includes = _collect_relationships(results, ENTRY_COLLECTIONS)
 
-        # still need to handle pagination
-        ref_results, _, _, _ = ENTRY_COLLECTIONS[entry_type].find(params)
-        included[entry_type] = ref_results
+    included = {}
+    for entry_type in endpoint_includes:
+        collection = ENTRY_COLLECTIONS[entry_type]
+        ids = endpoint_includes[entry_type]
+        if isinstance(collection, AsyncMongoCollection):
+            included[entry_type] = await collection.find_by_ids(ids)
+        else:
+            included[entry_type] = await run_in_threadpool(collection.find_by_ids, ids)
 
     # flatten dict by endpoint to list
     return [obj for endp in included.values() for obj in endp]
 
 
+def get_next_link(request: Request, next_page_cursor: Optional[str]) -> ToplevelLinks:
+    """Top-level links of an entry listing, pointing to the next page if there is one
+
+    The next page is addressed by an opaque `page_cursor` rather than a `page_offset`,
+    so that fetching it does not require skipping over all previous pages.
+    """
+    if not next_page_cursor:
+        return ToplevelLinks(next=None)
+
+    parse_result = urllib.parse.urlparse(str(request.url))
+    query = urllib.parse.parse_qs(parse_result.query)
+    query.pop("page_offset", None)
+    query["page_cursor"] = next_page_cursor
+    urlencoded = urllib.parse.urlencode(query, doseq=True)
+    return ToplevelLinks(
+        next=f"{parse_result.scheme}://{parse_result.netloc}{parse_result.path}?{urlencoded}"
+    )
+
+
+def _dumps(content) -> str:
+    """Serialize JSON like :class:`starlette.responses.JSONResponse`"""
+    return json.dumps(
+        jsonable_encoder(content, exclude_unset=True),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    )
+
+
+def entries_response(
+    response: Union[EntryResponseMany, EntryResponseOne], endpoint: str, **content
+) -> JSONResponse:
+    """Serialize an entry listing or single entry response from its top-level members
+
+    The members are validated against the `response` model, unless ``VALIDATE_RESPONSES`` is off.
+    The response is serialized here rather than by FastAPI, so that the model is validated
+    only once and the serialization is timed for the `endpoint`.
+    """
+    if CONFIG.validate_responses:
+        with timed(endpoint, "response"):
+            content = response(**content)
+    with timed(endpoint, "serialization"):
+        return JSONResponse(content=jsonable_encoder(content, exclude_unset=True))
+
+
+def stream_entries(
+    collection: MongoCollection, request: Request, params: EntryListingQueryParams,
+) -> StreamingResponse:
+    """Generalized /{entry} endpoint getter, streaming the response body
+
+    Each entry is serialized and sent as soon as it comes off the database cursor,
+    so only one entry of the page is held in memory at a time.
+    The JSON:API top-level members depending on the whole page, i.e., `included`,
+    `links` and `meta`, are sent after `data`.
+
+    Invalid query parameters are reported before the response starts.
+    An error while streaming can only abort the response.
+    """
+    from optimade.server.routers import ENTRY_COLLECTIONS
+
+    collections = included_collections(params, ENTRY_COLLECTIONS)
+    available = query_executor.submit(len, collection)
+    try:
+        results, page = collection.find_iter(params)
+    except Exception:
+        available.cancel()
+        raise
+
+    def body():
+        endpoint_includes = defaultdict(dict)
+        separator = ""
+        try:
+            yield '{"data":['
+            for entry in results:
+                _collect_relationships(entry, collections, endpoint_includes)
+                if page["fields"]:
+                    entry = handle_response_fields(entry, page["fields"])[0]
+                yield separator + _dumps(entry)
+                separator = ","
+
+            included = _fetch_included(endpoint_includes, collections)
+            data_available = available.result()
+        finally:
+            available.cancel()
+        links = get_next_link(request, page["next_page_cursor"])
+        meta = meta_values(
+            url=str(request.url),
+            data_returned=page["data_returned"],
+            data_available=data_available,
+            more_data_available=page["more_data_available"],
+            **data_returned_meta(collection, params, page["data_returned"]),
+        )
+        yield f'],"included":{_dumps(included)},"links":{_dumps(links)},"meta":{_dumps(meta)}}}'
+
+    return StreamingResponse(body(), media_type="application/json")
+
+
 def get_entries(
     collection: EntryCollection,
     response: EntryResponseMany,
     request: Request,
     params: EntryListingQueryParams,
 ) -> EntryResponseMany:
-    """Generalized /{entry} endpoint getter"""
+    """Generalized /{entry} endpoint getter
+
+    With ``STREAM_RESPONSES`` set, the response of a :class:`MongoCollection`
+    is streamed by :func:`stream_entries`.
+    """
     from optimade.server.routers import ENTRY_COLLECTIONS
 
-    results, data_returned, more_data_available, fields = collection.find(params)
+    if CONFIG.stream_responses and isinstance(collection, MongoCollection):
+        return stream_entries(collection, request, params)
 
-    included = get_included_relationships(results, ENTRY_COLLECTIONS)
+    collections = included_collections(params, ENTRY_COLLECTIONS)
+    available = query_executor.submit(len, collection)
+    try:
+        (
+            results,
+            data_returned,
+            more_data_available,
+            fields,
+            next_page_cursor,
+        ) = collection.find(params)
 
-    if more_data_available:
-        parse_result = urllib.parse.urlparse(str(request.url))
-        query = urllib.parse.parse_qs(parse_result.query)
-        query["page_offset"] = int(query.get("page_offset", [0])[0]) + len(results)
-        urlencoded = urllib.parse.urlencode(query, doseq=True)
-        links = ToplevelLinks(
-            next=f"{parse_result.scheme}://{parse_result.netloc}{parse_result.path}?{urlencoded}"
+        with timed(collection.resource_mapper.ENDPOINT, "include"):
+            included = get_included_relationships(results, collections)
+
+        data_available = available.result()
+    finally:
+        # Not counted if the request failed before the count started
+        available.cancel()
+
+    links = get_next_link(request, next_page_cursor)
+
+    if fields:
+        with timed(collection.resource_mapper.ENDPOINT, "response_fields"):
+            results = handle_response_fields(results, fields)
+
+    return entries_response(
+        response,
+        collection.resource_mapper.ENDPOINT,
+        links=links,
+        data=results,
+        meta=meta_values(
+            url=str(request.url),
+            data_returned=data_returned,
+            data_available=data_available,
+            more_data_available=more_data_available,
+            **data_returned_meta(collection, params, data_returned),
+        ),
+        included=included,
+    )
+
+
+async def get_entries_async(
+    collection: EntryCollection,
+    response: EntryResponseMany,
+    request: Request,
+    params: EntryListingQueryParams,
+) -> EntryResponseMany:
+    """Generalized /{entry} endpoint getter for use in `async` path operations.
+
+    Synchronous collections are queried in the threadpool, while an
+    :class:`AsyncMongoCollection` is awaited directly.
+    """
+    from optimade.server.routers import ENTRY_COLLECTIONS
+
+    if not isinstance(collection, AsyncMongoCollection):
+        return await run_in_threadpool(
+            get_entries, collection, response, request, params
         )
-    else:
-        links = ToplevelLinks(next=None)
+
+    collections = included_collections(params, ENTRY_COLLECTIONS)
+    (
+        (results, data_returned, more_data_available, fields, next_page_cursor),
+        data_available,
+    ) = await asyncio.gather(collection.find(params), collection.count_available())
+
+    with timed(collection.resource_mapper.ENDPOINT, "include"):
+        included = await get_included_relationships_async(results, collections)
+
+    links = get_next_link(request, next_page_cursor)
 
     if fields:
-        results = handle_response_fields(results, fields)
+        with timed(collection.resource_mapper.ENDPOINT, "response_fields"):
+            results = handle_response_fields(results, fields)
 
-    return response(
+    return entries_response(
+        response,
+        collection.resource_mapper.ENDPOINT,
         links=links,
         data=results,
         meta=meta_values(
             url=str(request.url),
             data_returned=data_returned,
-            data_available=len(collection),
+            data_available=data_available,
             more_data_available=more_data_available,
+            **data_returned_meta(collection, params, data_returned),
         ),
         included=included,
     )
@@ -187,10 +428,85 @@ def get_single_entry(
     from optimade.server.routers import ENTRY_COLLECTIONS
 
     params.filter = f'id="{entry_id}"'
-    results, data_returned, more_data_available, fields = collection.find(params)
+    collections = included_collections(params, ENTRY_COLLECTIONS)
+    available = query_executor.submit(len, collection)
+    try:
+        results, data_returned, more_data_available, fields, _ = collection.find(params)
+
+        with timed(collection.resource_mapper.ENDPOINT, "include"):
+            included = get_included_relationships(results, collections)
+
+        data_available = available.result()
+    finally:
+        # Not counted if the request failed before the count started
+        available.cancel()
+
+    return _single_entry_response(
+        response=response,
+        endpoint=collection.resource_mapper.ENDPOINT,
+        request=request,
+        results=results,
+        data_returned=data_returned,
+        more_data_available=more_data_available,
+        fields=fields,
+        included=included,
+        data_available=data_available,
+    )
+
+
+async def get_single_entry_async(
+    collection: EntryCollection,
+    entry_id: str,
+    response: EntryResponseOne,
+    request: Request,
+    params: SingleEntryQueryParams,
+) -> EntryResponseOne:
+    """Single entry endpoint getter for use in `async` path operations.
 
-    included = get_included_relationships(results, ENTRY_COLLECTIONS)
+    Synchronous collections are queried in the threadpool, while an
+    :class:`AsyncMongoCollection` is awaited directly.
+    """
+    from optimade.server.routers import ENTRY_COLLECTIONS
 
+    if not isinstance(collection, AsyncMongoCollection):
+        return await run_in_threadpool(
+            get_single_entry, collection, entry_id, response, request, params
+        )
+
+    params.filter = f'id="{entry_id}"'
+    collections = included_collections(params, ENTRY_COLLECTIONS)
+    (
+        (results, data_returned, more_data_available, fields, _),
+        data_available,
+    ) = await asyncio.gather(collection.find(params), collection.count_available())
+
+    with timed(collection.resource_mapper.ENDPOINT, "include"):
+        included = await get_included_relationships_async(results, collections)
+
+    return _single_entry_response(
+        response=response,
+        endpoint=collection.resource_mapper.ENDPOINT,
+        request=request,
+        results=results,
+        data_returned=data_returned,
+        more_data_available=more_data_available,
+        fields=fields,
+        included=included,
+        data_available=data_available,
+    )
+
+
+def _single_entry_response(
+    response: EntryResponseOne,
+    endpoint: str,
+    request: Request,
+    results: EntryResource,
+    data_returned: int,
+    more_data_available: bool,
+    fields: set,
+    included: List[EntryResource],
+    data_available: int,
+) -> EntryResponseOne:
     if more_data_available:
         raise StarletteHTTPException(
             status_code=500,
@@ -200,15 +516,18 @@ def get_single_entry(
     links = ToplevelLinks(next=None)
 
     if fields and results is not None:
-        results = handle_response_fields(results, fields)[0]
+        with timed(endpoint, "response_fields"):
+            results = handle_response_fields(results, fields)[0]
 
-    return response(
+    return entries_response(
+        response,
+        endpoint,
         links=links,
         data=results,
         meta=meta_values(
             url=str(request.url),
             data_returned=data_returned,
-            data_available=len(collection),
+            data_available=data_available,
             more_data_available=more_data_available,
         ),
         included=included,
@@ -240,14 +559,27 @@ def retrieve_queryable_properties(schema: dict, queryable_properties: list) -> d
     return properties
 
 
-def get_providers():
-    """Retrieve providers.json from /Materials-Consortia/OPTiMaDe"""
-    import requests
+PROVIDERS_URL = "https://raw.githubusercontent.com/Materials-Consortia/OPTiMaDe/master/providers.json"
+PROVIDERS_PATH = Path(__file__).resolve().parent.parent.joinpath("providers.json")
+
+
+def get_providers(refresh: bool = False) -> List[dict]:
+    """Providers of providers.json from /Materials-Consortia/OPTiMaDe as links documents
+
+    Parameters:
+        refresh: fetch the current providers.json from GitHub instead of reading the
+            snapshot shipped with the package.
+
+    """
     from bson.objectid import ObjectId
 
-    mat_consortia_providers = requests.get(
-        "https://raw.githubusercontent.com/Materials-Consortia/OPTiMaDe/master/providers.json"
-    ).json()
+    if refresh:
+        import requests
+
+        mat_consortia_providers = requests.get(PROVIDERS_URL, timeout=10).json()
+    else:
+        with open(PROVIDERS_PATH) as f:
+            mat_consortia_providers = json.load(f)
 
     providers_list = []
     for provider in mat_consortia_providers.get("data", []):
@@ -264,7 +596,7 @@ def get_providers():
         elif len(oid) > 12:
             oid = oid[:12]
         oid = oid.encode("UTF-8")
-        provider["_id"] = {"$oid": ObjectId(oid)}
+        provider["_id"] = ObjectId(oid)
 
         providers_list.append(provider)
 
@@ -0,0 +1,256 @@
+"""Load test and seed data into the collections of the server.
+
+Documents are streamed from JSON files holding an array of documents (decoded one document
+at a time) or JSON Lines files (``.jsonl`` or ``.ndjson``, one document per line).
+MongoDB extended JSON (e.g., ``{"$oid": ...}``) is decoded into BSON types, and the documents
+are inserted in batches together with their derived fields (see `ResourceMapper.derived_fields()`).
+
+Without a real MongoDB, the servers load their test data at startup, and the links of the
+test data are joined by the providers of the ``providers.json`` snapshot shipped with the
+package. With ``REFRESH_PROVIDERS = yes``, the providers are refreshed from GitHub in the
+background after startup. Each source is loaded into a collection at most once per process,
+so the loaders can also be called directly, e.g., by tests:
+
+    from optimade.server.seed import load_test_data
+    load_test_data()
+"""
+import json
+from itertools import islice
+from pathlib import Path
+from threading import Lock
+from typing import IO, Callable, Iterable, Iterator, Set, Tuple, Union
+
+import bson.json_util
+import pymongo
+
+from .config import CONFIG
+from .entry_collections import MongoCollection
+from .index_advisor import sync_collection
+
+__all__ = (
+    "TEST_DATA_PATHS",
+    "iter_documents",
+    "insert_documents",
+    "load_file",
+    "load_test_data",
+    "load_index_links",
+    "refresh_providers",
+)
+
+TEST_DATA_PATHS = {
+    "structures": Path(__file__)
+    .resolve()
+    .parent.joinpath("tests/test_structures.json"),
+    "references": Path(__file__)
+    .resolve()
+    .parent.joinpath("tests/test_references.json"),
+    "links": Path(__file__).resolve().parent.joinpath("tests/test_links.json"),
+}
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+JSON_LINES_SUFFIXES = (".jsonl", ".ndjson")
+
+_DECODER = json.JSONDecoder(object_hook=bson.json_util.object_hook)
+_WHITESPACE = " \t\n\r"
+
+# (collection, source) pairs loaded in this process
+_loaded: Set[Tuple[str, str]] = set()
+_lock = Lock()
+
+
+def _document(value, source: str) -> dict:
+    if not isinstance(value, dict):
+        raise ValueError(f"{source}: expected documents (objects), found {value!r}")
+    return value
+
+
+def _iter_json_lines(stream: IO[str], source: str) -> Iterator[dict]:
+    for number, line in enumerate(stream, start=1):
+        if line.strip():
+            yield _document(_DECODER.decode(line), f"{source}:{number}")
+
+
+def _iter_json_array(stream: IO[str], source: str, chunk_size: int) -> Iterator[dict]:
+    """The documents of a JSON array, decoded as soon as they have been read"""
+    buffer, pos, eof = "", 0, False
+    # The next token: "[", then a document or "]" ("first"), then "," or "]" (","),
+    # then a document ("document")
+    expected = "["
+    while True:
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        if pos < len(buffer):
+            char = buffer[pos]
+            if expected == "[":
+                if char != "[":
+                    raise ValueError(f"{source}: expected an array of documents")
+                pos, expected = pos + 1, "first"
+                continue
+            if char == "]" and expected in ("first", ","):
+                return
+            if expected == ",":
+                if char != ",":
+                    raise ValueError(f"{source}: expected ',' or ']' at {char!r}")
+                pos, expected = pos + 1, "document"
+                continue
+            try:
+                value, end = _DECODER.raw_decode(buffer, pos)
+            except json.JSONDecodeError as exc:
+                if eof:
+                    raise ValueError(f"{source}: {exc}") from None
+            else:
+                yield _document(value, source)
+                pos, expected = end, ","
+                continue
+        elif eof:
+            raise ValueError(f"{source}: unexpected end of the array of documents")
+        # Read on, at least as much as is buffered, so that large documents are decoded
+        # a logarithmic number of times
+        chunk = stream.read(max(chunk_size, len(buffer) - pos))
+        buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+
+
+def iter_documents(
+    path: Union[str, Path], chunk_size: int = CHUNK_SIZE
+) -> Iterator[dict]:
+    """Stream the documents of a JSON array or JSON Lines file
+
+    Raises:
+        ValueError: if the file is not valid JSON, or does not hold documents.
+
+    """
+    path = Path(path)
+    with open(path) as stream:
+        if path.suffix in JSON_LINES_SUFFIXES:
+            yield from _iter_json_lines(stream, str(path))
+        else:
+            yield from _iter_json_array(stream, str(path), chunk_size)
+
+
+def insert_documents(
+    collection: MongoCollection,
+    documents: Iterable[dict],
+    batch_size: int = BATCH_SIZE,
+) -> int:
+    """Insert the documents, with their derived fields, in batches of `batch_size`
+
+    Returns:
+        The number of inserted documents.
+    """
+    raw = sync_collection(collection)
+    mapper = collection.resource_mapper
+    documents = iter(documents)
+    inserted = 0
+    while True:
+        batch = list(islice(documents, batch_size))
+        if not batch:
+            break
+        for doc in batch:
+            doc.update(mapper.derived_fields(doc))
+        raw.insert_many(batch)
+        inserted += len(batch)
+    if inserted:
+        collection.invalidate()
+        collection.count_cache.clear()
+    return inserted
+
+
+def _load_once(
+    collection: MongoCollection,
+    source: str,
+    documents: Callable[[], Iterable[dict]],
+    batch_size: int = BATCH_SIZE,
+) -> int:
+    key = (sync_collection(collection).full_name, source)
+    with _lock:
+        if key in _loaded:
+            return 0
+        inserted = insert_documents(collection, documents(), batch_size)
+        _loaded.add(key)
+    return inserted
+
+
+def load_file(
+    collection: MongoCollection, path: Union[str, Path], batch_size: int = BATCH_SIZE
+) -> int:
+    """Stream the documents of a file into the collection, unless already loaded
+
+    Returns:
+        The number of inserted documents (0 if the file was loaded before).
+    """
+    path = Path(path).resolve()
+    return _load_once(collection, str(path), lambda: iter_documents(path), batch_size)
+
+
+def load_test_data() -> int:
+    """Load the test data of all entry endpoints, and the providers into the links
+
+    Returns:
+        The number of inserted documents.
+    """
+    from .routers import ENTRY_COLLECTIONS
+    from .routers.utils import get_providers
+
+    inserted = 0
+    for name, collection in ENTRY_COLLECTIONS.items():
+        path = TEST_DATA_PATHS.get(name)
+        if path is None or not path.exists():
+            continue
+        print(f"loading test {name}...")
+        inserted += load_file(collection, path)
+        if name == "links":
+            print("adding the providers of providers.json to links")
+            inserted += _load_once(collection, "providers.json", get_providers)
+        print(f"done inserting test {name}...")
+    return inserted
+
+
+def load_index_links() -> int:
+    """Load the links of the index meta-database
+
+    Returns:
+        The number of inserted documents.
+    """
+    from .routers.links import links_coll
+
+    if not CONFIG.index_links_path.exists():
+        return 0
+    print("loading index links...")
+    inserted = load_file(links_coll, CONFIG.index_links_path)
+    print("done inserting index links...")
+    return inserted
+
+
+def refresh_providers() -> int:
+    """Replace the providers in the links by the current providers.json from GitHub
+
+    Meant to run in the background: if the providers cannot be fetched, the snapshot is
+    kept and a warning issued.
+
+    Returns:
+        The number of inserted or replaced providers.
+    """
+    import requests
+    from warnings import warn
+
+    from .routers.links import links_coll
+    from .routers.utils import get_providers
+
+    try:
+        providers = get_providers(refresh=True)
+    except (requests.RequestException, ValueError, KeyError) as exc:
+        warn(f"Cannot refresh the providers, keeping the snapshot: {exc}")
+        return 0
+    if not providers:
+        return 0
+    result = sync_collection(links_coll).bulk_write(
+        [
+            pymongo.ReplaceOne({"_id": provider["_id"]}, provider, upsert=True)
+            for provider in providers
+        ],
+        ordered=False,
+    )
+    links_coll.invalidate()
+    links_coll.count_cache.clear()
+    return result.upserted_count + result.modified_count
@@ -0,0 +1,47 @@
+import unittest
+from unittest import mock
+
+from optimade.server.cache import LRUCache
+
+
+class LRUCacheTests(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = LRUCache(maxsize=2)
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" is now the least recently used
+        cache.set("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_disabled(self):
+        cache = LRUCache(maxsize=0)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_delete(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.delete("a")
+        cache.delete("b")
+        self.assertNotIn("a", cache)
+
+    def test_ttl(self):
+        cache = LRUCache(maxsize=2, ttl=10)
+        with mock.patch("optimade.server.cache.monotonic", return_value=100.0):
+            cache.set("a", 1)
+        with mock.patch("optimade.server.cache.monotonic", return_value=105.0):
+            self.assertEqual(cache.get("a"), 1)
+        with mock.patch("optimade.server.cache.monotonic", return_value=111.0):
+            self.assertIsNone(cache.get("a"))
+        self.assertNotIn("a", cache)
@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from optimade.server.config import CONFIG, ServerConfig
+
+
+class ServerConfigTests(unittest.TestCase):
+    def test_snapshot(self):
+        config = ServerConfig()
+        with mock.patch.object(
+            config, "_read_settings", wraps=config._read_settings
+        ) as read_settings:
+            self.assertEqual(config.page_limit, 500)
+            self.assertEqual(config.provider["prefix"], "_exmpl_")
+            with self.assertRaises(AttributeError):
+                config.no_such_parameter
+            self.assertEqual(read_settings.call_count, 1)
+
+        with self.assertRaises(AttributeError):
+            config.settings.page_limit = 10
+        with self.assertRaises(TypeError):
+            config.provider["prefix"] = "_other_"
+        self.assertIsInstance(config.provider_fields["structures"], frozenset)
+
+    def test_environment_overrides(self):
+        environ = {
+            "OPTIMADE_PAGE_LIMIT": "20",
+            "OPTIMADE_VALIDATE_RESPONSES": "no",
+            "OPTIMADE_PROVIDER_FIELDS": '{"structures": ["band_gap"]}',
+        }
+        with mock.patch.dict(os.environ, environ):
+            config = ServerConfig()
+            self.assertEqual(config.page_limit, 20)
+            self.assertIs(config.validate_responses, False)
+            self.assertEqual(config.provider_fields["structures"], {"band_gap"})
+            self.assertEqual(config.provider_fields["links"], frozenset())
+
+        with mock.patch.dict(os.environ, {"OPTIMADE_METRICS": "maybe"}):
+            with self.assertRaises(ValueError):
+                ServerConfig().metrics
+
+    def test_load_from_json(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            server_cfg = Path(tmp).joinpath("server.cfg")
+            server_cfg.write_text(
+                "[optimadeconfig]\nCONFIG = config.json\nINDEX_LINKS = index_links.json\n"
+            )
+            Path(tmp).joinpath("index_links.json").write_text("[]")
+            Path(tmp).joinpath("config.json").write_text(
+                json.dumps(
+                    {
+                        "page_limit": 50,
+                        "structures_collection": "materials",
+                        "provider_fields": {"structures": ["band_gap"]},
+                    }
+                )
+            )
+            config = ServerConfig(server_cfg=server_cfg)
+            self.assertEqual(config.page_limit, 50)
+            self.assertEqual(config.structures_collection, "materials")
+            self.assertEqual(config.links_collection, "links")
+            self.assertEqual(config.provider_fields["structures"], {"band_gap"})
+            self.assertEqual(config.provider_fields["references"], frozenset())
+
+    def test_reload(self):
+        config = ServerConfig()
+        hook = config.on_reload(mock.Mock())
+        first = config.settings
+        with mock.patch.dict(os.environ, {"OPTIMADE_PAGE_LIMIT": "20"}):
+            second = config.reload()
+        self.assertIs(config.settings, second)
+        self.assertEqual((first.page_limit, config.page_limit), (500, 20))
+        hook.assert_called_once_with(second)
+
+    def test_reload_collections(self):
+        from optimade.server.routers.references import references_coll
+        from optimade.server.routers.structures import structures_coll
+
+        structures_coll._compile_filter("nelements > 2")
+        environ = {
+            "OPTIMADE_PAGE_LIMIT": "20",
+            "OPTIMADE_REFERENCE_CACHE_SIZE": "5",
+            "OPTIMADE_REFERENCE_CACHE_TTL": "30",
+        }
+        try:
+            with mock.patch.dict(os.environ, environ):
+                CONFIG.reload()
+            self.assertEqual(structures_coll.page_limit, 20)
+            self.assertEqual(len(structures_coll.filter_cache), 0)
+            self.assertEqual(
+                (references_coll.entry_cache.maxsize, references_coll.entry_cache.ttl),
+                (5, 30),
+            )
+            self.assertEqual(structures_coll.entry_cache.maxsize, 0)
+        finally:
+            CONFIG.reload()
+        self.assertEqual(structures_coll.page_limit, 500)
+        self.assertEqual(references_coll.entry_cache.maxsize, 1000)
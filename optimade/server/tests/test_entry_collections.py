@@ -0,0 +1,479 @@
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from fastapi import HTTPException
+from pymongo.errors import OperationFailure
+
+from optimade.models import StructureResource
+from optimade.server.deps import EntryListingQueryParams, SingleEntryQueryParams
+from optimade.server import entry_collections
+from optimade.server.entry_collections import AsyncMongoCollection, MongoCollection
+from optimade.server.mappers import StructureMapper
+
+from optimade.server.routers.references import references_coll
+from optimade.server.routers.structures import structures_coll
+from optimade.server.seed import load_test_data
+
+load_test_data()
+
+
+def listing_params(**kwargs):
+    params = dict(
+        filter="",
+        response_format="json",
+        email_address="",
+        response_fields="",
+        sort="",
+        page_limit=500,
+        page_offset=0,
+        page_page=0,
+        page_cursor="",
+        page_above=0,
+        page_below=0,
+        include="references",
+    )
+    params.update(kwargs)
+    return EntryListingQueryParams(**params)
+
+
+def single_params(**kwargs):
+    params = dict(
+        response_format="json",
+        email_address="",
+        response_fields="",
+        include="references",
+    )
+    params.update(kwargs)
+    return SingleEntryQueryParams(**params)
+
+
+class AsyncCursor:
+    """Minimal stand-in for a motor cursor around a synchronous cursor"""
+
+    def __init__(self, cursor):
+        self._cursor = iter(cursor)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._cursor)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class AsyncCollection:
+    """Minimal stand-in for a motor collection around a synchronous collection"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self._collection.find(*args, **kwargs))
+
+    async def count_documents(self, *args, **kwargs):
+        return self._collection.count_documents(*args, **kwargs)
+
+    async def estimated_document_count(self):
+        return self._collection.estimated_document_count()
+
+
+class AsyncMongoCollectionTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.sync_coll = structures_coll
+        cls.async_coll = AsyncMongoCollection(
+            collection=AsyncCollection(structures_coll.collection),
+            resource_cls=StructureResource,
+            resource_mapper=StructureMapper,
+        )
+
+    def run_async(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def test_sync_collection(self):
+        self.assertIsInstance(self.sync_coll, MongoCollection)
+        self.assertNotIsInstance(self.sync_coll, AsyncMongoCollection)
+
+    def test_find(self):
+        params = listing_params(filter='elements HAS "Ac"', page_limit=2)
+        expected = self.sync_coll.find(params)
+        results = self.run_async(self.async_coll.find(params))
+        self.assertEqual(results, expected)
+        self.assertEqual(results[1:3], (6, True))
+
+    def test_find_single(self):
+        params = single_params()
+        params.filter = 'id="mpf_1"'
+        results, data_returned, more_data_available, _, _ = self.run_async(
+            self.async_coll.find(params)
+        )
+        self.assertEqual(results.id, "mpf_1")
+        self.assertEqual((data_returned, more_data_available), (1, False))
+
+    def test_count_available(self):
+        self.assertEqual(
+            self.run_async(self.async_coll.count_available()), len(self.sync_coll)
+        )
+        with self.assertRaises(TypeError):
+            len(self.async_coll)
+
+
+class CountTests(unittest.TestCase):
+    def setUp(self):
+        self.collection = MongoCollection(
+            collection=structures_coll.collection,
+            resource_cls=StructureResource,
+            resource_mapper=StructureMapper,
+        )
+
+    def test_pagination_counts(self):
+        data_available = len(self.collection)
+        seen = 0
+        for page_offset in range(0, data_available, 5):
+            results, data_returned, more_data_available, _, _ = self.collection.find(
+                listing_params(page_limit=5, page_offset=page_offset)
+            )
+            seen += len(results)
+            self.assertEqual(data_returned, data_available)
+            self.assertEqual(more_data_available, seen < data_available)
+        self.assertEqual(seen, data_available)
+
+    def test_count_alongside_find(self):
+        counting, released, counted = (threading.Event() for _ in range(3))
+        count_data_returned = self.collection.count_data_returned
+
+        def blocking_count(filter_):
+            counting.set()
+            # Released by the page query, or times out if the page waits for the count
+            released.wait(5)
+            try:
+                return count_data_returned(filter_)
+            finally:
+                counted.set()
+
+        find = self.collection.collection.find
+        finds = []
+
+        def releasing_find(*args, **kwargs):
+            finds.append(counting.wait(5) and not counted.is_set())
+            released.set()
+            return find(*args, **kwargs)
+
+        with mock.patch.object(
+            self.collection, "count_data_returned", blocking_count
+        ), mock.patch.object(self.collection.collection, "find", releasing_find):
+            results, data_returned, _, _, _ = self.collection.find(
+                listing_params(page_limit=5)
+            )
+        self.assertEqual(finds, [True])
+        self.assertEqual((len(results), data_returned), (5, len(self.collection)))
+
+    def test_count_cancelled(self):
+        # A busy executor, so that the count cannot start before the page query fails
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        busy = threading.Event()
+        self.addCleanup(busy.set)
+        executor.submit(busy.wait, 5)
+        counts = []
+        submit = executor.submit
+
+        def recording_submit(*args, **kwargs):
+            counts.append(submit(*args, **kwargs))
+            return counts[-1]
+
+        with mock.patch.object(
+            entry_collections, "query_executor", executor
+        ), mock.patch.object(executor, "submit", recording_submit):
+            for find in (self.collection.find, self.collection.find_iter):
+                with mock.patch.object(
+                    self.collection.collection,
+                    "find",
+                    side_effect=OperationFailure("failed"),
+                ):
+                    with self.assertRaises(OperationFailure):
+                        find(listing_params(page_limit=5))
+        self.assertEqual(len(counts), 2)
+        self.assertTrue(all(count.cancelled() for count in counts))
+
+    def test_count_cache(self):
+        cache = self.collection.count_cache
+        self.collection.find(listing_params(filter='elements HAS "Ac"', page_limit=2))
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        _, data_returned, _, _, _ = self.collection.find(
+            listing_params(filter='elements HAS "Ac"', page_limit=2, page_offset=2)
+        )
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(data_returned, 6)
+
+    def test_approximate_counts(self):
+        self.collection.approximate_counts = True
+        self.collection.approximate_count_limit = 3
+
+        params = listing_params(filter='elements HAS "Ac"', page_limit=2)
+        _, data_returned, more_data_available, _, _ = self.collection.find(params)
+        self.assertEqual((data_returned, more_data_available), (3, True))
+        self.assertTrue(
+            self.collection.data_returned_is_approximate(params, data_returned)
+        )
+
+        # Past the capped count, pagination still continues
+        params = listing_params(filter='elements HAS "Ac"', page_limit=2, page_offset=2)
+        _, data_returned, more_data_available, _, _ = self.collection.find(params)
+        self.assertEqual((data_returned, more_data_available), (5, True))
+
+        params = listing_params(filter="nelements>8")
+        _, data_returned, _, _, _ = self.collection.find(params)
+        self.assertEqual(data_returned, 1)
+        self.assertFalse(
+            self.collection.data_returned_is_approximate(params, data_returned)
+        )
+
+        params = listing_params()
+        _, data_returned, _, _, _ = self.collection.find(params)
+        self.assertEqual(data_returned, len(self.collection))
+        self.assertTrue(
+            self.collection.data_returned_is_approximate(params, data_returned)
+        )
+
+
+class PageCursorTests(unittest.TestCase):
+    def setUp(self):
+        self.collection = MongoCollection(
+            collection=structures_coll.collection,
+            resource_cls=StructureResource,
+            resource_mapper=StructureMapper,
+        )
+
+    def harvest(self, **kwargs):
+        ids = []
+        page_cursor = ""
+        while True:
+            (
+                results,
+                data_returned,
+                more_data_available,
+                _,
+                page_cursor,
+            ) = self.collection.find(listing_params(page_cursor=page_cursor, **kwargs))
+            ids.extend(_.id for _ in results)
+            self.assertEqual(more_data_available, page_cursor is not None)
+            if not more_data_available:
+                return ids, data_returned
+
+    def test_cursor_pagination(self):
+        for sort in ("", "nelements", "-nelements,chemical_formula_reduced"):
+            expected, _, _, _, _ = self.collection.find(listing_params(sort=sort))
+            ids, data_returned = self.harvest(sort=sort, page_limit=3)
+            self.assertEqual(ids, [_.id for _ in expected])
+            self.assertEqual(data_returned, len(expected))
+
+    def test_cursor_pagination_filter(self):
+        ids, data_returned = self.harvest(filter='elements HAS "Ac"', page_limit=2)
+        self.assertEqual(len(ids), 6)
+        self.assertEqual(len(set(ids)), 6)
+        self.assertEqual(data_returned, 6)
+
+    def test_invalid_cursor(self):
+        _, _, _, _, page_cursor = self.collection.find(
+            listing_params(sort="nelements", page_limit=2)
+        )
+        for params in (
+            listing_params(sort="-nelements", page_cursor=page_cursor),
+            listing_params(page_cursor="not a cursor"),
+        ):
+            with self.assertRaises(HTTPException) as context:
+                self.collection.find(params)
+            self.assertEqual(context.exception.status_code, 400)
+
+
+class ResponseFieldsTests(unittest.TestCase):
+    def setUp(self):
+        self.collection = MongoCollection(
+            collection=structures_coll.collection,
+            resource_cls=StructureResource,
+            resource_mapper=StructureMapper,
+        )
+
+    def test_projection(self):
+        criteria = self.collection._parse_params(
+            listing_params(response_fields="id,chemical_formula_reduced")
+        )
+        self.assertEqual(
+            set(criteria["projection"]),
+            {"task_id", "type", "relationships", "links", "pretty_formula", "_id",},
+        )
+        self.assertIn("nsites", criteria["fields"])
+        self.assertNotIn("id", criteria["fields"])
+
+        # Database fields that are not OPTiMaDe fields are never read
+        criteria = self.collection._parse_params(
+            listing_params(response_fields="nelements,_composition,_mp_chemsys")
+        )
+        self.assertNotIn("_composition", criteria["projection"])
+        self.assertNotIn("_mp_chemsys", criteria["projection"])
+
+        # The sort keys are read for the page cursor
+        criteria = self.collection._parse_params(
+            listing_params(response_fields="nelements", sort="-nsites")
+        )
+        self.assertIn("nsites", criteria["projection"])
+
+    def test_partial_entries(self):
+        results, _, _, fields, _ = self.collection.find(
+            listing_params(response_fields="nelements", sort="-nsites")
+        )
+        self.assertIn("nsites", fields)
+        for entry in results:
+            self.assertEqual(entry["type"], "structures")
+            self.assertIn("id", entry)
+            self.assertLessEqual(set(entry["attributes"]), {"nelements", "nsites"})
+
+
+class SortTests(unittest.TestCase):
+    def test_sort_spec(self):
+        self.assertEqual(structures_coll._sort_spec(""), [("_id", 1)])
+        self.assertEqual(
+            structures_coll._sort_spec("chemical_formula_reduced"),
+            [("pretty_formula", 1), ("_id", 1)],
+        )
+        # Aliases of the same field are sorted on once, and `_id` follows the last key
+        self.assertEqual(
+            structures_coll._sort_spec(
+                "nelements,-chemical_formula_descriptive,chemical_formula_reduced"
+            ),
+            [("nelements", 1), ("pretty_formula", -1), ("_id", -1)],
+        )
+        self.assertEqual(
+            structures_coll._sort_spec("-_exmpl_band_gap"),
+            [("band_gap", -1), ("_id", -1)],
+        )
+
+    def test_unsortable_fields(self):
+        for sort in ("unknown", "nelements,-elements", "cartesian_site_positions"):
+            with self.assertRaises(HTTPException) as context:
+                structures_coll.find(listing_params(sort=sort))
+            self.assertEqual(context.exception.status_code, 400)
+
+    def test_aliased_sort(self):
+        results, _, _, _, _ = structures_coll.find(
+            listing_params(sort="-chemical_formula_reduced")
+        )
+        formulas = [_.attributes.chemical_formula_reduced for _ in results]
+        self.assertEqual(formulas, sorted(formulas, reverse=True))
+
+    def test_allow_disk_use(self):
+        # mongomock cannot sort on disk
+        criteria = structures_coll._parse_params(listing_params(sort="nsites"))
+        self.assertNotIn("allow_disk_use", criteria)
+        with mock.patch.object(structures_coll, "allow_disk_use", True):
+            criteria = structures_coll._parse_params(listing_params(sort="nsites"))
+        self.assertIs(criteria["allow_disk_use"], True)
+
+
+class FindByIdsTests(unittest.TestCase):
+    def test_find_by_ids(self):
+        results = structures_coll.find_by_ids(["mpf_3", "mpf_1", "mpf_3", "missing"])
+        self.assertEqual([_.id for _ in results], ["mpf_3", "mpf_1"])
+        self.assertEqual(structures_coll.find_by_ids([]), [])
+
+    def test_find_by_ids_query(self):
+        criteria = structures_coll._ids_criteria(["mpf_1", "mpf_2"])
+        self.assertEqual(criteria["filter"], {"task_id": {"$in": ["mpf_1", "mpf_2"]}})
+
+    def test_entry_cache(self):
+        self.assertEqual(structures_coll.entry_cache.maxsize, 0)
+        references_coll.invalidate()
+        with mock.patch.object(
+            references_coll.collection, "find", wraps=references_coll.collection.find
+        ) as find:
+            first = references_coll.find_by_ids(["maddox1988", "dijkstra1968"])
+            self.assertEqual(
+                find.call_args[1]["filter"],
+                {"id": {"$in": ["maddox1988", "dijkstra1968"]}},
+            )
+            second = references_coll.find_by_ids(
+                ["dummy2019", "dijkstra1968", "maddox1988"]
+            )
+            self.assertEqual(find.call_count, 2)
+            self.assertEqual(
+                find.call_args[1]["filter"], {"id": {"$in": ["dummy2019"]}}
+            )
+            self.assertEqual(
+                [_.id for _ in second], ["dummy2019", "dijkstra1968", "maddox1988"]
+            )
+            self.assertIs(second[2], first[0])
+
+            references_coll.find_by_ids(["dummy2019"])
+            self.assertEqual(find.call_count, 2)
+            references_coll.invalidate(["dummy2019"])
+            references_coll.find_by_ids(["dummy2019", "maddox1988"])
+            self.assertEqual(find.call_count, 3)
+            self.assertEqual(
+                find.call_args[1]["filter"], {"id": {"$in": ["dummy2019"]}}
+            )
+
+
+class CompileFilterTests(unittest.TestCase):
+    def test_normalized_count_key(self):
+        mongo_filter = structures_coll._compile_filter(
+            'nelements>1 AND chemical_formula_descriptive="Ac" AND nelements<4'
+        )
+        self.assertEqual(
+            mongo_filter,
+            {
+                "$and": [
+                    {"nelements": {"$gt": 1, "$lt": 4}},
+                    {"pretty_formula": {"$eq": "Ac"}},
+                ]
+            },
+        )
+        self.assertEqual(
+            structures_coll._count_key(mongo_filter),
+            structures_coll._count_key(
+                structures_coll._compile_filter(
+                    'nelements<4 AND nelements>1 AND chemical_formula_descriptive="Ac"'
+                )
+            ),
+        )
+
+    def test_unparsable_filter(self):
+        with self.assertRaises(HTTPException) as context:
+            structures_coll.find(listing_params(filter="elements HAS"))
+        self.assertEqual(context.exception.status_code, 400)
+
+    def test_unimplemented_filters(self):
+        for filter_, detail in (
+            (
+                'elements HAS ONLY >"A"',
+                "HAS ONLY is only supported for values without operators",
+            ),
+            ("LENGTH species > 2.5", "LENGTH is only supported for integer values"),
+            (
+                'elements:nelements HAS "A":1',
+                "Zipped queries of elements:nelements are not supported",
+            ),
+            (
+                'elements:elements_ratios HAS "A":1:2',
+                "Zipped values must have one value for each of elements:elements_ratios",
+            ),
+        ):
+            with self.assertRaises(HTTPException, msg=filter_) as context:
+                structures_coll.find(listing_params(filter=filter_))
+            self.assertEqual(
+                (context.exception.status_code, context.exception.detail),
+                (501, detail),
+            )
+
+    def test_negated_expression(self):
+        self.assertEqual(
+            structures_coll._compile_filter(
+                'NOT (chemical_formula_descriptive="Ac" OR nelements=2)'
+            ),
+            {"$nor": [{"nelements": {"$eq": 2}}, {"pretty_formula": {"$eq": "Ac"}}]},
+        )
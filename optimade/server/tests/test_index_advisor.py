@@ -0,0 +1,124 @@
+import unittest
+
+import mongomock
+
+from optimade.server.entry_collections import MongoCollection
+from optimade.server.index_advisor import (
+    create_indexes,
+    explain_filters,
+    index_backed_sort_fields,
+    missing_indexes,
+    profiled_collection_scans,
+    propose_indexes,
+    sort_index,
+    update_derived_fields,
+)
+from optimade.server.mappers import StructureMapper
+from optimade.models import StructureResource
+
+
+class IndexAdvisorTests(unittest.TestCase):
+    def setUp(self):
+        self.collection = MongoCollection(
+            collection=mongomock.MongoClient()["optimade"]["structures"],
+            resource_cls=StructureResource,
+            resource_mapper=StructureMapper,
+        )
+
+    def test_propose_indexes(self):
+        proposals = {_.keys[0][0]: _ for _ in propose_indexes(self.collection)}
+        self.assertEqual(proposals["task_id"].keys, (("task_id", 1), ("_id", 1)))
+        self.assertEqual(proposals["nelements"].keys, (("nelements", 1), ("_id", 1)))
+        self.assertEqual(proposals["elements"].keys, (("elements", 1),))
+        self.assertEqual(proposals["pretty_formula"].reason, "queryable")
+        self.assertEqual(proposals["band_gap"].field, "_exmpl_band_gap")
+        self.assertEqual(proposals["band_gap"].reason, "provider")
+        for field in ("type", "cartesian_site_positions", "species", "attributes"):
+            self.assertNotIn(field, proposals)
+
+        (zipped,) = [_ for _ in proposals.values() if _.reason == "zip"]
+        self.assertEqual(zipped.field, "elements:elements_ratios")
+        self.assertEqual(
+            zipped.keys, (("_composition.element", 1), ("_composition.ratio", 1))
+        )
+        self.assertEqual(
+            proposals["_pretty_formula_reversed"].keys,
+            (("_pretty_formula_reversed", 1), ("_id", 1)),
+        )
+        self.assertEqual(proposals["_pretty_formula_ngrams"].reason, "ngram")
+
+    def test_create_indexes(self):
+        missing = missing_indexes(self.collection)
+        self.assertEqual(len(missing), len(propose_indexes(self.collection)))
+
+        self.collection.collection.create_index([("elements", 1), ("nelements", 1)])
+        self.assertNotIn(
+            "elements", [_.keys[0][0] for _ in missing_indexes(self.collection)]
+        )
+
+        self.collection.collection.create_index("nelements")
+        self.assertIn(
+            "nelements", [_.keys[0][0] for _ in missing_indexes(self.collection)]
+        )
+
+        names = create_indexes(self.collection)
+        self.assertIn("task_id_1__id_1", names)
+        self.assertEqual(missing_indexes(self.collection), [])
+        self.assertEqual(create_indexes(self.collection), [])
+
+    def test_explain_without_backend_support(self):
+        (report,) = explain_filters(self.collection, ["nelements > 2"])
+        self.assertEqual(report.mongo_filter, {"nelements": {"$gt": 2}})
+        self.assertIsNone(report.collection_scan)
+        self.assertEqual(profiled_collection_scans(self.collection), [])
+
+    def test_sort_index(self):
+        self.assertEqual(index_backed_sort_fields(self.collection), set())
+        name = self.collection.collection.create_index([("nsites", 1), ("_id", 1)])
+        self.collection.collection.create_index([("pretty_formula", 1)])
+
+        self.assertEqual(
+            sort_index(self.collection, [("nsites", -1), ("_id", -1)]), name
+        )
+        self.assertEqual(sort_index(self.collection, [("nsites", 1)]), name)
+        self.assertIsNone(sort_index(self.collection, [("nsites", -1), ("_id", 1)]))
+        self.assertIsNone(
+            sort_index(self.collection, [("pretty_formula", 1), ("_id", 1)])
+        )
+        self.assertEqual(index_backed_sort_fields(self.collection), {"nsites"})
+
+    def test_update_derived_fields(self):
+        raw = self.collection.collection
+        raw.insert_many(
+            [
+                {"task_id": "mpf_1", "elements": ["Ag"], "elements_ratios": [1.0]},
+                {"task_id": "mpf_2", "_composition": [{"element": "O", "ratio": 1.0}]},
+            ]
+        )
+        self.assertEqual(update_derived_fields(self.collection), 2)
+        self.assertEqual(
+            raw.find_one({"task_id": "mpf_1"})["_composition"],
+            [{"element": "Ag", "ratio": 1.0}],
+        )
+        self.assertNotIn("_composition", raw.find_one({"task_id": "mpf_2"}))
+        self.assertEqual(raw.find_one({"task_id": "mpf_1"})["_mp_chemsys"], "Ag")
+        self.assertEqual(
+            [
+                _["task_id"]
+                for _ in raw.find(
+                    self.collection._compile_filter('elements HAS ONLY "Ag", "O"')
+                )
+            ],
+            ["mpf_1"],
+        )
+        self.assertEqual(
+            [
+                _["task_id"]
+                for _ in raw.find(
+                    self.collection._compile_filter(
+                        'elements:elements_ratios HAS "Ag":>0.5'
+                    )
+                )
+            ],
+            ["mpf_1"],
+        )
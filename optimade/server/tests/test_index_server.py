@@ -10,6 +10,7 @@ from optimade.models import IndexInfoResponse, LinksResponse
 
 from optimade.server.main_index import app
 from optimade.server.routers import index_info, links
+from optimade.server.seed import load_index_links
 
 # We need to remove the /optimade prefixes in order to have the tests run correctly.
 app.include_router(index_info.router)
@@ -17,6 +18,8 @@ app.include_router(links.router)
 # need to explicitly set base_url, as the default "http://testserver"
 # does not validate as pydantic UrlStr model
 CLIENT = TestClient(app, base_url="http://example.org/index/optimade")
+# The app loads the index links at startup, which the test client does not run
+load_index_links()
 
 
 class IndexEndpointTests(abc.ABC):
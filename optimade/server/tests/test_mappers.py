@@ -0,0 +1,112 @@
+import unittest
+
+from optimade.server.mappers import LinksMapper, ResourceMapper, StructureMapper
+
+
+class AliasMapsTests(unittest.TestCase):
+    def test_alias_maps(self):
+        forward, reverse = StructureMapper.alias_maps()
+        self.assertEqual(forward["id"], "task_id")
+        self.assertEqual(
+            reverse["pretty_formula"],
+            ("chemical_formula_descriptive", "chemical_formula_reduced"),
+        )
+        self.assertIs(StructureMapper.alias_maps()[0], forward)
+        with self.assertRaises(TypeError):
+            forward["id"] = "id"
+
+    def test_reset_aliases(self):
+        class AliasedMapper(ResourceMapper):
+            ALIASES = (("id", "uuid"),)
+
+        self.assertEqual(AliasedMapper.alias_for("id"), "uuid")
+        AliasedMapper.ALIASES = (("id", "_key"),)
+        self.assertEqual(AliasedMapper.alias_for("id"), "uuid")
+        ResourceMapper.reset_aliases()
+        self.assertEqual(AliasedMapper.alias_for("id"), "_key")
+
+    def test_map_back(self):
+        doc = {
+            "_id": "5cfb441f053b174410700d02",
+            "task_id": "mpf_1",
+            "pretty_formula": "Ac",
+            "nelements": 1,
+            "relationships": {},
+        }
+        self.assertEqual(
+            StructureMapper.map_back(doc),
+            {
+                "id": "mpf_1",
+                "type": "structures",
+                "relationships": {},
+                "attributes": {
+                    "chemical_formula_descriptive": "Ac",
+                    "chemical_formula_reduced": "Ac",
+                    "nelements": 1,
+                },
+            },
+        )
+
+    def test_map_back_many(self):
+        docs = [
+            {"task_id": "mpf_1", "pretty_formula": "Ac", "nelements": 1},
+            {"task_id": "mpf_2", "nelements": 2, "pretty_formula": "AcAg"},
+            {"task_id": "mpf_3", "nelements": 3},
+        ]
+        self.assertEqual(
+            StructureMapper.map_back_many(docs),
+            [StructureMapper.map_back(dict(doc)) for doc in docs],
+        )
+
+        with self.assertRaises(Exception):
+            StructureMapper.map_back_many([{"task_id": "mpf_1", "attributes": {}}])
+
+    def test_links_type(self):
+        docs = [
+            {"id": "index", "type": "parent", "name": "Index"},
+            {"id": "mp", "type": "provider", "name": "Materials Project"},
+        ]
+        self.assertEqual(
+            [_["type"] for _ in LinksMapper.map_back_many(docs)], ["parent", "provider"]
+        )
+        self.assertEqual(LinksMapper.map_back(docs[0])["type"], "parent")
+
+    def test_derived_fields(self):
+        doc = {
+            "task_id": "mpf_1",
+            "elements": ["Ag", "O"],
+            "elements_ratios": [0.4, 0.6],
+        }
+        self.assertEqual(
+            StructureMapper.derived_fields(doc),
+            {
+                "_composition": [
+                    {"element": "Ag", "ratio": 0.4},
+                    {"element": "O", "ratio": 0.6},
+                ],
+                "_mp_chemsys": "Ag-O",
+            },
+        )
+        self.assertEqual(
+            StructureMapper.derived_fields({"pretty_formula": "Ag2O"}),
+            {
+                "_pretty_formula_reversed": "O2gA",
+                "_pretty_formula_ngrams": [
+                    "A",
+                    "g",
+                    "2",
+                    "O",
+                    "Ag",
+                    "g2",
+                    "2O",
+                    "Ag2",
+                    "g2O",
+                ],
+            },
+        )
+        self.assertEqual(
+            StructureMapper.derived_fields({"elements": ["O", "Ag", "O"]}),
+            {"_mp_chemsys": "Ag-O"},
+        )
+        self.assertEqual(StructureMapper.derived_fields({"elements_ratios": [1.0]}), {})
+        self.assertEqual(LinksMapper.derived_fields(doc), {})
@@ -0,0 +1,32 @@
+import unittest
+
+from optimade.server.metrics import Histogram
+
+
+class HistogramTests(unittest.TestCase):
+    def test_expose(self):
+        histogram = Histogram("stage_seconds", "Time per stage", ("stage",), (0.1, 1))
+        histogram.observe(0.05, "find")
+        histogram.observe(0.5, "find")
+        histogram.observe(5, "find")
+        histogram.observe(0.1, "count")
+        self.assertEqual(
+            histogram.expose(),
+            "\n".join(
+                [
+                    "# HELP stage_seconds Time per stage",
+                    "# TYPE stage_seconds histogram",
+                    'stage_seconds_bucket{stage="count",le="0.1"} 1',
+                    'stage_seconds_bucket{stage="count",le="1"} 1',
+                    'stage_seconds_bucket{stage="count",le="+Inf"} 1',
+                    'stage_seconds_sum{stage="count"} 0.1',
+                    'stage_seconds_count{stage="count"} 1',
+                    'stage_seconds_bucket{stage="find",le="0.1"} 1',
+                    'stage_seconds_bucket{stage="find",le="1"} 2',
+                    'stage_seconds_bucket{stage="find",le="+Inf"} 3',
+                    'stage_seconds_sum{stage="find"} 5.55',
+                    'stage_seconds_count{stage="find"} 3',
+                ]
+            )
+            + "\n",
+        )
@@ -0,0 +1,153 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import bson.json_util
+import mongomock
+import requests
+from bson.objectid import ObjectId
+
+from optimade.models import LinksResource, StructureResource
+from optimade.server.entry_collections import MongoCollection
+from optimade.server.mappers import LinksMapper, StructureMapper
+from optimade.server.routers import links
+from optimade.server.routers.utils import get_providers
+from optimade.server.seed import (
+    TEST_DATA_PATHS,
+    insert_documents,
+    iter_documents,
+    load_file,
+    refresh_providers,
+)
+
+
+def mongomock_collection(name, resource_cls, resource_mapper):
+    return MongoCollection(
+        collection=mongomock.MongoClient()["optimade"][name],
+        resource_cls=resource_cls,
+        resource_mapper=resource_mapper,
+    )
+
+
+class SeedTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+
+    def test_iter_json_array(self):
+        path = TEST_DATA_PATHS["structures"]
+        expected = bson.json_util.loads(path.read_text())
+        # Documents spanning many chunks, as well as chunks holding many documents
+        for chunk_size in (7, 1 << 20):
+            docs = list(iter_documents(path, chunk_size=chunk_size))
+            self.assertEqual(docs, expected)
+        self.assertIsInstance(docs[0]["_id"], ObjectId)
+
+    def test_iter_json_lines(self):
+        path = self.tmp.joinpath("structures.jsonl")
+        path.write_text(
+            '{"_id": {"$oid": "5cfb441f053b174410700d02"}, "task_id": "mpf_1"}\n'
+            "\n"
+            '{"task_id": "mpf_2"}\n'
+        )
+        docs = list(iter_documents(path))
+        self.assertEqual([doc["task_id"] for doc in docs], ["mpf_1", "mpf_2"])
+        self.assertEqual(docs[0]["_id"], ObjectId("5cfb441f053b174410700d02"))
+
+    def test_invalid_files(self):
+        self.assertEqual(list(self._iter_json(" [ ] ")), [])
+        for content in ('{"id": 1}', '[{"id": 1}', '[{"id": 1} {"id": 2}]', "[1, 2]"):
+            with self.assertRaises(ValueError, msg=content):
+                list(self._iter_json(content))
+
+    def _iter_json(self, content):
+        path = self.tmp.joinpath("documents.json")
+        path.write_text(content)
+        return iter_documents(path, chunk_size=2)
+
+    def test_insert_documents(self):
+        collection = mongomock_collection(
+            "structures", StructureResource, StructureMapper
+        )
+        docs = [
+            {"elements": ["Ag", "Cl"], "elements_ratios": [0.5, 0.5]},
+            {"elements": ["Ag"], "elements_ratios": [1.0]},
+            {"elements": ["Cl"], "elements_ratios": [1.0]},
+        ]
+        with mock.patch.object(
+            collection.collection,
+            "insert_many",
+            wraps=collection.collection.insert_many,
+        ) as insert_many:
+            self.assertEqual(insert_documents(collection, iter(docs), batch_size=2), 3)
+        self.assertEqual([len(_[0][0]) for _ in insert_many.call_args_list], [2, 1])
+        doc = collection.collection.find_one({"elements": ["Ag", "Cl"]})
+        self.assertEqual(
+            doc["_composition"],
+            [{"element": "Ag", "ratio": 0.5}, {"element": "Cl", "ratio": 0.5}],
+        )
+
+    def test_load_file_once(self):
+        # Not the links collection of the server, whose test links may be loaded already
+        collection = mongomock_collection("seed_links", LinksResource, LinksMapper)
+        path = TEST_DATA_PATHS["links"]
+        loaded = len(json.loads(path.read_text()))
+        self.assertEqual(load_file(collection, path), loaded)
+        self.assertEqual(load_file(collection, path), 0)
+        self.assertEqual(collection.collection.count_documents({}), loaded)
+
+    def test_get_providers_offline(self):
+        with mock.patch("requests.get", side_effect=AssertionError("no network")):
+            providers = get_providers()
+        ids = [provider["id"] for provider in providers]
+        self.assertIn("mp", ids)
+        self.assertNotIn("exmpl", ids)
+        self.assertIsInstance(providers[0]["_id"], ObjectId)
+        self.assertNotIn("attributes", providers[0])
+
+    def test_refresh_providers(self):
+        collection = mongomock_collection("links", LinksResource, LinksMapper)
+        insert_documents(collection, get_providers())
+        available = collection.collection.count_documents({})
+
+        response = mock.Mock()
+        response.json.return_value = {
+            "data": [
+                {
+                    "type": "provider",
+                    "id": "mp",
+                    "attributes": {
+                        "name": "The Materials Project",
+                        "description": "Refreshed",
+                        "base_url": None,
+                        "homepage": "https://materialsproject.org",
+                    },
+                },
+                {
+                    "type": "provider",
+                    "id": "new",
+                    "attributes": {
+                        "name": "New provider",
+                        "description": "Registered after the snapshot",
+                        "base_url": None,
+                        "homepage": "https://example.org",
+                    },
+                },
+            ]
+        }
+        with mock.patch.object(links, "links_coll", collection):
+            with mock.patch("requests.get", return_value=response):
+                self.assertEqual(refresh_providers(), 2)
+            with mock.patch(
+                "requests.get", side_effect=requests.ConnectionError("offline")
+            ):
+                with self.assertWarns(UserWarning):
+                    self.assertEqual(refresh_providers(), 0)
+
+        self.assertEqual(collection.collection.count_documents({}), available + 1)
+        self.assertEqual(
+            collection.collection.find_one({"id": "mp"})["description"], "Refreshed"
+        )
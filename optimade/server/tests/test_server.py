@@ -18,16 +18,28 @@ from optimade.models import (
 )
 
 from optimade.server.main import app
-from optimade.server.routers import info, links, references, structures
+from optimade.server.routers import (
+    explain,
+    info,
+    links,
+    metrics,
+    references,
+    structures,
+)
+from optimade.server.seed import load_test_data
 
 # We need to remove the /optimade prefixes in order to have the tests run correctly.
 app.include_router(info.router)
 app.include_router(links.router)
 app.include_router(references.router)
 app.include_router(structures.router)
+app.include_router(explain.router)
+app.include_router(metrics.router)
 # need to explicitly set base_url, as the default "http://testserver"
 # does not validate as pydantic UrlStr model
 CLIENT = TestClient(app, base_url="http://example.org/optimade")
+# The app loads the test data at startup, which the test client does not run
+load_test_data()
 
 
 class EndpointTests(abc.ABC):
@@ -106,6 +118,11 @@ class InfoStructuresEndpointTests(EndpointTests, unittest.TestCase):
         data_keys = ["description", "properties", "formats", "output_fields_by_format"]
         self.check_keys(data_keys, self.json_response["data"])
 
+    def test_info_structures_sortable(self):
+        # No sort of the test data is backed by an index
+        properties = self.json_response["data"]["properties"]
+        self.assertEqual({value["sortable"] for value in properties.values()}, {False})
+
 
 class InfoReferencesEndpointTests(EndpointTests, unittest.TestCase):
     request_str = "/info/references"
@@ -173,6 +190,38 @@ class StructuresEndpointTests(EndpointTests, unittest.TestCase):
         self.assertEqual(len(cursor), total_data)
 
 
+class PageCursorTests(unittest.TestCase):
+
+    client = CLIENT
+
+    def _paged_ids(self, request):
+        ids = []
+        while request:
+            response = self.client.get(request)
+            self.assertEqual(response.status_code, 200, msg=response.json())
+            ids.extend(entry["id"] for entry in response.json()["data"])
+            request = response.json()["links"]["next"]
+        return ids
+
+    def test_sort_with_nulls(self):
+        from optimade.server.routers.structures import structures_coll
+
+        collection = structures_coll.collection
+        for i, doc in enumerate(collection.find({}, projection=["_id"])):
+            # Null on every third document, missing on the one after
+            if i % 3 != 1:
+                collection.update_one(
+                    {"_id": doc["_id"]},
+                    {"$set": {"band_gap": None if i % 3 == 0 else i % 4 / 2}},
+                )
+        self.addCleanup(collection.update_many, {}, {"$unset": {"band_gap": ""}})
+
+        all_ids = sorted(_["task_id"] for _ in collection.find())
+        for sort in ("_exmpl_band_gap", "-_exmpl_band_gap"):
+            ids = self._paged_ids(f"/structures?sort={sort}&page_limit=5")
+            self.assertEqual(sorted(ids), all_ids, msg=sort)
+
+
 class SingleStructureEndpointTests(EndpointTests, unittest.TestCase):
 
     test_id = "mpf_1"
@@ -315,7 +364,6 @@ class FilterTests(unittest.TestCase):
         expected_return = 6
         self._check_response(request, expected_ids, expected_return)
 
-    @unittest.skip("Skipping HAS ALL until implemented in server code.")
     def test_list_has_all(self):
         request = '/structures?filter=elements HAS ALL "Ba","F","H","Mn","O","Re","Si"'
         expected_ids = ["mpf_3819"]
@@ -325,10 +373,9 @@ class FilterTests(unittest.TestCase):
         expected_ids = ["mpf_3819"]
         self._check_response(request, expected_ids, len(expected_ids))
 
-    @unittest.skip("Skipping HAS ANY until implemented in server code.")
     def test_list_has_any(self):
         request = '/structures?filter=elements HAS ANY "Re","Ti"'
-        expected_ids = ["mpf_3819"]
+        expected_ids = ["mpf_3803", "mpf_3819"]
         self._check_response(request, expected_ids, len(expected_ids))
 
     def test_list_length_basic(self):
@@ -336,7 +383,6 @@ class FilterTests(unittest.TestCase):
         expected_ids = ["mpf_3819"]
         self._check_response(request, expected_ids, len(expected_ids))
 
-    @unittest.skip("Skipping LENGTH until implemented in server code.")
     def test_list_length(self):
         request = "/structures?filter=LENGTH elements = 9"
         expected_ids = ["mpf_3819"]
@@ -350,18 +396,34 @@ class FilterTests(unittest.TestCase):
         expected_ids = []
         self._check_response(request, expected_ids, len(expected_ids))
 
-    @unittest.skip("Skipping HAS ONLY until implemented in server code.")
     def test_list_has_only(self):
         request = '/structures?filter=elements HAS ONLY "Ac"'
         expected_ids = ["mpf_1"]
         self._check_response(request, expected_ids, len(expected_ids))
 
-    @unittest.skip("Skipping correlated list query until implemented in server code.")
+        request = '/structures?filter=elements HAS ONLY "Ac","Mg","O"'
+        expected_ids = ["mpf_1", "mpf_23", "mpf_30"]
+        self._check_response(request, expected_ids, len(expected_ids))
+
     def test_list_correlated(self):
-        request = '/structures?filter=elements:elements_ratios HAS "Ag":"0.2"'
+        request = '/structures?filter=elements:elements_ratios HAS "Ag":0.2'
         expected_ids = ["mpf_259"]
         self._check_response(request, expected_ids, len(expected_ids))
 
+        request = '/structures?filter=elements:elements_ratios HAS "Ag":>0.6'
+        expected_ids = ["mpf_200", "mpf_220"]
+        self._check_response(request, expected_ids, len(expected_ids))
+
+        request = (
+            '/structures?filter=elements:elements_ratios HAS ALL "Ag":>=0.2,"Cl":<0.1'
+        )
+        expected_ids = ["mpf_220"]
+        self._check_response(request, expected_ids, len(expected_ids))
+
+        request = '/structures?filter=elements:elements_ratios HAS ONLY "Ac":0.5,"Ag":0.25,"Ir":0.25'
+        expected_ids = ["mpf_2"]
+        self._check_response(request, expected_ids, len(expected_ids))
+
     def test_is_known(self):
         request = "/structures?filter=nsites IS KNOWN AND nsites>=44"
         expected_ids = ["mpf_551", "mpf_3803", "mpf_3819"]
@@ -400,6 +462,15 @@ class FilterTests(unittest.TestCase):
         expected_ids = ["mpf_3", "mpf_2"]
         self._check_response(request, expected_ids, len(expected_ids))
 
+        request = '/structures?filter=chemical_formula_descriptive CONTAINS "Ag2C"'
+        expected_ids = ["mpf_259"]
+        self._check_response(request, expected_ids, len(expected_ids))
+
+        # Regular expression metacharacters are matched literally
+        request = '/structures?filter=chemical_formula_descriptive CONTAINS "A.*"'
+        expected_ids = []
+        self._check_response(request, expected_ids, len(expected_ids))
+
     def test_string_start(self):
         request = (
             '/structures?filter=chemical_formula_descriptive STARTS WITH "Ag2CSNCl"'
@@ -443,6 +514,14 @@ class FilterTests(unittest.TestCase):
         expected_ids = ["mpf_1"]
         self._check_response(request, expected_ids, len(expected_ids))
 
+    def test_filter_cache(self):
+        cache = structures.structures_coll.filter_cache
+        request = "/structures?filter=nelements>=9 AND nsites>=44"
+        self._check_response(request, ["mpf_3819"], 1)
+        hits = cache.hits
+        self._check_response(request, ["mpf_3819"], 1)
+        self.assertEqual(cache.hits, hits + 1)
+
     def _check_response(self, request, expected_ids, expected_return):
         try:
             response = self.client.get(request)
@@ -457,3 +536,258 @@ class FilterTests(unittest.TestCase):
             print("Request attempted:")
             print(f"{self.client.base_url}{request}")
             raise exc
+
+
+class StreamEntriesTests(unittest.TestCase):
+    """The streamed response body must equal the regular response"""
+
+    client = CLIENT
+
+    def _stream(self, endpoint, **query):
+        import asyncio
+        import json
+        import urllib.parse
+        from starlette.requests import Request
+        from optimade.server.deps import EntryListingQueryParams
+        from optimade.server.routers import ENTRY_COLLECTIONS
+        from optimade.server.routers.utils import stream_entries
+
+        request = Request(
+            {
+                "type": "http",
+                "method": "GET",
+                "scheme": "http",
+                "server": ("example.org", 80),
+                "root_path": "",
+                "path": f"/optimade/{endpoint}",
+                "query_string": urllib.parse.urlencode(query).encode(),
+                "headers": [],
+            }
+        )
+        params = dict(
+            filter="",
+            response_format="json",
+            email_address="",
+            response_fields="",
+            sort="",
+            page_limit=500,
+            page_offset=0,
+            page_page=0,
+            page_cursor="",
+            page_above=0,
+            page_below=0,
+            include="references",
+        )
+        params.update(query)
+        response = stream_entries(
+            ENTRY_COLLECTIONS[endpoint], request, EntryListingQueryParams(**params)
+        )
+
+        async def body():
+            return "".join([chunk async for chunk in response.body_iterator])
+
+        return json.loads(asyncio.run(body()))
+
+    def test_stream_entries(self):
+        for endpoint, query in (
+            (
+                "structures",
+                {"response_fields": "nelements,elements", "sort": "-nelements"},
+            ),
+            ("structures", {"filter": "nelements>100"}),
+            ("references", {}),
+            ("links", {}),
+        ):
+            expected = self.client.get(f"/{endpoint}", params=query).json()
+            streamed = self._stream(endpoint, **query)
+            for response in (expected, streamed):
+                del response["meta"]["query"]
+                del response["meta"]["time_stamp"]
+            self.assertEqual(streamed, expected)
+
+    def test_stream_entries_pagination(self):
+        expected = self.client.get("/structures?page_limit=3").json()
+        streamed = self._stream("structures", page_limit=3)
+        self.assertEqual(streamed["data"], expected["data"])
+        self.assertEqual(streamed["included"], expected["included"])
+        self.assertTrue(streamed["meta"]["more_data_available"])
+        self.assertIn("page_cursor=", streamed["links"]["next"])
+
+
+class UnvalidatedResponseTests(unittest.TestCase):
+    """With VALIDATE_RESPONSES off, the responses must not change"""
+
+    client = CLIENT
+
+    def setUp(self):
+        from optimade.server.config import CONFIG
+        from optimade.server.routers import ENTRY_COLLECTIONS
+
+        self.config = CONFIG
+        self.collections = ENTRY_COLLECTIONS.values()
+
+    def _set_validate_responses(self, value):
+        self.config.validate_responses = value
+        for collection in self.collections:
+            collection.validate_responses = value
+
+    def tearDown(self):
+        self._set_validate_responses(True)
+
+    def test_unvalidated_responses(self):
+        for request in (
+            "/structures",
+            "/structures?response_fields=nelements,elements&sort=-nelements",
+            "/structures/mpf_1",
+            "/structures/mpf_1?response_fields=nelements",
+            "/references",
+            "/links",
+        ):
+            responses = []
+            for validate_responses in (True, False):
+                self._set_validate_responses(validate_responses)
+                response = self.client.get(request)
+                self.assertEqual(response.status_code, 200, msg=response.json())
+                response = response.json()
+                del response["meta"]["time_stamp"]
+                responses.append(response)
+            self.assertEqual(responses[1], responses[0], msg=request)
+
+
+class ResponseFieldsTests(unittest.TestCase):
+
+    client = CLIENT
+
+    def test_internal_fields(self):
+        response = self.client.get(
+            "/structures?response_fields=nelements,_composition,_mp_chemsys,"
+            "_pretty_formula_reversed,_pretty_formula_ngrams"
+        )
+        self.assertEqual(response.status_code, 200, msg=response.json())
+        for entry in response.json()["data"]:
+            self.assertEqual(set(entry["attributes"]), {"nelements"})
+
+
+class IncludeTests(unittest.TestCase):
+
+    client = CLIENT
+
+    def test_include(self):
+        request = "/structures?filter=id=mpf_1 OR id=mpf_3"
+        response = self.client.get(request).json()
+        self.assertEqual(len(response["included"]), 2)
+
+        response = self.client.get(f"{request}&include=").json()
+        self.assertEqual(response["included"], [])
+
+        response = self.client.get("/structures/mpf_1?include=").json()
+        self.assertEqual(response["included"], [])
+
+    def test_unknown_include(self):
+        from starlette.exceptions import HTTPException
+        from optimade.server.routers import ENTRY_COLLECTIONS
+        from optimade.server.routers.utils import included_collections
+
+        params = type("Params", (), {"include": "references,authors"})
+        with self.assertRaises(HTTPException) as context:
+            included_collections(params, ENTRY_COLLECTIONS)
+        self.assertEqual(context.exception.status_code, 400)
+
+
+class ExplainTests(unittest.TestCase):
+
+    client = CLIENT
+
+    def setUp(self):
+        from unittest import mock
+        from optimade.server.config import CONFIG
+
+        patcher = mock.patch.object(CONFIG, "explain", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_explain(self):
+        response = self.client.get(
+            '/extensions/explain/structures?filter=nelements>2 AND chemical_formula_descriptive="Ac"'
+            "&sort=-nelements&page_limit=5"
+        )
+        self.assertEqual(response.status_code, 200)
+        explained = response.json()
+        self.assertTrue(explained["tree"].startswith("filter"))
+        self.assertEqual(
+            explained["mongo_filter"],
+            {"$and": [{"nelements": {"$gt": 2}}, {"pretty_formula": {"$eq": "Ac"}}]},
+        )
+        self.assertEqual(explained["sort"], [["nelements", -1], ["_id", -1]])
+        self.assertIsNone(explained["sort_index"])
+        self.assertEqual(explained["limit"], 5)
+        self.assertIn("task_id", explained["projection"])
+        self.assertIsNone(explained["explain"])  # mongomock cannot explain queries
+        self.assertEqual(
+            set(explained["timings"]),
+            {"parse", "transform", "db", "mapping", "validation", "serialization"},
+        )
+
+    def test_explain_unknown_entry(self):
+        from starlette.exceptions import HTTPException
+        from optimade.server.routers.explain import get_explain
+
+        with self.assertRaises(HTTPException) as context:
+            get_explain(None, "authors", None)
+        self.assertEqual(context.exception.status_code, 404)
+
+    def test_explain_disabled(self):
+        from unittest import mock
+        from starlette.exceptions import HTTPException
+        from optimade.server.config import CONFIG
+        from optimade.server.routers.explain import get_explain
+
+        with mock.patch.object(CONFIG, "explain", False):
+            with self.assertRaises(HTTPException) as context:
+                get_explain(None, "structures", None)
+        self.assertEqual(context.exception.status_code, 404)
+        self.assertIn("EXPLAIN = yes", context.exception.detail)
+
+
+class MetricsTests(unittest.TestCase):
+
+    client = CLIENT
+
+    def setUp(self):
+        from optimade.server.metrics import STAGE_SECONDS
+
+        STAGE_SECONDS.clear()
+        self.addCleanup(STAGE_SECONDS.clear)
+
+    def test_metrics(self):
+        from unittest import mock
+        from optimade.server.config import CONFIG
+
+        with mock.patch.object(CONFIG, "metrics", True):
+            self.client.get("/structures?filter=nelements>3&response_fields=nelements")
+            response = self.client.get("/extensions/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        for stage in (
+            "find",
+            "map_back",
+            "include",
+            "response_fields",
+            "response",
+            "serialization",
+        ):
+            self.assertIn(
+                f'optimade_stage_duration_seconds_count{{endpoint="structures",stage="{stage}"}} 1',
+                response.text,
+            )
+
+    def test_metrics_disabled(self):
+        from starlette.exceptions import HTTPException
+        from optimade.server.metrics import STAGE_SECONDS
+        from optimade.server.routers.metrics import get_metrics
+
+        self.client.get("/structures")
+        self.assertEqual(STAGE_SECONDS.expose().count("\n"), 2)
+        with self.assertRaises(HTTPException) as context:
+            get_metrics()
+        self.assertEqual(context.exception.status_code, 404)
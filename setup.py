@@ -4,7 +4,8 @@ from setuptools import setup, find_packages
 module_dir = Path(__file__).resolve().parent
 
 # Dependencies
-mongo_deps = ["pymongo~=3.8", "mongomock~=3.16"]
+mongo_deps = ["pymongo~=3.11", "mongomock~=3.16"]
+async_mongo_deps = ["motor~=2.1"] + mongo_deps
 server_deps = ["uvicorn"] + mongo_deps
 django_deps = ["django~=2.2,>=2.2.8"]
 elastic_deps = ["elasticsearch_dsl~=6.4"]
@@ -16,7 +17,7 @@ testing_deps = [
     "jsondiff",
 ] + server_deps
 dev_deps = ["pylint", "black", "pre-commit", "invoke"] + testing_deps
-all_deps = dev_deps + django_deps + elastic_deps
+all_deps = dev_deps + django_deps + elastic_deps + async_mongo_deps
 
 setup(
     name="optimade",
@@ -31,7 +32,7 @@ setup(
     keywords="optimade jsonapi materials",
     include_package_data=True,
     packages=find_packages(),
-    package_data={"": ["*.lark"]},
+    package_data={"": ["*.lark", "*.lark.pickle", "providers.json"]},
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Programming Language :: Python :: 3",
@@ -57,8 +58,12 @@ setup(
         "django": django_deps,
         "elastic": elastic_deps,
         "mongo": mongo_deps,
+        "async_mongo": async_mongo_deps,
     },
     entry_points={
-        "console_scripts": ["optimade_validator=optimade.validator:validate"]
+        "console_scripts": [
+            "optimade_validator=optimade.validator:validate",
+            "optimade_index_advisor=optimade.server.index_advisor:main",
+        ]
     },
 )
@@ -39,3 +39,12 @@ def setver(_, patch=False, new_ver=""):
 def update_openapijson(c):
     c.run("cp local_openapi.json openapi.json")
     c.run("cp local_index_openapi.json index_openapi.json")
+
+
+@task
+def build_parsers(_):
+    from optimade.filterparser.lark_parser import lalr_parsers, serialize_parser
+
+    for version, variant in sorted(lalr_parsers):
+        path = serialize_parser(version, variant)
+        print(f"Serialized LALR parser for grammar {version} ({variant}) to {path}")